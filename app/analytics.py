@@ -102,6 +102,28 @@ def build_stats() -> dict:
 
         overrides = acc_row["overridden"] if acc_row else 0
 
+        # Per deciding stage (rules / heuristic / local / cache / llm)
+        stage_rows = conn.execute(
+            """
+            SELECT
+                decided_by,
+                COUNT(*) as total,
+                SUM(CASE WHEN category = original_category THEN 1 ELSE 0 END) as agreed
+            FROM triage_items
+            WHERE approved = 1 AND original_category IS NOT NULL AND decided_by IS NOT NULL
+            GROUP BY decided_by
+            ORDER BY total DESC
+            """
+        ).fetchall()
+        stage_accuracy = [
+            {
+                "stage": r["decided_by"],
+                "total": r["total"],
+                "accuracy": round(r["agreed"] / r["total"] * 100),
+            }
+            for r in stage_rows
+        ]
+
         # ── Time saved ────────────────────────────────────────────────────
         total_applied = conn.execute(
             "SELECT COUNT(*) FROM triage_items WHERE applied = 1"
@@ -117,6 +139,7 @@ def build_stats() -> dict:
                 b.created_at,
                 b.mode,
                 b.max_results,
+                b.prompt_tokens_saved,
                 COUNT(ti.id) as total,
                 SUM(ti.approved) as approved,
                 SUM(ti.applied) as applied
@@ -141,6 +164,7 @@ def build_stats() -> dict:
                 "total": r["total"],
                 "approved": r["approved"] or 0,
                 "applied": r["applied"] or 0,
+                "tokens_saved": r["prompt_tokens_saved"],
             })
 
     return {
@@ -152,6 +176,7 @@ def build_stats() -> dict:
         "accuracy": accuracy,
         "accuracy_total": accuracy_total,
         "overrides": overrides,
+        "stage_accuracy": stage_accuracy,
         "minutes_saved": minutes_saved,
         "time_saved": _fmt_time(minutes_saved),
         "batches": batches,
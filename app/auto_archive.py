@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import os
 import uuid
@@ -11,9 +12,9 @@ from fastapi import APIRouter, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 
-from app.inbox import recent_inbox
+from app.inbox import iter_inbox
 from app.gmail_client import get_gmail_service
-from app.gmail_actions import ensure_triage_labels, apply_triage_action
+from app.gmail_actions import ensure_triage_labels, apply_triage_actions_bulk
 from app.db import get_conn, now_iso
 
 router = APIRouter()
@@ -213,10 +214,10 @@ async def save_rules_endpoint(request: Request):
 @router.get("/auto-archive/scan", response_class=HTMLResponse)
 def scan_inbox(request: Request, max_results: int = 50):
     rules = load_rules()
-    inbox = recent_inbox(max_results=max_results)
 
+    # Stream the inbox so large sweeps only hold the matches in memory
     matched = []
-    for item in inbox["items"]:
+    for item in iter_inbox(max_results=max_results, include_body=False):
         reason = _matches(item, rules)
         if reason:
             matched.append({
@@ -259,6 +260,38 @@ def scan_inbox(request: Request, max_results: int = 50):
 
 # ── Apply ────────────────────────────────────────────────────────────────────
 
+def archive_selected(batch_id: str, selected_ids: set[str]) -> dict:
+    """
+    Archive the selected, not-yet-applied messages of an auto-archive batch
+    with bulk batchModify calls and mark them applied in one transaction.
+    """
+    with get_conn() as conn:
+        rows = conn.execute(
+            "SELECT message_id FROM triage_items WHERE batch_id=? AND applied=0",
+            (batch_id,),
+        ).fetchall()
+
+    to_archive = [r["message_id"] for r in rows if r["message_id"] in selected_ids]
+    skipped = len(rows) - len(to_archive)
+    if not to_archive:
+        return {"archived": 0, "skipped": skipped, "errors": []}
+
+    service = get_gmail_service()
+    label_ids_by_name = ensure_triage_labels(service)
+    archived_ids, errors = apply_triage_actions_bulk(
+        service, [(mid, "ARCHIVE") for mid in to_archive], label_ids_by_name, archive=True
+    )
+
+    ts = now_iso()
+    with get_conn() as conn:
+        conn.executemany(
+            "UPDATE triage_items SET applied=1, approved=1, applied_at=? WHERE batch_id=? AND message_id=?",
+            [(ts, batch_id, mid) for mid in archived_ids],
+        )
+
+    return {"archived": len(archived_ids), "skipped": skipped, "errors": errors}
+
+
 @router.post("/auto-archive/apply", response_class=HTMLResponse)
 async def apply_auto_archive(request: Request):
     form = await request.form()
@@ -271,39 +304,9 @@ async def apply_auto_archive(request: Request):
             {"request": request, "archived": 0, "skipped": 0, "errors": []},
         )
 
-    service = get_gmail_service()
-    label_ids_by_name = ensure_triage_labels(service)
-
-    archived, skipped, errors = 0, 0, []
-
-    with get_conn() as conn:
-        rows = conn.execute(
-            "SELECT message_id FROM triage_items WHERE batch_id=? AND applied=0",
-            (batch_id,),
-        ).fetchall()
-
-        for row in rows:
-            mid = row["message_id"]
-            if mid not in selected_ids:
-                skipped += 1
-                continue
-            try:
-                apply_triage_action(
-                    service=service,
-                    message_id=mid,
-                    category="ARCHIVE",
-                    label_ids_by_name=label_ids_by_name,
-                    archive=True,
-                )
-                conn.execute(
-                    "UPDATE triage_items SET applied=1, approved=1, applied_at=? WHERE batch_id=? AND message_id=?",
-                    (now_iso(), batch_id, mid),
-                )
-                archived += 1
-            except Exception as e:
-                errors.append({"message_id": mid, "error": str(e)})
+    result = await asyncio.to_thread(archive_selected, batch_id, selected_ids)
 
     return templates.TemplateResponse(
         "auto_archive_applied.html",
-        {"request": request, "archived": archived, "skipped": skipped, "errors": errors},
+        {"request": request, **result},
     )
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.llm import TRIAGE_PREFERENCES
+from app.mock_llm import confident_category
+
+# Confidence recorded for emails decided before the model sees them
+RULE_CONFIDENCE = 0.9
+HEURISTIC_CONFIDENCE = 0.8
+
+# Optional trained-classifier stage between the heuristics and the LLM
+LOCAL_FIRST_PASS = os.getenv("LOCAL_FIRST_PASS", "false").lower() == "true"
+LOCAL_MIN_CONFIDENCE = float(os.getenv("LOCAL_MIN_CONFIDENCE", "0.9"))
+
+
+def _label_for(category: str) -> str:
+    if category == "READ_LATER":
+        return "Triage/ReadLater"
+    if category in ("REPLY", "TASK", "DELEGATE"):
+        return "Triage/Now"
+    return "Triage/Done"
+
+
+def local_item(
+    email: Dict[str, Any], category: str, confidence: float, reason: str, stage: str
+) -> Dict[str, Any]:
+    """A slate item in the model's output shape, decided locally by stage."""
+    return {
+        "message_id": email["message_id"],
+        "thread_id": email["thread_id"],
+        "from": email.get("from", ""),
+        "subject": email.get("subject", ""),
+        "date": email.get("date", ""),
+        "snippet": email.get("snippet", ""),
+        "category": category,
+        "confidence": confidence,
+        "reason": reason,
+        "suggested_labels": [_label_for(category)],
+        "draft_reply": None,
+        "task_suggestion": None,
+        "questions_for_user": [],
+        "decided_by": stage,
+    }
+
+
+def _protected(email: Dict[str, Any]) -> bool:
+    sender = (email.get("from") or "").lower()
+    return any(p.lower() in sender for p in TRIAGE_PREFERENCES["never_auto_archive_if_from_contains"])
+
+
+def pre_classify(
+    emails: List[Dict[str, Any]], rules: Optional[Dict[str, List[str]]] = None
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Cheap stages in front of the model: the auto-archive rules, then the
+    sender/unsubscribe heuristics, then (with LOCAL_FIRST_PASS) the local
+    classifier when it is at least LOCAL_MIN_CONFIDENCE sure. Returns (decided items, emails that still
+    need the model). Senders the preferences protect always go to the model.
+    """
+    from app.auto_archive import _matches, load_rules
+
+    if rules is None:
+        rules = load_rules()
+
+    use_local = False
+    if LOCAL_FIRST_PASS:
+        from app import local_classifier
+        use_local = local_classifier.is_ready()
+
+    decided: List[Dict[str, Any]] = []
+    remaining: List[Dict[str, Any]] = []
+    for e in emails:
+        if _protected(e):
+            remaining.append(e)
+            continue
+
+        rule = _matches(e, rules)
+        if rule:
+            decided.append(local_item(e, "ARCHIVE", RULE_CONFIDENCE, f"Auto-archive rule — {rule}", "rules"))
+            continue
+
+        confident = confident_category(e)
+        if confident:
+            cat, reason = confident
+            decided.append(local_item(e, cat, HEURISTIC_CONFIDENCE, reason, "heuristic"))
+            continue
+
+        if use_local:
+            cat, prob = local_classifier.predict(e)
+            if prob >= LOCAL_MIN_CONFIDENCE:
+                decided.append(
+                    local_item(e, cat, round(prob, 3), "Local model trained on your approvals.", "local")
+                )
+                continue
+
+        remaining.append(e)
+    return decided, remaining
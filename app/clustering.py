@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import os
+import re
+import zlib
+from typing import Any, Dict, List, Tuple
+
+# Near-duplicate grouping so a storm of similar mail (CI alerts, order
+# updates) costs one model call. Emails from the same sender whose SimHash
+# of subject + body differs in at most CLUSTER_MAX_DISTANCE bits share a
+# cluster; only its first email (the representative) goes to the model.
+
+CLUSTERING_ENABLED = os.getenv("TRIAGE_CLUSTERING", "true").lower() == "true"
+CLUSTER_MAX_DISTANCE = int(os.getenv("CLUSTER_MAX_DISTANCE", "3"))
+
+_TOKEN_RE = re.compile(r"\w+")
+_DIGITS_RE = re.compile(r"\d+")
+_ADDRESS_RE = re.compile(r"<([^>]+)>")
+
+
+def _sender_key(email: Dict[str, Any]) -> str:
+    sender = (email.get("from") or "").lower()
+    m = _ADDRESS_RE.search(sender)
+    return (m.group(1) if m else sender).strip()
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of word bigrams; digits are masked so #123 and #124 match."""
+    tokens = _TOKEN_RE.findall(_DIGITS_RE.sub("0", text.lower()))
+    shingles = [" ".join(tokens[i:i + 2]) for i in range(max(1, len(tokens) - 1))]
+    weights = [0] * 64
+    for sh in shingles:
+        # Two crc32 halves give a stable 64-bit hash across processes
+        data = sh.encode("utf-8")
+        h = zlib.crc32(data) | (zlib.crc32(data, 0x9E3779B9) << 32)
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def _fingerprint(email: Dict[str, Any]) -> int:
+    return simhash(f"{email.get('subject') or ''} {email.get('body_preview') or email.get('snippet') or ''}")
+
+
+def cluster(emails: List[Dict[str, Any]]) -> List[Tuple[str, List[Dict[str, Any]]]]:
+    """
+    [(cluster_id, members)] in inbox order of each cluster's first email,
+    which is its representative. Every email lands in exactly one cluster.
+    """
+    clusters: List[Tuple[str, List[Dict[str, Any]]]] = []
+    # sender -> [(fingerprint, index into clusters)]
+    by_sender: Dict[str, List[Tuple[int, int]]] = {}
+    for e in emails:
+        fp = _fingerprint(e)
+        key = _sender_key(e)
+        candidates = by_sender.setdefault(key, [])
+        if CLUSTERING_ENABLED:
+            for rep_fp, idx in candidates:
+                if bin(fp ^ rep_fp).count("1") <= CLUSTER_MAX_DISTANCE:
+                    clusters[idx][1].append(e)
+                    break
+            else:
+                candidates.append((fp, len(clusters)))
+                clusters.append((f"{fp:016x}", [e]))
+        else:
+            clusters.append((f"{fp:016x}", [e]))
+    return clusters
+
+
+def expand(item: Dict[str, Any], cluster_id: str, members: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    The representative's item plus a copy of its classification for every
+    other member. Copies carry no draft: a reply is specific to its thread.
+    """
+    if len(members) == 1:
+        return [item]
+
+    out = [{**item, "cluster_id": cluster_id}]
+    for e in members[1:]:
+        out.append({
+            **item,
+            "message_id": e["message_id"],
+            "thread_id": e["thread_id"],
+            "from": e.get("from", ""),
+            "subject": e.get("subject", ""),
+            "date": e.get("date", ""),
+            "snippet": e.get("snippet", ""),
+            "draft_reply": None,
+            "reason": f"{item.get('reason') or ''} (Shared by {len(members)} similar emails.)".strip(),
+            "cluster_id": cluster_id,
+            "decided_by": "cluster",
+        })
+    return out
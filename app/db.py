@@ -98,16 +98,88 @@ def init_db() -> None:
             """
         )
 
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sync_state (
+                key TEXT PRIMARY KEY,
+                value TEXT,
+                updated_at TEXT NOT NULL
+            )
+            """
+        )
+
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS message_cache (
+                message_id TEXT PRIMARY KEY,
+                item_json TEXT NOT NULL,
+                last_access REAL NOT NULL,
+                created_at TEXT NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_access ON message_cache(last_access)")
+
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS triage_cache (
+                message_id TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                prefs_hash TEXT NOT NULL,
+                result_json TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (message_id, model, prompt_version, prefs_hash)
+            )
+            """
+        )
+
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                params_json TEXT NOT NULL,
+                state TEXT NOT NULL,
+                progress_done INTEGER DEFAULT 0,
+                progress_total INTEGER DEFAULT 0,
+                batch_id TEXT,
+                result_json TEXT,
+                error TEXT,
+                created_at TEXT NOT NULL,
+                started_at TEXT,
+                finished_at TEXT,
+                updated_at TEXT NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs(state, created_at)")
+
         # Migrations
         for migration in [
             "ALTER TABLE triage_items ADD COLUMN task_suggestion_json TEXT",
             "ALTER TABLE triage_items ADD COLUMN original_category TEXT",
+            "ALTER TABLE triage_items ADD COLUMN decided_by TEXT",
+            "ALTER TABLE triage_items ADD COLUMN cluster_id TEXT",
+            "ALTER TABLE triage_items ADD COLUMN route TEXT",
+            "ALTER TABLE triage_items ADD COLUMN latency_ms INTEGER",
+            "ALTER TABLE batches ADD COLUMN prompt_tokens INTEGER",
+            "ALTER TABLE batches ADD COLUMN prompt_tokens_saved INTEGER",
+            "ALTER TABLE triage_items ADD COLUMN trained_category TEXT",
         ]:
             try:
                 conn.execute(migration)
             except sqlite3.OperationalError:
                 pass  # Column already exists
 
+        # Approved rows the local classifier has not trained on as categorized
+        conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_items_untrained ON triage_items(id)
+            WHERE approved = 1 AND trained_category IS NOT category
+            """
+        )
+
 
 @contextmanager
 def get_conn():
@@ -132,3 +204,18 @@ def require_latest_batch_id(conn: sqlite3.Connection) -> str:
     if not bid:
         raise RuntimeError("No batches found. Run /triage/run first.")
     return bid
+
+
+def get_sync_value(conn: sqlite3.Connection, key: str) -> Optional[str]:
+    row = conn.execute("SELECT value FROM sync_state WHERE key=?", (key,)).fetchone()
+    return row["value"] if row else None
+
+
+def set_sync_value(conn: sqlite3.Connection, key: str, value: str) -> None:
+    conn.execute(
+        """
+        INSERT INTO sync_state (key, value, updated_at) VALUES (?, ?, ?)
+        ON CONFLICT(key) DO UPDATE SET value=excluded.value, updated_at=excluded.updated_at
+        """,
+        (key, value, now_iso()),
+    )
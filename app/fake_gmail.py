@@ -0,0 +1,583 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import urllib.parse
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import httplib2
+import httpx
+
+# Offline stand-in for the Gmail REST API. It serves the endpoints this app
+# uses (messages list/get/modify/batchModify/send, batch HTTP, labels,
+# drafts, history, profile) from an in-memory mailbox, so the real
+# googleapiclient and httpx code paths run unchanged. Selected with
+# GMAIL_BACKEND=fake (see gmail_client / gmail_async).
+#
+#   FAKE_GMAIL_MESSAGES        synthetic mailbox size (default 500)
+#   FAKE_GMAIL_CORPUS          JSON list of recorded messages (format=full) instead
+#   FAKE_GMAIL_LATENCY_MS      added to every HTTP round trip
+#   FAKE_GMAIL_ERROR_RATE      probability a call answers 500
+#   FAKE_GMAIL_RATE_LIMIT_RATE probability a call answers 429
+#   FAKE_GMAIL_SEED            seed for the corpus and fault injection
+
+API_PREFIX = "/gmail/v1/users/me/"
+SYSTEM_LABELS = ["INBOX", "UNREAD", "IMPORTANT", "SENT", "DRAFT", "SPAM", "TRASH", "STARRED"]
+BATCH_MODIFY_MAX_IDS = 1000
+HISTORY_PAGE_SIZE = 100
+_ID_RE = re.compile(r"[0-9a-fA-F]+")
+
+
+class _ApiError(Exception):
+    def __init__(self, status: int, message: str, reason: str = ""):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+
+    def body(self) -> Dict[str, Any]:
+        return {
+            "error": {
+                "code": self.status,
+                "message": str(self),
+                "errors": [{"message": str(self), "reason": self.reason or "failed"}],
+            }
+        }
+
+
+# ── Synthetic corpus ──────────────────────────────────────────────────────────
+
+_PEOPLE = ["Dana Lee", "Sam Ortiz", "Priya Natarajan", "Alex Kim", "Jordan Blake", "Morgan Reyes"]
+_TOPICS = ["the Q3 report", "next week's offsite", "the hiring plan", "the vendor contract", "the launch checklist"]
+
+
+def _b64(text: str) -> str:
+    return base64.urlsafe_b64encode(text.encode("utf-8")).decode("ascii")
+
+
+def _synthetic_message(i: int, rng: random.Random, now: datetime) -> Dict[str, Any]:
+    kind = rng.choices(
+        ["newsletter", "ci", "order", "question", "intro", "fyi", "invoice"],
+        weights=[20, 20, 12, 18, 6, 16, 8],
+    )[0]
+    person = rng.choice(_PEOPLE)
+    first = person.split()[0]
+    addr = person.lower().replace(" ", ".") + "@example.com"
+    topic = rng.choice(_TOPICS)
+    headers = {}
+    mime = "text/plain"
+
+    if kind == "newsletter":
+        sender = "The Weekly Digest <news@digest.example>"
+        subject = f"Issue #{100 + i % 50}: what we're reading this week"
+        body = (
+            "<html><body><div><h1>This week</h1><p>Five long reads on product, design and "
+            f"engineering.</p><p>Story {i}: lessons from scaling a small team.</p>"
+            '<p><a href="https://digest.example/unsubscribe">Unsubscribe</a></p></div></body></html>'
+        )
+        headers["List-Unsubscribe"] = "<https://digest.example/unsubscribe>"
+        mime = "text/html"
+    elif kind == "ci":
+        sender = "CI <notifications@ci.example>"
+        subject = f"Build #{4000 + i} failed on main"
+        body = f"Run {4000 + i} failed.\nJob: test ({rng.randint(1, 9)}m{rng.randint(0, 59)}s)\nView logs: https://ci.example/runs/{4000 + i}"
+    elif kind == "order":
+        sender = "Shop <orders@shop.example>"
+        subject = f"Your order #{70000 + i} has shipped"
+        body = f"Good news! Order #{70000 + i} is on its way. Track it at https://shop.example/track/{i}."
+        headers["List-Unsubscribe"] = "<mailto:unsubscribe@shop.example>"
+    elif kind == "question":
+        sender = f"{person} <{addr}>"
+        subject = f"Quick question about {topic}"
+        body = (
+            f"Hi,\n\nCould you take a look at {topic} and let me know by Friday whether the numbers work?\n\n"
+            f"Thanks,\n{first}\n-- \n{person}\nExample Corp\n\n"
+            f"On Mon, {person} <{addr}> wrote:\n> Earlier thread about {topic}\n> with more quoted lines"
+        )
+    elif kind == "intro":
+        other = rng.choice(_PEOPLE)
+        sender = f"{person} <{addr}>"
+        subject = f"Intro: {other} <> you"
+        body = f"Hi both,\n\nIntroducing {other}, who is working on {topic}. I'll let you two find a time for a quick chat.\n\n{first}"
+    elif kind == "invoice":
+        sender = "Billing <billing@vendor.example>"
+        subject = f"Invoice INV-{2000 + i} due in 30 days"
+        body = f"Please find attached invoice INV-{2000 + i} for ${rng.randint(200, 9000)}. Payment is due in 30 days."
+    else:
+        sender = f"{person} <{addr}>"
+        subject = f"FYI: notes from {topic}"
+        body = f"Sharing my notes from {topic} for reference, no action needed.\n\nSent from my iPhone"
+
+    date = now - timedelta(minutes=7 * i + rng.randint(0, 6))
+    headers.update({"From": sender, "To": "me@example.com", "Subject": subject, "Date": format_datetime(date)})
+    plain = re.sub(r"<[^>]+>", " ", body)
+    return {
+        "id": f"{i + 1:016x}",
+        "threadId": f"{i + 1:016x}",
+        "labelIds": ["INBOX", "UNREAD"] + (["CATEGORY_PROMOTIONS"] if kind in ("newsletter", "order") else []),
+        "snippet": re.sub(r"\s+", " ", plain).strip()[:120],
+        "internalDate": str(int(date.timestamp() * 1000)),
+        "sizeEstimate": len(body) + 600,
+        "payload": {
+            "mimeType": mime,
+            "headers": [{"name": k, "value": v} for k, v in headers.items()],
+            "body": {"size": len(body), "data": _b64(body)},
+        },
+    }
+
+
+def synthetic_corpus(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    now = datetime(2026, 1, 5, 9, 0, tzinfo=timezone.utc)
+    return [_synthetic_message(i, rng, now) for i in range(n)]
+
+
+# ── Mailbox ───────────────────────────────────────────────────────────────────
+
+class FakeMailbox:
+    """Thread-safe in-memory mailbox with Gmail's REST semantics."""
+
+    def __init__(
+        self,
+        messages: List[Dict[str, Any]],
+        latency_ms: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.latency = latency_ms / 1000.0
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.RLock()
+        self._messages: Dict[str, Dict[str, Any]] = {}
+        self._labels: Dict[str, Dict[str, Any]] = {
+            name: {"id": name, "name": name, "type": "system"} for name in SYSTEM_LABELS
+        }
+        self._history: List[Dict[str, Any]] = []
+        self._history_id = 1000
+        self._next_id = 0
+        # (q, labelIds) -> matching ids newest first, valid while _history_id is unchanged
+        self._list_cache: Dict[Tuple[str, Tuple[str, ...]], Tuple[int, List[Dict[str, Any]]]] = {}
+        self.sent: List[Dict[str, Any]] = []
+        self.drafts: List[Dict[str, Any]] = []
+        self.calls: Dict[str, int] = {}
+        self.round_trips = 0
+        self.injected_errors = 0
+        for m in messages:
+            self._messages[m["id"]] = json.loads(json.dumps(m))
+            self._next_id = max(self._next_id, int(m["id"], 16) if re.fullmatch(r"[0-9a-f]+", m["id"]) else 0)
+
+    # ── Test hooks ────────────────────────────────────────────────────────────
+
+    def add_message(self, message: Dict[str, Any]) -> None:
+        """Deliver a new message (recorded as messageAdded in history)."""
+        with self._lock:
+            self._messages[message["id"]] = message
+            self._record({"messagesAdded": [{"message": self._ref(message)}]})
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": dict(self.calls),
+                "total_calls": sum(self.calls.values()),
+                "round_trips": self.round_trips,
+                "injected_errors": self.injected_errors,
+                "messages": len(self._messages),
+                "sent": len(self.sent),
+                "drafts": len(self.drafts),
+            }
+
+    # ── Internals ─────────────────────────────────────────────────────────────
+
+    def _ref(self, m: Dict[str, Any]) -> Dict[str, Any]:
+        return {"id": m["id"], "threadId": m["threadId"], "labelIds": list(m.get("labelIds", []))}
+
+    def _record(self, change: Dict[str, Any]) -> None:
+        self._history_id += 1
+        self._history.append({"id": str(self._history_id), **change})
+
+    def _check_id(self, message_id: str) -> None:
+        # Gmail ids are hex; anything else is rejected before any lookup
+        if not _ID_RE.fullmatch(message_id or ""):
+            raise _ApiError(400, "Invalid id value", "invalidArgument")
+
+    def _message(self, message_id: str) -> Dict[str, Any]:
+        self._check_id(message_id)
+        m = self._messages.get(message_id)
+        if m is None:
+            raise _ApiError(404, "Requested entity was not found.", "notFound")
+        return m
+
+    def _inject_faults(self) -> None:
+        roll = self._rng.random()
+        if roll < self.rate_limit_rate:
+            self.injected_errors += 1
+            raise _ApiError(429, "Too many concurrent requests for user", "rateLimitExceeded")
+        if roll < self.rate_limit_rate + self.error_rate:
+            self.injected_errors += 1
+            raise _ApiError(500, "Backend Error", "backendError")
+
+    def _apply_labels(self, m: Dict[str, Any], add: List[str], remove: List[str]) -> None:
+        for lid in add + remove:
+            if lid not in self._labels:
+                raise _ApiError(400, f"Invalid label: {lid}", "invalidArgument")
+        labels = m.setdefault("labelIds", [])
+        added = [l for l in add if l not in labels]
+        removed = [l for l in remove if l in labels and l not in add]
+        labels.extend(added)
+        m["labelIds"] = [l for l in labels if l not in removed]
+        if added:
+            self._record({"labelsAdded": [{"message": self._ref(m), "labelIds": added}]})
+        if removed:
+            self._record({"labelsRemoved": [{"message": self._ref(m), "labelIds": removed}]})
+
+    def _matches(self, m: Dict[str, Any], q: str, label_ids: List[str]) -> bool:
+        labels = set(m.get("labelIds", []))
+        if any(l not in labels for l in label_ids):
+            return False
+        headers = {h["name"].lower(): h["value"] for h in m.get("payload", {}).get("headers", [])}
+        for term in q.split():
+            negate = term.startswith("-")
+            term = term.lstrip("-")
+            key, _, value = term.partition(":")
+            if key == "in" and value:
+                hit = value.upper() in labels
+            elif key == "is" and value:
+                hit = value.upper() in labels
+            elif key == "from" and value:
+                hit = value.lower() in headers.get("from", "").lower()
+            else:
+                hit = term.lower() in (headers.get("subject", "") + " " + m.get("snippet", "")).lower()
+            if hit == negate:
+                return False
+        return True
+
+    def _format(self, m: Dict[str, Any], fmt: str, metadata_headers: List[str]) -> Dict[str, Any]:
+        out = {k: v for k, v in m.items() if k != "payload"}
+        out["historyId"] = str(self._history_id)
+        if fmt == "minimal":
+            return out
+        payload = m.get("payload", {})
+        if fmt == "metadata":
+            wanted = {h.lower() for h in metadata_headers}
+            headers = [h for h in payload.get("headers", []) if not wanted or h["name"].lower() in wanted]
+            out["payload"] = {"mimeType": payload.get("mimeType"), "headers": headers}
+            return out
+        out["payload"] = payload
+        return out
+
+    # ── REST dispatch ─────────────────────────────────────────────────────────
+
+    def handle(self, method: str, path: str, query: Dict[str, List[str]], body: Any) -> Tuple[int, Any]:
+        """(status, JSON body) for one API call; path is relative to users/me/."""
+        with self._lock:
+            try:
+                name, result = self._route(method, path.strip("/"), query, body)
+                return 200, result
+            except _ApiError as e:
+                return e.status, e.body()
+
+    def _count(self, name: str) -> None:
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def _route(self, method: str, path: str, query: Dict[str, List[str]], body: Any) -> Tuple[str, Any]:
+        q1 = lambda k, d=None: (query.get(k) or [d])[0]  # noqa: E731
+        parts = path.split("/")
+
+        if path == "profile" and method == "GET":
+            name = "getProfile"
+        elif path == "messages" and method == "GET":
+            name = "messages.list"
+        elif path == "messages/batchModify" and method == "POST":
+            name = "messages.batchModify"
+        elif path == "messages/send" and method == "POST":
+            name = "messages.send"
+        elif len(parts) == 2 and parts[0] == "messages" and method == "GET":
+            name = "messages.get"
+        elif len(parts) == 3 and parts[0] == "messages" and parts[2] == "modify" and method == "POST":
+            name = "messages.modify"
+        elif path == "labels":
+            name = "labels.list" if method == "GET" else "labels.create"
+        elif path == "drafts" and method == "POST":
+            name = "drafts.create"
+        elif path == "history" and method == "GET":
+            name = "history.list"
+        else:
+            raise _ApiError(404, f"Not found: {method} {path}", "notFound")
+
+        self._count(name)
+        self._inject_faults()
+
+        if name == "getProfile":
+            return name, {
+                "emailAddress": "me@example.com",
+                "messagesTotal": len(self._messages),
+                "threadsTotal": len({m["threadId"] for m in self._messages.values()}),
+                "historyId": str(self._history_id),
+            }
+
+        if name == "messages.list":
+            key = (q1("q", ""), tuple(query.get("labelIds") or []))
+            cached = self._list_cache.get(key)
+            if cached and cached[0] == self._history_id:
+                matches = cached[1]
+            else:
+                matches = sorted(
+                    (m for m in self._messages.values() if self._matches(m, key[0], list(key[1]))),
+                    key=lambda m: int(m.get("internalDate", 0)),
+                    reverse=True,
+                )
+                self._list_cache[key] = (self._history_id, matches)
+            start = int(q1("pageToken", "0") or 0)
+            size = min(int(q1("maxResults", "100")), 500)
+            page = matches[start:start + size]
+            res: Dict[str, Any] = {"resultSizeEstimate": len(matches)}
+            if page:
+                res["messages"] = [{"id": m["id"], "threadId": m["threadId"]} for m in page]
+            if start + size < len(matches):
+                res["nextPageToken"] = str(start + size)
+            return name, res
+
+        if name == "messages.get":
+            return name, self._format(self._message(parts[1]), q1("format", "full"), query.get("metadataHeaders") or [])
+
+        if name == "messages.modify":
+            m = self._message(parts[1])
+            self._apply_labels(m, body.get("addLabelIds") or [], body.get("removeLabelIds") or [])
+            return name, self._ref(m)
+
+        if name == "messages.batchModify":
+            ids = body.get("ids") or []
+            if len(ids) > BATCH_MODIFY_MAX_IDS:
+                raise _ApiError(400, f"Too many ids ({len(ids)} > {BATCH_MODIFY_MAX_IDS})", "invalidArgument")
+            for mid in ids:
+                self._check_id(mid)  # one malformed id fails the whole call
+            for mid in ids:
+                m = self._messages.get(mid)
+                if m is not None:  # Gmail ignores ids that no longer exist
+                    self._apply_labels(m, body.get("addLabelIds") or [], body.get("removeLabelIds") or [])
+            return name, {}
+
+        if name == "messages.send":
+            self._next_id += 1
+            sent = {"id": f"{self._next_id:016x}", "threadId": body.get("threadId") or f"{self._next_id:016x}", "labelIds": ["SENT"]}
+            self.sent.append({**sent, "raw": body.get("raw")})
+            return name, sent
+
+        if name == "drafts.create":
+            self._next_id += 1
+            msg = body.get("message") or {}
+            draft = {
+                "id": f"r{self._next_id}",
+                "message": {"id": f"{self._next_id:016x}", "threadId": msg.get("threadId") or f"{self._next_id:016x}", "labelIds": ["DRAFT"]},
+            }
+            self.drafts.append({**draft, "raw": msg.get("raw")})
+            return name, draft
+
+        if name == "labels.list":
+            return name, {"labels": list(self._labels.values())}
+
+        if name == "labels.create":
+            if any(l["name"] == body.get("name") for l in self._labels.values()):
+                raise _ApiError(409, "Label name exists or conflicts", "duplicate")
+            label = {**body, "id": f"Label_{len(self._labels) + 1}"}
+            self._labels[label["id"]] = label
+            return name, label
+
+        # history.list
+        start = int(q1("startHistoryId", "0"))
+        oldest = int(self._history[0]["id"]) - 1 if self._history else self._history_id
+        if start < oldest:
+            raise _ApiError(404, "Requested entity was not found.", "notFound")
+        label = q1("labelId")
+        records = [h for h in self._history if int(h["id"]) > start]
+        if label:
+            records = [
+                h for h in records
+                if any(label in rec["message"].get("labelIds", []) or label in rec.get("labelIds", [])
+                       for key in ("messagesAdded", "labelsAdded", "labelsRemoved", "messagesDeleted")
+                       for rec in h.get(key, []))
+            ]
+        offset = int(q1("pageToken", "0") or 0)
+        res = {"history": records[offset:offset + HISTORY_PAGE_SIZE], "historyId": str(self._history_id)}
+        if offset + HISTORY_PAGE_SIZE < len(records):
+            res["nextPageToken"] = str(offset + HISTORY_PAGE_SIZE)
+        return name, res
+
+
+# ── Transports ────────────────────────────────────────────────────────────────
+
+def _split(url: str) -> Tuple[str, Dict[str, List[str]]]:
+    parts = urllib.parse.urlsplit(url)
+    return parts.path, urllib.parse.parse_qs(parts.query)
+
+
+def _json_body(body: Any) -> Any:
+    if not body:
+        return {}
+    if isinstance(body, bytes):
+        body = body.decode("utf-8")
+    return json.loads(body)
+
+
+_STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 409: "Conflict", 429: "Too Many Requests", 500: "Internal Server Error"}
+
+
+class FakeHttp:
+    """httplib2.Http replacement for googleapiclient, including batch requests."""
+
+    timeout = None
+
+    def __init__(self, mailbox: FakeMailbox):
+        self.mailbox = mailbox
+
+    def _call(self, method: str, url: str, body: Any) -> Tuple[int, Any]:
+        path, query = _split(url)
+        if not path.startswith(API_PREFIX):
+            return 404, {"error": {"code": 404, "message": f"Not found: {path}"}}
+        return self.mailbox.handle(method, path[len(API_PREFIX):], query, _json_body(body))
+
+    def _batch(self, body: str, content_type: str) -> Tuple[httplib2.Response, bytes]:
+        boundary = re.search(r'boundary="?([^";]+)"?', content_type).group(1)
+        out_boundary = "batch_fake_response"
+        parts_out: List[str] = []
+        for part in body.split(f"--{boundary}"):
+            m = re.search(r"Content-ID:\s*<([^>]+)>", part)
+            if not m:
+                continue
+            request = part.split("\n\n", 1)[1] if "\n\n" in part else ""
+            request = request.replace("\r\n", "\n")
+            head, _, req_body = request.partition("\n\n")
+            method, url = head.split("\n", 1)[0].split(" ")[:2]
+            status, payload = self._call(method, url, req_body.strip())
+            parts_out.append(
+                f"--{out_boundary}\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{m.group(1)}>\r\n\r\n"
+                f"HTTP/1.1 {status} {_STATUS_TEXT.get(status, 'Error')}\r\n"
+                f"Content-Type: application/json; charset=UTF-8\r\n\r\n{json.dumps(payload)}\r\n"
+            )
+        content = "".join(parts_out) + f"--{out_boundary}--\r\n"
+        resp = httplib2.Response({"status": 200, "content-type": f"multipart/mixed; boundary={out_boundary}"})
+        return resp, content.encode("utf-8")
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=None, connection_type=None):
+        with self.mailbox._lock:
+            self.mailbox.round_trips += 1
+        if self.mailbox.latency:
+            time.sleep(self.mailbox.latency)
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        if urllib.parse.urlsplit(uri).path.split("/")[1] == "batch":
+            if isinstance(body, bytes):
+                body = body.decode("utf-8")
+            return self._batch(body, headers.get("content-type", ""))
+        status, payload = self._call(method, uri, body)
+        resp = httplib2.Response({"status": status, "content-type": "application/json; charset=UTF-8"})
+        return resp, json.dumps(payload).encode("utf-8")
+
+
+def async_transport(mailbox: FakeMailbox) -> httpx.MockTransport:
+    """httpx transport for AsyncGmailClient backed by the same mailbox."""
+
+    async def _handler(request: httpx.Request) -> httpx.Response:
+        with mailbox._lock:
+            mailbox.round_trips += 1
+        if mailbox.latency:
+            await asyncio.sleep(mailbox.latency)
+        path = request.url.path
+        if not path.startswith(API_PREFIX):
+            return httpx.Response(404, json={"error": {"code": 404, "message": f"Not found: {path}"}})
+        query = urllib.parse.parse_qs(request.url.query.decode("ascii"))
+        status, payload = mailbox.handle(request.method, path[len(API_PREFIX):], query, _json_body(request.content))
+        return httpx.Response(status, json=payload)
+
+    return httpx.MockTransport(_handler)
+
+
+# ── Process-wide mailbox ──────────────────────────────────────────────────────
+
+_mailbox: FakeMailbox | None = None
+_mailbox_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return os.getenv("GMAIL_BACKEND", "google").lower() == "fake"
+
+
+def configure(
+    messages: Optional[int] = None,
+    corpus_path: Optional[str] = None,
+    latency_ms: Optional[float] = None,
+    error_rate: Optional[float] = None,
+    rate_limit_rate: Optional[float] = None,
+    seed: Optional[int] = None,
+) -> FakeMailbox:
+    """(Re)build the shared mailbox; arguments left as None come from the env."""
+    global _mailbox
+    seed = int(os.getenv("FAKE_GMAIL_SEED", "0")) if seed is None else seed
+    corpus_path = corpus_path or os.getenv("FAKE_GMAIL_CORPUS")
+    if corpus_path:
+        with open(corpus_path) as f:
+            corpus = json.load(f)
+    else:
+        corpus = synthetic_corpus(
+            int(os.getenv("FAKE_GMAIL_MESSAGES", "500")) if messages is None else messages, seed
+        )
+    mailbox = FakeMailbox(
+        corpus,
+        latency_ms=float(os.getenv("FAKE_GMAIL_LATENCY_MS", "0")) if latency_ms is None else latency_ms,
+        error_rate=float(os.getenv("FAKE_GMAIL_ERROR_RATE", "0")) if error_rate is None else error_rate,
+        rate_limit_rate=(
+            float(os.getenv("FAKE_GMAIL_RATE_LIMIT_RATE", "0")) if rate_limit_rate is None else rate_limit_rate
+        ),
+        seed=seed,
+    )
+    with _mailbox_lock:
+        _mailbox = mailbox
+    return mailbox
+
+
+def get_mailbox() -> FakeMailbox:
+    with _mailbox_lock:
+        if _mailbox is not None:
+            return _mailbox
+    return configure()
+
+
+def record_corpus(path: str, max_results: int = 500) -> int:
+    """Save real inbox messages (format=full) as a corpus for FAKE_GMAIL_CORPUS."""
+    from app.gmail_client import get_gmail_service
+    from app.inbox import INBOX_QUERY, fetch_messages
+
+    service = get_gmail_service()
+    ids: List[str] = []
+    page_token = None
+    while len(ids) < max_results:
+        res = service.users().messages().list(
+            userId="me", q=INBOX_QUERY, maxResults=min(500, max_results - len(ids)), pageToken=page_token
+        ).execute()
+        ids += [m["id"] for m in res.get("messages", [])]
+        page_token = res.get("nextPageToken")
+        if not page_token:
+            break
+    messages = fetch_messages(service, ids, fmt="full")
+    with open(path, "w") as f:
+        json.dump([messages[mid] for mid in ids if mid in messages], f)
+    return len(messages)
+
+
+if __name__ == "__main__":
+    # python -m app.fake_gmail record corpus.json [max_results]
+    if len(sys.argv) >= 3 and sys.argv[1] == "record":
+        n = record_corpus(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 500)
+        print(f"Recorded {n} messages to {sys.argv[2]}")
+    else:
+        print("usage: python -m app.fake_gmail record <corpus.json> [max_results]")
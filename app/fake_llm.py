@@ -0,0 +1,459 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from app.mock_llm import confident_category, draft_with_mock
+
+# Offline stand-ins for the Gemini and Claude SDK clients, selected with
+# LLM_BACKEND:
+#
+#   live    the real SDKs (default)
+#   fake    replay responses from FAKE_LLM_RECORDINGS; prompts that were never
+#           recorded get a synthetic, schema-valid response
+#   record  the real SDKs, with every response appended to FAKE_LLM_RECORDINGS
+#
+# Fakes implement only what llm.py calls (models.generate_content[_stream],
+# aio.models.generate_content, messages.create/stream) and inject latency,
+# transient errors, rate limits and truncated output on request.
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "live").lower()
+RECORDINGS_PATH = os.getenv("FAKE_LLM_RECORDINGS", "data/llm_recordings.jsonl")
+FAKE_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "0"))
+FAKE_MS_PER_OUTPUT_TOKEN = float(os.getenv("FAKE_LLM_MS_PER_OUTPUT_TOKEN", "0"))
+FAKE_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+FAKE_RATE_LIMIT_RATE = float(os.getenv("FAKE_LLM_RATE_LIMIT_RATE", "0"))
+FAKE_TRUNCATE_RATE = float(os.getenv("FAKE_LLM_TRUNCATE_RATE", "0"))
+FAKE_SEED = int(os.getenv("FAKE_LLM_SEED", "0"))
+
+CHARS_PER_TOKEN = 4
+STREAM_FRAGMENT_CHARS = 48
+
+
+class FakeAPIError(RuntimeError):
+    """Injected failure; status_code makes llm_dispatch treat it as transient."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def enabled() -> bool:
+    return LLM_BACKEND == "fake"
+
+
+def _key(system: str, contents: str) -> str:
+    return hashlib.sha256(f"{system}\n{contents}".encode("utf-8")).hexdigest()
+
+
+# ── Synthetic responses ───────────────────────────────────────────────────────
+
+def _unit(message_id: str) -> float:
+    """Stable 0..1 value per email, so confidences are reproducible."""
+    return (zlib.crc32(message_id.encode("utf-8")) % 1000) / 1000.0
+
+
+def _classify(e: Dict[str, Any]) -> tuple:
+    confident = confident_category(
+        {"subject": e.get("subject"), "from": e.get("from"), "has_list_unsubscribe": e.get("list")}
+    )
+    u = _unit(e.get("message_id", ""))
+    if confident:
+        return confident[0], confident[1], round(0.9 + 0.08 * u, 2)
+    text = f"{e.get('subject') or ''} {e.get('body') or ''}".lower()
+    if "invoice" in text or "billing" in text:
+        return "DELEGATE", "Billing request for whoever handles payments.", round(0.6 + 0.35 * u, 2)
+    if any(x in text for x in ["intro", "meeting", "quick chat", "availability", "?"]):
+        return "REPLY", "Sender is waiting on an answer.", round(0.6 + 0.35 * u, 2)
+    if any(x in text for x in ["take a look", "review", "by friday", "let me know"]):
+        return "TASK", "Asks for work before a deadline.", round(0.6 + 0.35 * u, 2)
+    return "ARCHIVE", "No action requested.", round(0.55 + 0.4 * u, 2)
+
+
+def _synthetic_triage(emails: List[Dict[str, Any]], inline_drafts: bool) -> Dict[str, Any]:
+    items = []
+    counts: Dict[str, int] = {}
+    for e in emails:
+        cat, reason, confidence = _classify(e)
+        counts[cat] = counts.get(cat, 0) + 1
+        item = {
+            "message_id": e["message_id"],
+            "category": cat,
+            "confidence": confidence,
+            "reason": reason,
+            "suggested_labels": [
+                f"Triage/{'ReadLater' if cat == 'READ_LATER' else 'Now' if cat in ('REPLY', 'TASK', 'DELEGATE') else 'Done'}"
+            ],
+        }
+        if inline_drafts:
+            item["draft_reply"] = draft_with_mock(e) if cat == "REPLY" else None
+            item["task_suggestion"] = (
+                {"title": e.get("subject") or "Follow up", "notes": "", "due": ""} if cat == "TASK" else None
+            )
+            item["questions_for_user"] = []
+        items.append(item)
+    summary = ", ".join(f"{n} {c}" for c, n in sorted(counts.items()))
+    return {"batch_summary": f"{len(items)} emails: {summary}.", "items": items}
+
+
+def _synthetic_summary(emails: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "headline": f"{len(emails)} emails, mostly routine.",
+        "key_actions": [f"{e.get('from', '?')}: {e.get('subject', '(no subject)')}" for e in emails[:5]],
+        "fyi": [],
+        "total": len(emails),
+    }
+
+
+def synthesize(system: str, contents: str) -> str:
+    """A valid response for one of llm.py's prompts, derived from its input."""
+    try:
+        payload = json.loads(contents)
+    except ValueError:
+        payload = {}
+    if "email" in payload:
+        return json.dumps(draft_with_mock(payload["email"]))
+    emails = payload.get("emails") or []
+    if "summariz" in system.lower():
+        return json.dumps(_synthetic_summary(emails))
+    return json.dumps(_synthetic_triage(emails, inline_drafts='"draft_reply"' in system))
+
+
+# ── Backend ───────────────────────────────────────────────────────────────────
+
+class _Backend:
+    """Recordings, fault injection and call counters shared by every fake client."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._rng = random.Random(FAKE_SEED)
+        self._recordings: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        self.configure()
+        self.reset_stats()
+
+    def configure(
+        self,
+        latency_ms: float = FAKE_LATENCY_MS,
+        ms_per_output_token: float = FAKE_MS_PER_OUTPUT_TOKEN,
+        error_rate: float = FAKE_ERROR_RATE,
+        rate_limit_rate: float = FAKE_RATE_LIMIT_RATE,
+        truncate_rate: float = FAKE_TRUNCATE_RATE,
+    ) -> None:
+        self.latency_ms = latency_ms
+        self.ms_per_output_token = ms_per_output_token
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.truncate_rate = truncate_rate
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._stats = {
+                "calls": 0, "replayed": 0, "synthesized": 0, "errors_injected": 0,
+                "truncated": 0, "tokens_in": 0, "tokens_out": 0, "by_model": {},
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "by_model": dict(self._stats["by_model"])}
+
+    def _load(self) -> Dict[str, List[Dict[str, Any]]]:
+        if self._recordings is None:
+            recordings: Dict[str, List[Dict[str, Any]]] = {}
+            if os.path.exists(RECORDINGS_PATH):
+                with open(RECORDINGS_PATH) as f:
+                    for line in f:
+                        if line.strip():
+                            rec = json.loads(line)
+                            recordings.setdefault(rec["key"], []).append(rec)
+            self._recordings = recordings
+        return self._recordings
+
+    def record(self, provider: str, model: str, system: str, contents: str, text: str) -> None:
+        rec = {"key": _key(system, contents), "provider": provider, "model": model, "text": text}
+        with self._lock:
+            directory = os.path.dirname(RECORDINGS_PATH)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(RECORDINGS_PATH, "a") as f:
+                f.write(json.dumps(rec) + "\n")
+            if self._recordings is not None:
+                self._recordings.setdefault(rec["key"], []).append(rec)
+
+    def respond(self, model: str, system: str, contents: str) -> tuple:
+        """(text, seconds the fake provider takes), or raises an injected error."""
+        with self._lock:
+            recs = self._load().get(_key(system, contents))
+            roll = self._rng.random()
+            truncate = self._rng.random() < self.truncate_rate
+            self._stats["calls"] += 1
+            self._stats["by_model"][model] = self._stats["by_model"].get(model, 0) + 1
+            self._stats["tokens_in"] += (len(system) + len(contents)) // CHARS_PER_TOKEN
+            if roll < self.rate_limit_rate:
+                self._stats["errors_injected"] += 1
+                raise FakeAPIError(429, "Injected rate limit")
+            if roll < self.rate_limit_rate + self.error_rate:
+                self._stats["errors_injected"] += 1
+                raise FakeAPIError(503, "Injected server error")
+            if recs:
+                self._stats["replayed"] += 1
+                text = next((r for r in recs if r["model"] == model), recs[0])["text"]
+            else:
+                self._stats["synthesized"] += 1
+                text = None
+        if text is None:
+            text = synthesize(system, contents)
+        if truncate and len(text) > 2:
+            text = text[: len(text) // 2]
+            with self._lock:
+                self._stats["truncated"] += 1
+        tokens_out = len(text) // CHARS_PER_TOKEN
+        with self._lock:
+            self._stats["tokens_out"] += tokens_out
+        seconds = (self.latency_ms + self.ms_per_output_token * tokens_out) / 1000.0
+        return text, seconds
+
+
+_backend = _Backend()
+
+
+def configure(**kwargs: float) -> None:
+    """Change injected latency/failure rates at runtime (benchmarks, demos)."""
+    _backend.configure(**kwargs)
+
+
+def stats() -> Dict[str, Any]:
+    return _backend.stats()
+
+
+def reset_stats() -> None:
+    _backend.reset_stats()
+
+
+def _fragments(text: str) -> Iterator[str]:
+    for i in range(0, len(text), STREAM_FRAGMENT_CHARS):
+        yield text[i:i + STREAM_FRAGMENT_CHARS]
+
+
+def _stream(text: str, seconds: float) -> Iterator[str]:
+    """Fragments of text, with a third of the latency before the first one."""
+    parts = list(_fragments(text))
+    time.sleep(seconds / 3)
+    step = (seconds - seconds / 3) / max(1, len(parts))
+    for part in parts:
+        yield part
+        time.sleep(step)
+
+
+# ── Gemini ────────────────────────────────────────────────────────────────────
+
+class _GeminiResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+def _system_of(config: Any) -> str:
+    return str(getattr(config, "system_instruction", "") or "")
+
+
+class _GeminiModels:
+    def generate_content(self, model: str, contents: str, config: Any = None) -> _GeminiResponse:
+        text, seconds = _backend.respond(model, _system_of(config), contents)
+        time.sleep(seconds)
+        return _GeminiResponse(text)
+
+    def generate_content_stream(self, model: str, contents: str, config: Any = None) -> Iterator[_GeminiResponse]:
+        text, seconds = _backend.respond(model, _system_of(config), contents)
+        for part in _stream(text, seconds):
+            yield _GeminiResponse(part)
+
+
+class _GeminiAsyncModels:
+    async def generate_content(self, model: str, contents: str, config: Any = None) -> _GeminiResponse:
+        text, seconds = _backend.respond(model, _system_of(config), contents)
+        await asyncio.sleep(seconds)
+        return _GeminiResponse(text)
+
+
+class _GeminiAio:
+    def __init__(self) -> None:
+        self.models = _GeminiAsyncModels()
+
+
+class FakeGeminiClient:
+    def __init__(self) -> None:
+        self.models = _GeminiModels()
+        self.aio = _GeminiAio()
+
+
+# ── Claude ────────────────────────────────────────────────────────────────────
+
+class _TextBlock:
+    type = "text"
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _ClaudeMessage:
+    def __init__(self, text: str, model: str):
+        self.content = [_TextBlock(text)]
+        self.model = model
+        self.stop_reason = "end_turn"
+
+
+class _ClaudeStream:
+    def __init__(self, text: str, seconds: float):
+        self.text_stream = _stream(text, seconds)
+
+    def __enter__(self) -> "_ClaudeStream":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        return None
+
+
+def _user_text(messages: List[Dict[str, Any]]) -> str:
+    return messages[-1]["content"] if messages else ""
+
+
+class _ClaudeMessages:
+    def create(self, model: str, system: str, messages: List[Dict[str, Any]], **kwargs: Any) -> _ClaudeMessage:
+        text, seconds = _backend.respond(model, system, _user_text(messages))
+        time.sleep(seconds)
+        return _ClaudeMessage(text, model)
+
+    def stream(self, model: str, system: str, messages: List[Dict[str, Any]], **kwargs: Any) -> _ClaudeStream:
+        return _ClaudeStream(*_backend.respond(model, system, _user_text(messages)))
+
+
+class _ClaudeAsyncMessages:
+    async def create(self, model: str, system: str, messages: List[Dict[str, Any]], **kwargs: Any) -> _ClaudeMessage:
+        text, seconds = _backend.respond(model, system, _user_text(messages))
+        await asyncio.sleep(seconds)
+        return _ClaudeMessage(text, model)
+
+
+class FakeClaudeClient:
+    def __init__(self) -> None:
+        self.messages = _ClaudeMessages()
+
+
+class FakeAsyncClaudeClient:
+    def __init__(self) -> None:
+        self.messages = _ClaudeAsyncMessages()
+
+
+# ── Recording wrappers ────────────────────────────────────────────────────────
+
+class _RecordingGeminiModels:
+    def __init__(self, models: Any):
+        self._models = models
+
+    def generate_content(self, model: str, contents: str, config: Any = None) -> Any:
+        resp = self._models.generate_content(model=model, contents=contents, config=config)
+        _backend.record("gemini", model, _system_of(config), contents, resp.text or "")
+        return resp
+
+    def generate_content_stream(self, model: str, contents: str, config: Any = None) -> Iterator[Any]:
+        parts: List[str] = []
+        for chunk in self._models.generate_content_stream(model=model, contents=contents, config=config):
+            parts.append(chunk.text or "")
+            yield chunk
+        _backend.record("gemini", model, _system_of(config), contents, "".join(parts))
+
+
+class _RecordingGeminiAsyncModels:
+    def __init__(self, models: Any):
+        self._models = models
+
+    async def generate_content(self, model: str, contents: str, config: Any = None) -> Any:
+        resp = await self._models.generate_content(model=model, contents=contents, config=config)
+        _backend.record("gemini", model, _system_of(config), contents, resp.text or "")
+        return resp
+
+
+class _RecordingGemini:
+    def __init__(self, client: Any):
+        self.models = _RecordingGeminiModels(client.models)
+        self.aio = _GeminiAio()
+        self.aio.models = _RecordingGeminiAsyncModels(client.aio.models)
+
+
+class _RecordingClaudeStream:
+    def __init__(self, manager: Any, model: str, system: str, contents: str):
+        self._manager = manager
+        self._args = (model, system, contents)
+
+    def __enter__(self) -> "_RecordingClaudeStream":
+        stream = self._manager.__enter__()
+
+        def _text() -> Iterator[str]:
+            parts: List[str] = []
+            for part in stream.text_stream:
+                parts.append(part)
+                yield part
+            model, system, contents = self._args
+            _backend.record("claude", model, system, contents, "".join(parts))
+
+        self.text_stream = _text()
+        return self
+
+    def __exit__(self, *exc: Any) -> Any:
+        return self._manager.__exit__(*exc)
+
+
+class _RecordingClaudeMessages:
+    def __init__(self, messages: Any):
+        self._messages = messages
+
+    def create(self, model: str, system: str, messages: List[Dict[str, Any]], **kwargs: Any) -> Any:
+        msg = self._messages.create(model=model, system=system, messages=messages, **kwargs)
+        _backend.record("claude", model, system, _user_text(messages), msg.content[0].text)
+        return msg
+
+    def stream(self, model: str, system: str, messages: List[Dict[str, Any]], **kwargs: Any) -> Any:
+        manager = self._messages.stream(model=model, system=system, messages=messages, **kwargs)
+        return _RecordingClaudeStream(manager, model, system, _user_text(messages))
+
+
+class _RecordingAsyncClaudeMessages:
+    def __init__(self, messages: Any):
+        self._messages = messages
+
+    async def create(self, model: str, system: str, messages: List[Dict[str, Any]], **kwargs: Any) -> Any:
+        msg = await self._messages.create(model=model, system=system, messages=messages, **kwargs)
+        _backend.record("claude", model, system, _user_text(messages), msg.content[0].text)
+        return msg
+
+
+class _RecordingClaude:
+    def __init__(self, client: Any, async_client: bool = False):
+        wrapper = _RecordingAsyncClaudeMessages if async_client else _RecordingClaudeMessages
+        self.messages = wrapper(client.messages)
+
+
+# ── Client factories ──────────────────────────────────────────────────────────
+
+_FAKES: Dict[str, Callable[[], Any]] = {
+    "gemini": FakeGeminiClient,
+    "claude": FakeClaudeClient,
+    "claude_async": FakeAsyncClaudeClient,
+}
+
+
+def factory(name: str, make_live: Callable[[], Any]) -> Callable[[], Any]:
+    """The client factory for name ("gemini", "claude", "claude_async") under LLM_BACKEND."""
+    if LLM_BACKEND == "fake":
+        return _FAKES[name]
+    if LLM_BACKEND == "record":
+        if name == "gemini":
+            return lambda: _RecordingGemini(make_live())
+        return lambda: _RecordingClaude(make_live(), async_client=name == "claude_async")
+    return make_live
@@ -1,10 +1,15 @@
 from __future__ import annotations
 
 import base64
+import threading
+from collections import defaultdict
 from email.mime.text import MIMEText
-from typing import Dict, List
+from typing import Dict, Iterable, List, Tuple
 
 from googleapiclient.discovery import Resource
+from googleapiclient.errors import HttpError
+
+from app import gmail_quota
 
 TRIAGE_LABELS = {
     "ARCHIVE": "Triage/Done",
@@ -15,27 +20,81 @@ TRIAGE_LABELS = {
     "DELEGATE": "Triage/Now",
 }
 
+BATCH_MODIFY_MAX_IDS = 1000  # users.messages.batchModify limit
+
+
+# Process-wide label name → id registry, loaded once and shared by every
+# apply path. Reset when Gmail reports a label we hold no longer exists.
+_label_lock = threading.RLock()
+_label_ids: Dict[str, str] | None = None
+
 
 def _list_labels(service: Resource) -> Dict[str, str]:
-    resp = service.users().labels().list(userId="me").execute()
+    resp = gmail_quota.execute(service.users().labels().list(userId="me"), "labels.list")
     out: Dict[str, str] = {}
     for lab in resp.get("labels", []):
         out[lab["name"]] = lab["id"]
     return out
 
 
+def invalidate_label_cache() -> None:
+    global _label_ids
+    with _label_lock:
+        _label_ids = None
+
+
+def _is_stale_label_error(exc: BaseException) -> bool:
+    # A deleted label shows up as 400 "Invalid label: ..." on modify, or a 404
+    # naming the label; a 404 for a missing message says nothing about labels
+    return (
+        isinstance(exc, HttpError)
+        and exc.resp.status in (400, 404)
+        and "label" in (getattr(exc, "reason", "") or "").lower()
+    )
+
+
 def get_or_create_label(service: Resource, name: str) -> str:
-    labels = _list_labels(service)
-    if name in labels:
-        return labels[name]
-    body = {
-        "name": name,
-        "labelListVisibility": "labelShow",
-        "messageListVisibility": "show",
-        "type": "user",
-    }
-    created = service.users().labels().create(userId="me", body=body).execute()
-    return created["id"]
+    global _label_ids
+    with _label_lock:
+        if _label_ids is None:
+            _label_ids = _list_labels(service)
+        if name in _label_ids:
+            return _label_ids[name]
+
+        body = {
+            "name": name,
+            "labelListVisibility": "labelShow",
+            "messageListVisibility": "show",
+            "type": "user",
+        }
+        try:
+            created = gmail_quota.execute(
+                service.users().labels().create(userId="me", body=body), "labels.create"
+            )
+            _label_ids[name] = created["id"]
+        except HttpError as e:
+            if e.resp.status != 409:
+                raise
+            # Created by another process since we listed: reload instead of failing
+            _label_ids = _list_labels(service)
+            if name not in _label_ids:
+                _label_ids[name] = _conflicting_user_label(service, name)
+        return _label_ids[name]
+
+
+def _conflicting_user_label(service: Resource, name: str) -> str:
+    """
+    Id of the user label that made creating name fail with 409. Gmail label
+    names clash case-insensitively, and a name may clash with a system label,
+    which must never be used as a triage label.
+    """
+    resp = gmail_quota.execute(service.users().labels().list(userId="me"), "labels.list")
+    for lab in resp.get("labels", []):
+        if lab["name"].lower() == name.lower():
+            if lab.get("type") == "system":
+                raise RuntimeError(f"Label {name!r} conflicts with Gmail system label {lab['name']!r}")
+            return lab["id"]
+    raise RuntimeError(f"Gmail refused to create label {name!r} (409) but no matching label exists")
 
 
 def ensure_triage_labels(service: Resource) -> Dict[str, str]:
@@ -45,34 +104,148 @@ def ensure_triage_labels(service: Resource) -> Dict[str, str]:
     return label_ids
 
 
-def apply_triage_action(
-    service: Resource,
-    message_id: str,
+def triage_label_changes(
     category: str,
     label_ids_by_name: Dict[str, str],
     archive: bool = True,
-) -> dict:
+) -> Tuple[List[str], List[str]]:
+    """(addLabelIds, removeLabelIds) for a triage category."""
     category = (category or "").upper()
     label_name = TRIAGE_LABELS.get(category, "Triage/Now")
-    add_label_id = label_ids_by_name[label_name]
-
-    add_label_ids: List[str] = [add_label_id]
+    add_label_ids: List[str] = [label_ids_by_name[label_name]]
     remove_label_ids: List[str] = []
 
     if archive and category in ("ARCHIVE", "READ_LATER"):
         remove_label_ids.append("INBOX")
+    return add_label_ids, remove_label_ids
 
+
+def apply_triage_action(
+    service: Resource,
+    message_id: str,
+    category: str,
+    label_ids_by_name: Dict[str, str],
+    archive: bool = True,
+) -> dict:
+    add_label_ids, remove_label_ids = triage_label_changes(category, label_ids_by_name, archive)
     body = {"addLabelIds": add_label_ids, "removeLabelIds": remove_label_ids}
-    return service.users().messages().modify(userId="me", id=message_id, body=body).execute()
+    try:
+        return gmail_quota.execute(
+            service.users().messages().modify(userId="me", id=message_id, body=body),
+            "messages.modify",
+        )
+    except HttpError as e:
+        if _is_stale_label_error(e):
+            invalidate_label_cache()
+        raise
 
 
-def send_reply(
+def _batch_modify_grouped(
+    service: Resource,
+    items: List[Tuple[str, str]],
+    label_ids_by_name: Dict[str, str],
+    archive: bool,
+) -> Tuple[List[str], List[Tuple[str, Exception]]]:
+    groups: Dict[Tuple[Tuple[str, ...], Tuple[str, ...]], List[str]] = defaultdict(list)
+    for message_id, category in items:
+        add_ids, remove_ids = triage_label_changes(category, label_ids_by_name, archive)
+        groups[(tuple(add_ids), tuple(remove_ids))].append(message_id)
+
+    applied: List[str] = []
+    failed: List[Tuple[str, Exception]] = []
+    for (add_ids, remove_ids), ids in groups.items():
+        for start in range(0, len(ids), BATCH_MODIFY_MAX_IDS):
+            chunk = ids[start:start + BATCH_MODIFY_MAX_IDS]
+            _modify_chunk(service, chunk, list(add_ids), list(remove_ids), applied, failed)
+    return applied, failed
+
+
+def _is_per_message_error(exc: BaseException) -> bool:
+    """
+    A 400/404 that one bad id (deleted, malformed) can cause for the whole
+    call. Auth, permission and size errors (401/403/413) and label errors
+    would fail every half just the same, so they are not split.
+    """
+    return (
+        isinstance(exc, HttpError)
+        and exc.resp.status in (400, 404)
+        and not _is_stale_label_error(exc)
+    )
+
+
+def _modify_chunk(
     service: Resource,
+    chunk: List[str],
+    add_ids: List[str],
+    remove_ids: List[str],
+    applied: List[str],
+    failed: List[Tuple[str, Exception]],
+) -> None:
+    """
+    batchModify chunk; if it is rejected for what may be a single bad id, the
+    chunk is split in half and retried until the bad ids are isolated, with
+    single ids going through messages.modify, so valid ids still get applied.
+    """
+    body = {"addLabelIds": add_ids, "removeLabelIds": remove_ids}
+    try:
+        if len(chunk) == 1:
+            gmail_quota.execute(
+                service.users().messages().modify(userId="me", id=chunk[0], body=body),
+                "messages.modify",
+            )
+        else:
+            gmail_quota.execute(
+                service.users().messages().batchModify(userId="me", body={"ids": chunk, **body}),
+                "messages.batchModify",
+            )
+        applied.extend(chunk)
+    except Exception as e:
+        if len(chunk) == 1 or not _is_per_message_error(e):
+            failed.extend((mid, e) for mid in chunk)
+            return
+        mid = len(chunk) // 2
+        _modify_chunk(service, chunk[:mid], add_ids, remove_ids, applied, failed)
+        _modify_chunk(service, chunk[mid:], add_ids, remove_ids, applied, failed)
+
+
+def apply_triage_actions_bulk(
+    service: Resource,
+    items: Iterable[Tuple[str, str]],
+    label_ids_by_name: Dict[str, str],
+    archive: bool = True,
+) -> Tuple[List[str], List[dict]]:
+    """
+    Apply many (message_id, category) decisions with users.messages.batchModify:
+    messages sharing the same label change are modified together, up to
+    BATCH_MODIFY_MAX_IDS per call. Returns (applied_ids, errors); a chunk
+    rejected for an invalid id (400/404 not about a label) is split until the
+    offending ids are isolated, and other failures mark every id in that
+    chunk as an error. If a cached label id turns
+    out to be stale, the label registry is reloaded and those ids retried once.
+    """
+    items = list(items)
+    applied, failed = _batch_modify_grouped(service, items, label_ids_by_name, archive)
+
+    stale = {mid for mid, e in failed if _is_stale_label_error(e)}
+    if stale:
+        invalidate_label_cache()
+        label_ids_by_name = ensure_triage_labels(service)
+        retried, still_failed = _batch_modify_grouped(
+            service, [it for it in items if it[0] in stale], label_ids_by_name, archive
+        )
+        applied.extend(retried)
+        failed = [(mid, e) for mid, e in failed if mid not in stale] + still_failed
+
+    return applied, [{"message_id": mid, "error": str(e)} for mid, e in failed]
+
+
+def build_message_body(
     to: str,
     subject: str,
     body: str,
     thread_id: str | None = None,
 ) -> dict:
+    """Gmail API message resource ({"raw", "threadId"}) for a plain-text reply."""
     message = MIMEText(body, "plain", "utf-8")
     message["to"] = to
     message["subject"] = subject
@@ -80,7 +253,20 @@ def send_reply(
     msg_body: dict = {"raw": raw}
     if thread_id:
         msg_body["threadId"] = thread_id
-    return service.users().messages().send(userId="me", body=msg_body).execute()
+    return msg_body
+
+
+def send_reply(
+    service: Resource,
+    to: str,
+    subject: str,
+    body: str,
+    thread_id: str | None = None,
+) -> dict:
+    msg_body = build_message_body(to, subject, body, thread_id)
+    return gmail_quota.execute(
+        service.users().messages().send(userId="me", body=msg_body), "messages.send"
+    )
 
 
 def create_draft(
@@ -90,13 +276,8 @@ def create_draft(
     body: str,
     thread_id: str | None = None,
 ) -> dict:
-    message = MIMEText(body, "plain", "utf-8")
-    message["to"] = to
-    message["subject"] = subject
-    raw = base64.urlsafe_b64encode(message.as_bytes()).decode("utf-8")
-    msg_body: dict = {"raw": raw}
-    if thread_id:
-        msg_body["threadId"] = thread_id
-    return service.users().drafts().create(
-        userId="me", body={"message": msg_body}
-    ).execute()
+    msg_body = build_message_body(to, subject, body, thread_id)
+    return gmail_quota.execute(
+        service.users().drafts().create(userId="me", body={"message": msg_body}),
+        "drafts.create",
+    )
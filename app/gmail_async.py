@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import os
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from app import fake_gmail, gmail_quota
+from app.gmail_client import get_credentials
+
+GMAIL_API = "https://gmail.googleapis.com/gmail/v1/users/me/"
+
+
+def _http2_available() -> bool:
+    # httpx speaks HTTP/2 only when the optional h2 package is installed
+    return importlib.util.find_spec("h2") is not None
+
+
+class AsyncGmailClient:
+    """
+    Minimal asyncio Gmail client over a pooled httpx connection. Methods mirror
+    the googleapiclient calls used elsewhere and return the same JSON shapes.
+    At most max_concurrency requests are in flight at once.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 20,
+        max_concurrency: int = 10,
+        timeout: float = 30.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self._client = httpx.AsyncClient(
+            base_url=GMAIL_API,
+            http2=transport is None and _http2_available(),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            timeout=timeout,
+            transport=transport,
+        )
+        self._sem = asyncio.Semaphore(max_concurrency)
+
+    async def _request(self, http_method: str, path: str, api_method: str, **kwargs) -> Dict[str, Any]:
+        """One API call under the shared Gmail quota, retried on transient errors."""
+
+        async def _send() -> Dict[str, Any]:
+            # get_credentials may refresh the token over the network
+            creds = await asyncio.to_thread(get_credentials)
+            async with self._sem:
+                resp = await self._client.request(
+                    http_method, path, headers={"Authorization": f"Bearer {creds.token}"}, **kwargs
+                )
+            resp.raise_for_status()
+            return resp.json() if resp.content else {}
+
+        return await gmail_quota.call_async(_send, api_method)
+
+    # ── Messages ──────────────────────────────────────────────────────────────
+
+    async def list_messages(
+        self,
+        q: Optional[str] = None,
+        max_results: int = 100,
+        page_token: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        params: Dict[str, Any] = {"maxResults": max_results}
+        if q:
+            params["q"] = q
+        if page_token:
+            params["pageToken"] = page_token
+        return await self._request("GET", "messages", "messages.list", params=params)
+
+    async def get_message(
+        self,
+        message_id: str,
+        fmt: str = "full",
+        metadata_headers: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        params: List[tuple] = [("format", fmt)]
+        for h in metadata_headers or []:
+            params.append(("metadataHeaders", h))
+        return await self._request("GET", f"messages/{message_id}", "messages.get", params=params)
+
+    async def get_messages(
+        self,
+        ids: List[str],
+        fmt: str = "full",
+        metadata_headers: Optional[List[str]] = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        """Concurrent gets keyed by id; failed messages are left out."""
+        results = await asyncio.gather(
+            *(self.get_message(mid, fmt, metadata_headers) for mid in ids),
+            return_exceptions=True,
+        )
+        return {mid: r for mid, r in zip(ids, results) if not isinstance(r, BaseException)}
+
+    async def modify_message(
+        self, message_id: str, add_label_ids: List[str], remove_label_ids: List[str]
+    ) -> Dict[str, Any]:
+        body = {"addLabelIds": add_label_ids, "removeLabelIds": remove_label_ids}
+        return await self._request(
+            "POST", f"messages/{message_id}/modify", "messages.modify", json=body
+        )
+
+    async def batch_modify(
+        self, ids: List[str], add_label_ids: List[str], remove_label_ids: List[str]
+    ) -> Dict[str, Any]:
+        body = {"ids": ids, "addLabelIds": add_label_ids, "removeLabelIds": remove_label_ids}
+        return await self._request(
+            "POST", "messages/batchModify", "messages.batchModify", json=body
+        )
+
+    async def send_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._request("POST", "messages/send", "messages.send", json=message)
+
+    # ── Drafts / labels / profile ─────────────────────────────────────────────
+
+    async def create_draft(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._request(
+            "POST", "drafts", "drafts.create", json={"message": message}
+        )
+
+    async def list_labels(self) -> Dict[str, Any]:
+        return await self._request("GET", "labels", "labels.list")
+
+    async def create_label(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._request("POST", "labels", "labels.create", json=body)
+
+    async def get_profile(self) -> Dict[str, Any]:
+        return await self._request("GET", "profile", "getProfile")
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+_client: AsyncGmailClient | None = None
+
+
+def get_async_gmail() -> AsyncGmailClient:
+    """Process-wide client; connections are pooled across requests."""
+    global _client
+    if _client is None:
+        _client = AsyncGmailClient(
+            max_connections=int(os.getenv("GMAIL_ASYNC_MAX_CONNECTIONS", "20")),
+            max_concurrency=int(os.getenv("GMAIL_ASYNC_CONCURRENCY", "10")),
+            transport=fake_gmail.async_transport(fake_gmail.get_mailbox()) if fake_gmail.enabled() else None,
+        )
+    return _client
+
+
+async def close_async_gmail() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -1,17 +1,114 @@
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials
-import os
+from __future__ import annotations
+
 import json
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
 
-TOKEN_STORE_PATH = os.getenv("TOKEN_STORE_PATH", "data/token.json")
+import google_auth_httplib2
+import httplib2
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build, build_from_document
+
+from app import fake_gmail
+
+# Refresh the access token this long before it expires, so no request ever
+# pays for a 401 + refresh round trip.
+REFRESH_MARGIN = timedelta(minutes=5)
+HTTP_TIMEOUT = 60  # seconds
+
+_lock = threading.Lock()
+_creds: Credentials | None = None
+_creds_mtime: float | None = None
+_discovery_doc: str | None = None
+
+# httplib2 is not thread-safe, so each worker thread gets its own service
+# (cheap: built from the cached discovery document) over shared credentials.
+_local = threading.local()
+
+
+def _token_path() -> str:
+    return os.getenv("TOKEN_STORE_PATH", "data/token.json")
 
-def get_gmail_service():
-    if not os.path.exists(TOKEN_STORE_PATH):
-        raise RuntimeError("No token found. Please authenticate first.")
 
-    with open(TOKEN_STORE_PATH, "r") as f:
-        token_data = json.load(f)
+def save_credentials(creds: Credentials) -> None:
+    """Atomically write creds (including expiry) to the token store."""
+    path = _token_path()
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".token-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(creds.to_json())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
 
-    creds = Credentials.from_authorized_user_info(token_data)
-    service = build("gmail", "v1", credentials=creds)
+
+def _needs_refresh(creds: Credentials) -> bool:
+    if not creds.refresh_token:
+        return False
+    if not creds.token or creds.expiry is None:
+        # Tokens saved without an expiry: refresh once so it becomes known
+        return True
+    now = datetime.now(timezone.utc).replace(tzinfo=None)  # google-auth uses naive UTC
+    return creds.expiry - now < REFRESH_MARGIN
+
+
+def get_credentials() -> Credentials:
+    """
+    Process-wide credentials, re-read only when token.json changes on disk and
+    refreshed proactively shortly before expiry (written back to disk).
+    """
+    global _creds, _creds_mtime
+    if fake_gmail.enabled():
+        with _lock:
+            if _creds is None:
+                _creds = Credentials(token="fake")
+            return _creds
+
+    path = _token_path()
+    with _lock:
+        if not os.path.exists(path):
+            raise RuntimeError("No token found. Please authenticate first.")
+
+        mtime = os.path.getmtime(path)
+        if _creds is None or mtime != _creds_mtime:
+            with open(path, "r") as f:
+                _creds = Credentials.from_authorized_user_info(json.load(f))
+            _creds_mtime = mtime
+
+        if _needs_refresh(_creds):
+            _creds.refresh(Request())
+            save_credentials(_creds)
+            _creds_mtime = os.path.getmtime(path)
+
+        return _creds
+
+
+def _discovery() -> str:
+    global _discovery_doc
+    if _discovery_doc is None:
+        doc = discovery_cache.get_static_doc("gmail", "v1")
+        if doc is None:
+            # Older client library without bundled documents: fetch once
+            doc = json.dumps(build("gmail", "v1", static_discovery=False)._rootDesc)
+        _discovery_doc = doc
+    return _discovery_doc
+
+
+def get_gmail_service():
+    creds = get_credentials()
+    service = getattr(_local, "service", None)
+    if service is None or getattr(_local, "creds", None) is not creds:
+        if fake_gmail.enabled():
+            http = fake_gmail.FakeHttp(fake_gmail.get_mailbox())
+        else:
+            http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+        service = build_from_document(_discovery(), http=http)
+        _local.service, _local.creds = service, creds
     return service
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from typing import Any, Awaitable, Callable
+
+import httpx
+from googleapiclient.errors import HttpError
+
+logger = logging.getLogger(__name__)
+
+# Gmail per-method quota units (developers.google.com/gmail/api/reference/quota)
+QUOTA_UNITS = {
+    "getProfile": 1,
+    "labels.list": 1,
+    "labels.create": 5,
+    "history.list": 2,
+    "messages.list": 5,
+    "messages.get": 5,
+    "messages.modify": 5,
+    "messages.batchModify": 50,
+    "messages.send": 100,
+    "drafts.create": 10,
+    "drafts.send": 100,
+}
+DEFAULT_UNITS = 5
+
+# Calls that may already have taken effect when a 5xx or a dropped
+# connection comes back; retrying them could send the same email twice, so
+# they are only retried when Gmail explicitly rate-limited them.
+NON_IDEMPOTENT = {"messages.send", "drafts.create", "drafts.send"}
+
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0   # seconds
+BACKOFF_CAP = 32.0
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = {"userRateLimitExceeded", "rateLimitExceeded"}
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by sync and async callers. Callers reserve
+    units up front (the balance may go negative) and then wait out the debt,
+    so concurrent callers queue fairly instead of spinning.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, units: float) -> float:
+        """Take units and return how long the caller must wait before using them."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= units
+            return max(0.0, -self._tokens / self.rate)
+
+
+_rate = float(os.getenv("GMAIL_QUOTA_UNITS_PER_SEC", "250"))  # Gmail's per-user limit
+_bucket = TokenBucket(rate=_rate, capacity=_rate)
+
+
+def acquire(method: str, count: int = 1) -> None:
+    wait = _bucket.reserve(QUOTA_UNITS.get(method, DEFAULT_UNITS) * count)
+    if wait:
+        time.sleep(wait)
+
+
+async def acquire_async(method: str, count: int = 1) -> None:
+    wait = _bucket.reserve(QUOTA_UNITS.get(method, DEFAULT_UNITS) * count)
+    if wait:
+        await asyncio.sleep(wait)
+
+
+def _http_error_reason(exc: HttpError) -> str:
+    try:
+        return exc.error_details[0].get("reason", "") if exc.error_details else ""
+    except (AttributeError, IndexError, TypeError):
+        return ""
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    """429, or 403 rateLimitExceeded/userRateLimitExceeded: Gmail refused the call."""
+    if isinstance(exc, HttpError):
+        status = exc.resp.status
+        return status == 429 or (status == 403 and _http_error_reason(exc) in RATE_LIMIT_REASONS)
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        return status == 429 or (
+            status == 403 and any(r in exc.response.text for r in RATE_LIMIT_REASONS)
+        )
+    return False
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Rate limits, 5xx and network blips are worth retrying; anything else is not."""
+    if is_rate_limited(exc):
+        return True
+    if isinstance(exc, HttpError):
+        return exc.resp.status in RETRYABLE_STATUS
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in RETRYABLE_STATUS
+    return isinstance(exc, (httpx.TransportError, socket.timeout, ConnectionError))
+
+
+def is_retryable(exc: BaseException, method: str) -> bool:
+    """is_transient, narrowed to rate limits for NON_IDEMPOTENT methods."""
+    return is_rate_limited(exc) if method in NON_IDEMPOTENT else is_transient(exc)
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def execute(request, method: str, count: int = 1) -> Any:
+    """
+    request.execute() under the shared quota, retrying transient errors with
+    jittered exponential backoff (only rate limits for NON_IDEMPOTENT
+    methods). count is the number of API calls the request stands for (a
+    batch of N gets costs N × messages.get).
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        acquire(method, count)
+        try:
+            return request.execute()
+        except Exception as e:
+            if attempt == MAX_RETRIES or not is_retryable(e, method):
+                raise
+            delay = backoff_delay(attempt)
+            logger.info("Gmail %s transient error (%s) — retrying in %.1fs", method, e, delay)
+            time.sleep(delay)
+
+
+async def call_async(fn: Callable[[], Awaitable[Any]], method: str) -> Any:
+    """Async counterpart of execute() for the httpx client."""
+    for attempt in range(MAX_RETRIES + 1):
+        await acquire_async(method)
+        try:
+            return await fn()
+        except Exception as e:
+            if attempt == MAX_RETRIES or not is_retryable(e, method):
+                raise
+            delay = backoff_delay(attempt)
+            logger.info("Gmail %s transient error (%s) — retrying in %.1fs", method, e, delay)
+            await asyncio.sleep(delay)
@@ -1,31 +1,35 @@
+import asyncio
 import base64
-import json
-import os
-from pathlib import Path
-from typing import Any, Dict, List, Optional
+import logging
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 from fastapi import APIRouter, HTTPException
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+
+from app import gmail_quota, message_cache
+from app.gmail_async import get_async_gmail
+from app.gmail_client import get_gmail_service
+from app.prompt_prep import html_to_text, looks_like_html, normalize_whitespace
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-def _token_path() -> Path:
-    p = os.getenv("TOKEN_STORE_PATH", "data/token.json")
-    return Path(p)
+BATCH_SIZE = 100          # Gmail caps a batch HTTP request at 100 sub-requests
+BATCH_MAX_RETRIES = 5     # re-batch rate-limited / 5xx sub-requests this many times
+PAGE_SIZE = 500           # messages.list maximum maxResults
 
-def _load_creds() -> Credentials:
-    if not _token_path().exists():
+INBOX_QUERY = "in:inbox -in:spam -in:trash"
+# Everything the rules, summary and slate need without downloading the body
+METADATA_HEADERS = ["From", "To", "Subject", "Date", "List-Unsubscribe"]
+HISTORY_CURSOR_KEY = "gmail_history_id"
+
+def _service():
+    try:
+        return get_gmail_service()
+    except RuntimeError:
         raise HTTPException(status_code=401, detail="Not connected yet. Go to /auth/google/start")
-    data = json.loads(_token_path().read_text())
-    return Credentials(
-        token=data.get("token"),
-        refresh_token=data.get("refresh_token"),
-        token_uri=data.get("token_uri"),
-        client_id=data.get("client_id"),
-        client_secret=data.get("client_secret"),
-        scopes=data.get("scopes"),
-    )
 
 def _get_header(headers: List[Dict[str, str]], name: str) -> Optional[str]:
     name_l = name.lower()
@@ -52,46 +56,286 @@ def _decode_body(payload: Dict[str, Any]) -> str:
         stack.extend(part.get("parts", []))
     return ""
 
+def _body_preview(payload: Dict[str, Any]) -> str:
+    # Convert HTML before cutting, so the 1000 chars are text rather than markup
+    body = _decode_body(payload)
+    if looks_like_html(body):
+        body = normalize_whitespace(html_to_text(body))
+    return body[:1000]
+
+
+def _parse_message(msg: Dict[str, Any], with_body: bool = True) -> Dict[str, Any]:
+    """body_preview is None for metadata-only fetches (body not downloaded yet)."""
+    payload = msg.get("payload", {})
+    headers = payload.get("headers", [])
+    return {
+        "id": msg.get("id"),
+        "threadId": msg.get("threadId"),
+        "internalDate": msg.get("internalDate"),
+        "from": _get_header(headers, "From"),
+        "to": _get_header(headers, "To"),
+        "subject": _get_header(headers, "Subject"),
+        "date": _get_header(headers, "Date"),
+        "snippet": msg.get("snippet"),
+        "has_list_unsubscribe": _get_header(headers, "List-Unsubscribe") is not None,
+        "body_preview": _body_preview(payload) if with_body else None,  # keep it short
+    }
+
+
+def fetch_messages(service, ids: List[str], fmt: str = "full") -> Dict[str, Dict[str, Any]]:
+    """
+    Fetch many messages (fmt "full" or "metadata") with Gmail batch HTTP requests (up to BATCH_SIZE per
+    round trip). Sub-requests that fail with a retryable status are re-batched
+    with backoff; permanent failures (e.g. a message deleted since listing)
+    are logged and left out. Returns raw messages keyed by id.
+    """
+    results: Dict[str, Dict[str, Any]] = {}
+    pending = list(dict.fromkeys(ids))
+    # Building a resource walks the discovery document, so do it once per call
+    messages = service.users().messages()
+
+    for attempt in range(BATCH_MAX_RETRIES + 1):
+        retry: List[str] = []
+
+        def _on_response(request_id, response, exception):
+            if exception is None:
+                results[request_id] = response
+            elif gmail_quota.is_transient(exception):
+                retry.append(request_id)
+            else:
+                logger.warning("Gmail get failed for %s: %s", request_id, exception)
+
+        for start in range(0, len(pending), BATCH_SIZE):
+            chunk = pending[start:start + BATCH_SIZE]
+            batch = service.new_batch_http_request(callback=_on_response)
+            for mid in chunk:
+                if fmt == "metadata":
+                    req = messages.get(
+                        userId="me", id=mid, format=fmt, metadataHeaders=METADATA_HEADERS,
+                    )
+                else:
+                    req = messages.get(userId="me", id=mid, format=fmt)
+                batch.add(req, request_id=mid)
+            gmail_quota.execute(batch, "messages.get", count=len(chunk))
+
+        if not retry:
+            break
+        if attempt == BATCH_MAX_RETRIES:
+            logger.warning("Gmail get gave up on %d messages after retries", len(retry))
+            break
+        pending = retry
+        time.sleep(gmail_quota.backoff_delay(attempt))
+
+    return results
+
+
+def load_items(service, ids: List[str], with_body: bool = True) -> List[Dict[str, Any]]:
+    """
+    Parsed items for ids, in order. Served from the message cache where
+    possible; only cache misses are fetched from Gmail. With with_body=False
+    misses are fetched as metadata only and body_preview is left as None.
+    """
+    cached = message_cache.get_many(ids)
+    if with_body:
+        missing = [mid for mid in ids if cached.get(mid, {}).get("body_preview") is None]
+    else:
+        missing = [mid for mid in ids if mid not in cached]
+    fmt = "full" if with_body else "metadata"
+    fetched = fetch_messages(service, missing, fmt=fmt) if missing else {}
+    parsed = {mid: _parse_message(msg, with_body=with_body) for mid, msg in fetched.items()}
+    message_cache.put_many(parsed.values())
+
+    items = {**cached, **parsed}
+    return [items[mid] for mid in ids if mid in items]
+
+
+def fill_bodies(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Second tier of a metadata-first fetch: download bodies for the items that
+    still lack one (body_preview is None), in place. Call it only for emails
+    that actually need the body, e.g. those headed to the LLM.
+    """
+    need = [it["id"] for it in items if it.get("body_preview") is None]
+    if not need:
+        return items
+    service = _service()
+    full = {it["id"]: it for it in load_items(service, need, with_body=True)}
+    for it in items:
+        if it["id"] in full:
+            it["body_preview"] = full[it["id"]]["body_preview"]
+    return items
+
+
+def fill_email_bodies(emails: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """fill_bodies for triage email dicts (keyed by message_id), in place."""
+    items = fill_bodies([{"id": e["message_id"], "body_preview": None} for e in emails])
+    bodies = {it["id"]: it.get("body_preview") or "" for it in items}
+    for e in emails:
+        e["body_preview"] = bodies.get(e["message_id"], "")
+    return emails
+
+
+def iter_inbox(
+    max_results: Optional[int] = None,
+    include_body: bool = True,
+    max_in_flight: int = BATCH_SIZE,
+    query: str = INBOX_QUERY,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Stream parsed inbox items newest first, following nextPageToken until
+    max_results items (None = the whole inbox) have been yielded. At most
+    max_in_flight messages are fetched and held at a time, so a sweep over a
+    very large inbox runs in bounded memory.
+    """
+    service = _service()
+    remaining = max_results
+    page_token = None
+    while remaining is None or remaining > 0:
+        res = gmail_quota.execute(
+            service.users().messages().list(
+                userId="me",
+                q=query,
+                maxResults=PAGE_SIZE if remaining is None else min(PAGE_SIZE, remaining),
+                pageToken=page_token,
+            ),
+            "messages.list",
+        )
+
+        ids = [m["id"] for m in res.get("messages", [])]
+        for start in range(0, len(ids), max_in_flight):
+            yield from load_items(service, ids[start:start + max_in_flight], with_body=include_body)
+
+        if remaining is not None:
+            remaining -= len(ids)
+        page_token = res.get("nextPageToken")
+        if not page_token:
+            break
+
+
 @router.get("/gmail/inbox/recent")
-def recent_inbox(max_results: int = 20):
+def recent_inbox(max_results: int = 20, include_body: bool = True):
     """
     Read-only: returns basic info for recent INBOX emails.
+    include_body=False skips body downloads (body_preview is None); see fill_bodies.
     """
-    creds = _load_creds()
-    service = build("gmail", "v1", credentials=creds)
-
     # Tunable query: start simple and safe
-    query = "in:inbox -in:spam -in:trash"
-
-    res = service.users().messages().list(
-        userId="me",
-        q=query,
-        maxResults=max_results,
-    ).execute()
-
-    messages = res.get("messages", [])
-    out = []
-
-    for m in messages:
-        msg = service.users().messages().get(
-            userId="me",
-            id=m["id"],
-            format="full",
-        ).execute()
-
-        payload = msg.get("payload", {})
-        headers = payload.get("headers", [])
-        out.append({
-            "id": msg.get("id"),
-            "threadId": msg.get("threadId"),
-            "internalDate": msg.get("internalDate"),
-            "from": _get_header(headers, "From"),
-            "to": _get_header(headers, "To"),
-            "subject": _get_header(headers, "Subject"),
-            "date": _get_header(headers, "Date"),
-            "snippet": msg.get("snippet"),
-            "has_list_unsubscribe": _get_header(headers, "List-Unsubscribe") is not None,
-            "body_preview": _decode_body(payload)[:1000],  # keep it short
-        })
+    query = INBOX_QUERY
+
+    out = list(iter_inbox(max_results=max_results, include_body=include_body, query=query))
 
     return {"query": query, "count": len(out), "items": out}
+
+
+async def recent_inbox_async(max_results: int = 20, include_body: bool = True) -> Dict[str, Any]:
+    """
+    Same result as recent_inbox, fetched on the event loop with the pooled
+    async client (one page; cache misses fetched concurrently).
+    """
+    client = get_async_gmail()
+    res = await client.list_messages(q=INBOX_QUERY, max_results=min(max_results, PAGE_SIZE))
+    ids = [m["id"] for m in res.get("messages", [])]
+
+    cached = await asyncio.to_thread(message_cache.get_many, ids)
+    if include_body:
+        missing = [mid for mid in ids if cached.get(mid, {}).get("body_preview") is None]
+    else:
+        missing = [mid for mid in ids if mid not in cached]
+    fmt = "full" if include_body else "metadata"
+    fetched = await client.get_messages(
+        missing, fmt, METADATA_HEADERS if fmt == "metadata" else None
+    )
+    parsed = {mid: _parse_message(msg, with_body=include_body) for mid, msg in fetched.items()}
+    await asyncio.to_thread(message_cache.put_many, parsed.values())
+
+    items = {**cached, **parsed}
+    out = [items[mid] for mid in ids if mid in items]
+    return {"query": INBOX_QUERY, "count": len(out), "items": out}
+
+
+@router.get("/gmail/cache/stats")
+def message_cache_stats():
+    return message_cache.cache_stats()
+
+
+# ── Incremental sync ──────────────────────────────────────────────────────────
+
+def _history_changes(service, start_history_id: str) -> Tuple[List[str], str]:
+    """
+    Ids of messages added to (or relabeled into) INBOX since start_history_id
+    and still there, newest first, plus the mailbox's current historyId.
+    Raises HttpError 404 when the cursor is too old for Gmail to replay.
+    """
+    # History records are chronological; replay them so a message archived
+    # or deleted after it arrived drops out again.
+    in_inbox: Dict[str, None] = {}
+    latest = start_history_id
+    page_token = None
+    while True:
+        res = gmail_quota.execute(
+            service.users().history().list(
+                userId="me",
+                startHistoryId=start_history_id,
+                labelId="INBOX",
+                historyTypes=["messageAdded", "labelAdded", "labelRemoved", "messageDeleted"],
+                pageToken=page_token,
+            ),
+            "history.list",
+        )
+
+        for h in res.get("history", []):
+            for rec in h.get("messagesAdded", []):
+                if "INBOX" in (rec.get("message", {}).get("labelIds") or []):
+                    in_inbox[rec["message"]["id"]] = None
+            for rec in h.get("labelsAdded", []):
+                if "INBOX" in (rec.get("labelIds") or []):
+                    in_inbox.pop(rec["message"]["id"], None)
+                    in_inbox[rec["message"]["id"]] = None
+            for rec in h.get("labelsRemoved", []):
+                if "INBOX" in (rec.get("labelIds") or []):
+                    in_inbox.pop(rec["message"]["id"], None)
+            for rec in h.get("messagesDeleted", []):
+                in_inbox.pop(rec["message"]["id"], None)
+
+        latest = res.get("historyId", latest)
+        page_token = res.get("nextPageToken")
+        if not page_token:
+            break
+
+    return list(reversed(in_inbox)), latest
+
+
+def sync_inbox(
+    history_id: Optional[str], max_results: int = 20, include_body: bool = True
+) -> Dict[str, Any]:
+    """
+    Incremental version of recent_inbox: returns only INBOX messages that
+    arrived since history_id. Falls back to a full recent_inbox window when
+    there is no cursor yet or Gmail reports it expired.
+
+    The returned "history_id" is the new cursor; callers persist it (see
+    db.set_sync_value) only after they have processed the items.
+    """
+    service = _service()
+
+    if history_id:
+        try:
+            ids, latest = _history_changes(service, history_id)
+        except HttpError as e:
+            if e.resp.status != 404:
+                raise
+            logger.info("History cursor %s expired — full resync", history_id)
+        else:
+            out = load_items(service, ids, with_body=include_body)
+            return {
+                "query": f"history:{history_id}",
+                "count": len(out),
+                "items": out,
+                "history_id": latest,
+                "incremental": True,
+            }
+
+    # Read the cursor before listing so nothing arriving mid-sync is skipped
+    profile = gmail_quota.execute(service.users().getProfile(userId="me"), "getProfile")
+    latest = profile.get("historyId")
+    inbox = recent_inbox(max_results=max_results, include_body=include_body)
+    return {**inbox, "history_id": latest, "incremental": False}
@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from app.db import get_conn, now_iso
+
+logger = logging.getLogger(__name__)
+
+# Background triage runs. A job row in SQLite moves through
+# queued -> fetching -> classifying -> persisting -> done | failed while a
+# worker thread executes it; pages poll the row instead of blocking on
+# Gmail and the model. Enqueueing while an identical run is still active
+# returns that run, so refreshes do not start a second batch. A running job
+# whose row has not moved for TRIAGE_JOB_STALE_SECONDS is presumed lost
+# (its worker died or could not record the outcome) and is marked failed.
+
+JOB_WORKERS = int(os.getenv("TRIAGE_JOB_WORKERS", "1"))
+JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", "7"))
+JOB_STALE_SECONDS = int(os.getenv("TRIAGE_JOB_STALE_SECONDS", "600"))
+JOB_REUSE_SECONDS = int(os.getenv("TRIAGE_JOB_REUSE_SECONDS", "300"))
+IDLE_POLL_SECONDS = 5.0          # workers also wake immediately on enqueue
+PROGRESS_WRITE_INTERVAL = 0.5    # seconds between progress writes within a state
+FINISH_ATTEMPTS = 3
+
+QUEUED = "queued"
+FETCHING = "fetching"
+CLASSIFYING = "classifying"
+PERSISTING = "persisting"
+DONE = "done"
+FAILED = "failed"
+ACTIVE_STATES = (QUEUED, FETCHING, CLASSIFYING, PERSISTING)
+RUNNING_STATES = (FETCHING, CLASSIFYING, PERSISTING)
+
+_wake = threading.Event()
+_stop = threading.Event()
+_workers: List[threading.Thread] = []
+
+
+def _ago(seconds: float) -> str:
+    """UTC timestamp that many seconds back, comparable with now_iso() values."""
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(time.time() - seconds))
+
+
+def _fail_stale(conn) -> None:
+    """Mark running jobs with no update for JOB_STALE_SECONDS as failed."""
+    ts = now_iso()
+    conn.execute(
+        f"""
+        UPDATE jobs SET state=?, error='Stopped making progress', finished_at=?, updated_at=?
+        WHERE state IN ({",".join("?" * len(RUNNING_STATES))}) AND updated_at < ?
+        """,
+        (FAILED, ts, ts, *RUNNING_STATES, _ago(JOB_STALE_SECONDS)),
+    )
+
+
+def _row_to_job(row) -> Dict[str, Any]:
+    job = dict(row)
+    job["params"] = json.loads(job.pop("params_json") or "{}")
+    result = job.pop("result_json")
+    job["result"] = json.loads(result) if result else None
+    return job
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    with get_conn() as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE job_id=?", (job_id,)).fetchone()
+    return _row_to_job(row) if row else None
+
+
+def _triage_params(max_results: int, incremental: bool) -> str:
+    return json.dumps({"max_results": max_results, "incremental": incremental}, sort_keys=True)
+
+
+def current_triage(max_results: int = 20, incremental: bool = False,
+                   max_age: float = JOB_REUSE_SECONDS) -> Optional[Dict[str, Any]]:
+    """
+    The active triage job with these parameters, else the newest one that
+    finished successfully within max_age seconds; None if there is neither.
+    """
+    with get_conn() as conn:
+        row = conn.execute(
+            f"""
+            SELECT * FROM jobs
+            WHERE kind='triage' AND params_json=?
+              AND (state IN ({",".join("?" * len(ACTIVE_STATES))}) OR (state=? AND finished_at >= ?))
+            ORDER BY state=?, created_at DESC LIMIT 1
+            """,
+            (_triage_params(max_results, incremental), *ACTIVE_STATES, DONE, _ago(max_age), DONE),
+        ).fetchone()
+    return _row_to_job(row) if row else None
+
+
+def enqueue_triage(max_results: int = 20, incremental: bool = False) -> Dict[str, Any]:
+    """The active triage job with these parameters, or a new queued one."""
+    params = _triage_params(max_results, incremental)
+    with get_conn() as conn:
+        # IMMEDIATE takes the write lock up front, so two requests cannot both
+        # see no active job and insert one each
+        conn.execute("BEGIN IMMEDIATE")
+        _fail_stale(conn)
+        row = conn.execute(
+            f"""
+            SELECT * FROM jobs
+            WHERE kind='triage' AND params_json=? AND state IN ({",".join("?" * len(ACTIVE_STATES))})
+            ORDER BY created_at LIMIT 1
+            """,
+            (params, *ACTIVE_STATES),
+        ).fetchone()
+        if row is None:
+            ts = now_iso()
+            job_id = str(uuid.uuid4())
+            conn.execute(
+                """
+                INSERT INTO jobs (job_id, kind, params_json, state, created_at, updated_at)
+                VALUES (?, 'triage', ?, ?, ?, ?)
+                """,
+                (job_id, params, QUEUED, ts, ts),
+            )
+            row = conn.execute("SELECT * FROM jobs WHERE job_id=?", (job_id,)).fetchone()
+            _wake.set()
+    return _row_to_job(row)
+
+
+# ── Worker ────────────────────────────────────────────────────────────────────
+
+class _Progress:
+    """execute_triage progress callback that writes to the job row, throttled."""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self._state: Optional[str] = None
+        self._written = 0.0
+
+    def __call__(self, state: str, done: int, total: int) -> None:
+        now = time.monotonic()
+        if state == self._state and now - self._written < PROGRESS_WRITE_INTERVAL and done < total:
+            return
+        self._state, self._written = state, now
+        try:
+            with get_conn() as conn:
+                conn.execute(
+                    "UPDATE jobs SET state=?, progress_done=?, progress_total=?, updated_at=? WHERE job_id=?",
+                    (state, done, total, now_iso(), self.job_id),
+                )
+        except sqlite3.OperationalError as e:
+            # A missed progress update must not fail the run itself
+            logger.warning("Job %s progress not recorded: %s", self.job_id, e)
+
+
+def _claim() -> Optional[Dict[str, Any]]:
+    """Oldest queued job, marked as fetching; None if the queue is empty."""
+    with get_conn() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        _fail_stale(conn)
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE state=? ORDER BY created_at LIMIT 1", (QUEUED,)
+        ).fetchone()
+        if row is None:
+            return None
+        ts = now_iso()
+        conn.execute(
+            "UPDATE jobs SET state=?, started_at=?, updated_at=? WHERE job_id=?",
+            (FETCHING, ts, ts, row["job_id"]),
+        )
+    return _row_to_job(row)
+
+
+def _finish(job_id: str, state: str, batch_id: Optional[str] = None,
+            result: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> None:
+    """Record the outcome, retrying on SQLite errors (a busy database, mostly)."""
+    result_json = json.dumps(result) if result is not None else None
+    for attempt in range(FINISH_ATTEMPTS):
+        ts = now_iso()
+        try:
+            with get_conn() as conn:
+                conn.execute(
+                    """
+                    UPDATE jobs SET state=?, batch_id=?, result_json=?, error=?, finished_at=?, updated_at=?
+                    WHERE job_id=?
+                    """,
+                    (state, batch_id, result_json, error, ts, ts, job_id),
+                )
+            return
+        except sqlite3.Error as e:
+            if attempt == FINISH_ATTEMPTS - 1:
+                raise
+            logger.warning("Job %s outcome not recorded (%s) — retrying", job_id, e)
+            time.sleep(2 ** attempt)
+
+
+def _run(job: Dict[str, Any]) -> None:
+    from app.triage_api import execute_triage
+
+    job_id = job["job_id"]
+    try:
+        result = execute_triage(progress=_Progress(job_id), **job["params"])
+    except Exception as e:
+        logger.exception("Triage job %s failed", job_id)
+        _finish(job_id, FAILED, error=str(e) or type(e).__name__)
+        return
+    _finish(job_id, DONE, batch_id=result.get("batch_id"), result=result)
+    logger.info(
+        "Triage job %s done — batch_id=%s, %d emails",
+        job_id, result.get("batch_id"), len(result["slate"]["items"]),
+    )
+
+
+def _worker() -> None:
+    while not _stop.is_set():
+        _wake.clear()
+        try:
+            job = _claim()
+        except Exception as e:
+            logger.error("Could not claim a job: %s", e)
+            job = None
+        if job is None:
+            _wake.wait(IDLE_POLL_SECONDS)
+            continue
+        try:
+            _run(job)
+        except Exception:
+            # Keep the worker alive; a job left mid-run is failed as stale
+            logger.exception("Triage job %s could not be completed", job["job_id"])
+
+
+def _recover() -> None:
+    """Fail jobs a previous process left mid-run and drop old finished ones."""
+    ts = now_iso()
+    cutoff = _ago(JOB_RETENTION_DAYS * 86400)
+    with get_conn() as conn:
+        conn.execute(
+            f"""
+            UPDATE jobs SET state=?, error='Interrupted by a restart', finished_at=?, updated_at=?
+            WHERE state IN ({",".join("?" * len(RUNNING_STATES))})
+            """,
+            (FAILED, ts, ts, *RUNNING_STATES),
+        )
+        conn.execute(
+            "DELETE FROM jobs WHERE state IN (?, ?) AND created_at < ?", (DONE, FAILED, cutoff)
+        )
+
+
+def start_workers() -> None:
+    if _workers:
+        return
+    _recover()
+    _stop.clear()
+    for i in range(max(1, JOB_WORKERS)):
+        t = threading.Thread(target=_worker, name=f"triage-job-{i}", daemon=True)
+        t.start()
+        _workers.append(t)
+    logger.info("Started %d triage job worker(s)", len(_workers))
+
+
+def stop_workers(timeout: float = 5.0) -> None:
+    """Ask workers to exit after their current job; running jobs are not interrupted."""
+    _stop.set()
+    _wake.set()
+    for t in _workers:
+        t.join(timeout)
+    _workers.clear()
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Optional
+
+
+class ItemStreamParser:
+    """
+    Incremental parser for triage responses shaped like
+    {"batch_summary": "...", "items": [{...}, {...}]} (or a bare [{...}]).
+
+    feed() takes arbitrary text fragments as they stream in and returns every
+    items[] element whose closing brace has arrived, so callers can act on
+    each item without waiting for the whole response. Text outside the JSON
+    value (e.g. markdown code fences) is ignored.
+    """
+
+    def __init__(self) -> None:
+        self._pos = 0                # chars consumed so far
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_key: Optional[str] = None
+        self._items_depth: Optional[int] = None  # depth inside the items array
+        self._item_start: Optional[int] = None
+        self._text = ""
+
+    def feed(self, fragment: str) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        self._text += fragment
+        text = self._text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        # Strings directly in the top-level object; the one
+                        # right before "[" is the key of that array.
+                        self._last_key = text[self._string_start + 1:i]
+                continue
+
+            if ch == '"':
+                if self._depth > 0:
+                    self._in_string = True
+                    self._string_start = i
+            elif ch in "{[":
+                if self._depth == 0 and ch == "[":
+                    self._items_depth = 1  # bare array of items
+                elif ch == "[" and self._depth == 1 and self._last_key == "items":
+                    self._items_depth = 2
+                elif ch == "{" and self._items_depth is not None and self._depth == self._items_depth:
+                    self._item_start = i
+                self._depth += 1
+            elif ch in "}]":
+                if self._depth == 0:
+                    continue
+                self._depth -= 1
+                if (
+                    ch == "}"
+                    and self._item_start is not None
+                    and self._depth == self._items_depth
+                ):
+                    try:
+                        item = json.loads(text[self._item_start:i + 1])
+                        if isinstance(item, dict):
+                            out.append(item)
+                    except ValueError:
+                        pass  # malformed element: skip it, keep streaming
+                    self._item_start = None
+                elif ch == "]" and self._items_depth is not None and self._depth == self._items_depth - 1:
+                    self._items_depth = None
+        self._pos = len(text)
+        return out
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    def document(self) -> Optional[Any]:
+        """The full parsed response once it is complete and valid, else None."""
+        raw = self._text.strip()
+        start = min((i for i in (raw.find("{"), raw.find("[")) if i >= 0), default=-1)
+        if start < 0:
+            return None
+        end = max(raw.rfind("}"), raw.rfind("]"))
+        try:
+            return json.loads(raw[start:end + 1])
+        except ValueError:
+            return None
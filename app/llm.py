@@ -1,10 +1,82 @@
 import json
+import logging
 import os
-from typing import Any, Dict, List
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app import fake_llm, llm_dispatch
+from app.json_stream import ItemStreamParser
+from app.prompt_prep import EMAIL_TOKEN_BUDGET, estimate_tokens, prepare_email, prepare_emails
+
+logger = logging.getLogger(__name__)
+
+# Triage classifies only; drafts are generated per email on demand
+# (draft_reply) unless LLM_INLINE_DRAFTS restores drafts in every response.
+INLINE_DRAFTS = os.getenv("LLM_INLINE_DRAFTS", "false").lower() == "true"
+
+# Input budget per triage request, and a cap on emails per request so the
+# response (one item each) fits in max_tokens.
+CHUNK_TOKEN_BUDGET = int(os.getenv("LLM_CHUNK_TOKENS", "6000"))
+CHUNK_MAX_EMAILS = int(os.getenv("LLM_CHUNK_MAX_EMAILS", "12" if INLINE_DRAFTS else "25"))
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "10"))
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "models/gemini-2.0-flash-lite")
+CLAUDE_MODEL = os.getenv("CLAUDE_MODEL", "claude-haiku-4-5-20251001")
+
+# Routing: everything goes to the fast model above first; items it is unsure
+# about, or in high-stakes categories, are re-run on the strong model.
+GEMINI_STRONG_MODEL = os.getenv("GEMINI_STRONG_MODEL", "models/gemini-2.0-flash")
+CLAUDE_STRONG_MODEL = os.getenv("CLAUDE_STRONG_MODEL", "claude-sonnet-4-5-20250929")
+LLM_ESCALATION = os.getenv("LLM_ESCALATION", "true").lower() == "true"
+ESCALATE_BELOW_CONFIDENCE = float(os.getenv("ESCALATE_BELOW_CONFIDENCE", "0.7"))
+ESCALATE_CATEGORIES = {
+    c.strip().upper() for c in os.getenv("ESCALATE_CATEGORIES", "REPLY,DELEGATE").split(",") if c.strip()
+}
+
+# Bump whenever SYSTEM_PROMPT or the output shape changes, so cached
+# classifications from the old prompt are not reused.
+PROMPT_VERSION = "3-drafts" if INLINE_DRAFTS else "3"
+
+TRIAGE_PREFERENCES = {
+    "tone": "concise, warm, professional",
+    "never_auto_archive_if_from_contains": ["@eliseai.com"],
+}
+
+CATEGORIES = ("ARCHIVE", "READ_LATER", "REPLY", "TASK", "DELEGATE")
+# How many times emails with a missing or invalid item are re-sent on their own
+LLM_REASK_ATTEMPTS = int(os.getenv("LLM_REASK_ATTEMPTS", "1"))
+
+# on_chunk(message_ids): progress callback for each completed model chunk
+ChunkFn = Callable[[List[str]], None]
+
+# Per-provider cap on in-flight model calls, shared by every request
+_provider_slots = {
+    "gemini": threading.BoundedSemaphore(LLM_CONCURRENCY),
+    "claude": threading.BoundedSemaphore(LLM_CONCURRENCY),
+}
+
+_ITEM_SHAPE = '"message_id": str, "category": str, "confidence": number, "reason": str, "suggested_labels": [str]'
+_DRAFT_SHAPE = '{"to": str, "cc": [str], "subject": str, "body": str}'
+if INLINE_DRAFTS:
+    _ITEM_SHAPE += (
+        f', "draft_reply": null|{_DRAFT_SHAPE}, "task_suggestion": null|{{"title": str, "notes": str, "due": str}}'
+        ', "questions_for_user": [str]'
+    )
 
-SYSTEM_PROMPT = """You are an email triage assistant.
+SYSTEM_PROMPT = f"""You are an email triage assistant.
 Return ONLY valid JSON. No markdown. No commentary.
 
+Input: {{"emails": [{{message_id, from, subject, date, body, list?}}]}}; list=true marks mailing-list mail.
+
+Output: {{"batch_summary": str, "items": [{{{_ITEM_SHAPE}}}]}}
+One item per input email, same message_id.
+
 Categories:
 - ARCHIVE: FYI/notifications/no action required
 - READ_LATER: newsletters/long reads
@@ -13,10 +85,21 @@ Categories:
 - DELEGATE: someone else should handle it
 
 Rules:
-- Minimize questions.
-- Draft replies should be concise and professional.
-- If ARCHIVE or READ_LATER: draft_reply and task_suggestion MUST be null.
+- Never ARCHIVE mail from senders containing: {", ".join(TRIAGE_PREFERENCES["never_auto_archive_if_from_contains"])}.
 - confidence is 0..1.
+""" + (
+    f"""- Minimize questions.
+- Draft replies should be {TRIAGE_PREFERENCES["tone"]}.
+- If ARCHIVE or READ_LATER: draft_reply and task_suggestion MUST be null.
+""" if INLINE_DRAFTS else ""
+)
+
+DRAFT_SYSTEM_PROMPT = f"""You write email replies for the user.
+Return ONLY valid JSON with this exact shape: {_DRAFT_SHAPE}
+
+- Reply to the sender of the input email; cc may be empty.
+- Tone: {TRIAGE_PREFERENCES["tone"]}. Keep it short.
+- Do not invent facts, dates or commitments; leave a [placeholder] instead.
 """
 
 SUMMARY_SYSTEM_PROMPT = """You are an executive assistant summarizing an inbox.
@@ -31,32 +114,140 @@ Return ONLY valid JSON with this exact shape:
 
 
 def _build_triage_payload(emails: List[dict]) -> dict:
-    return {
-        "preferences": {
-            "tone": "concise, warm, professional",
-            "never_auto_archive_if_from_contains": ["@eliseai.com"],
-        },
-        "required_output_json_shape": {
-            "batch_summary": "string",
-            "items": [
-                {
-                    "message_id": "string",
-                    "thread_id": "string",
-                    "from": "string",
-                    "subject": "string",
-                    "date": "string",
-                    "category": "ARCHIVE|REPLY|TASK|READ_LATER|DELEGATE",
-                    "confidence": "number 0..1",
-                    "reason": "string",
-                    "suggested_labels": ["string"],
-                    "draft_reply": "null OR {to, cc[], subject, body}",
-                    "task_suggestion": "null OR {title, notes, due}",
-                    "questions_for_user": ["string"],
-                }
-            ],
-        },
-        "emails": emails,
+    """emails are already compacted by prompt_prep.prepare_emails."""
+    return {"emails": emails}
+
+
+def _chunk_emails(
+    emails: List[dict],
+    budget: int = CHUNK_TOKEN_BUDGET,
+    max_emails: int = CHUNK_MAX_EMAILS,
+) -> List[List[dict]]:
+    """Split emails, in order, into chunks whose estimated prompt fits budget."""
+    base = estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(_build_triage_payload([]))
+    chunks: List[List[dict]] = []
+    cur: List[dict] = []
+    cur_tokens = base
+    for e in emails:
+        t = estimate_tokens(e)
+        if cur and (cur_tokens + t > budget or len(cur) >= max_emails):
+            chunks.append(cur)
+            cur, cur_tokens = [], base
+        cur.append(e)
+        cur_tokens += t
+    if cur:
+        chunks.append(cur)
+    return chunks
+
+
+def _merge_slates(emails: List[dict], slates: List[Optional[dict]]) -> Dict[str, Any]:
+    """
+    Combine per-chunk slates deterministically: items in the original email
+    order, summaries in chunk order. Chunks that failed are reported.
+    """
+    order = {e["message_id"]: i for i, e in enumerate(emails)}
+    items: List[dict] = []
+    summaries: List[str] = []
+    for slate in slates:
+        if not slate:
+            continue
+        items.extend(slate.get("items") or [])
+        if slate.get("batch_summary"):
+            summaries.append(slate["batch_summary"].strip())
+    items.sort(key=lambda it: order.get(it.get("message_id"), len(order)))
+
+    missing = len(emails) - len({it.get("message_id") for it in items} & order.keys())
+    if missing:
+        summaries.append(f"{missing} of {len(emails)} emails could not be triaged this run.")
+    return {"batch_summary": " ".join(summaries), "items": items}
+
+
+def _with_metadata(items: List[dict], emails: List[dict]) -> List[dict]:
+    """Fill thread_id/from/subject/date/snippet, which the model no longer echoes."""
+    by_id = {e["message_id"]: e for e in emails}
+    for it in items:
+        e = by_id.get(it.get("message_id"))
+        if e:
+            for key in ("thread_id", "from", "subject", "date", "snippet"):
+                it.setdefault(key, e.get(key, ""))
+    return items
+
+
+def _parse_slate(text: str) -> Dict[str, Any]:
+    """
+    Every complete item in a triage response, even when the document as a
+    whole is malformed or cut off at max_tokens. Validation is separate.
+    """
+    parser = ItemStreamParser()
+    items = parser.feed(text or "")
+    return {"batch_summary": _summary_of(parser), "items": items}
+
+
+_SUMMARY_RE = re.compile(r'"batch_summary"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+def _summary_of(parser: ItemStreamParser) -> str:
+    """batch_summary of a response, recovered from the raw text if it is truncated."""
+    doc = parser.document()
+    if isinstance(doc, dict) and isinstance(doc.get("batch_summary"), str):
+        return doc["batch_summary"]
+    m = _SUMMARY_RE.search(parser.text)
+    if not m:
+        return ""
+    try:
+        return json.loads(f'"{m.group(1)}"')
+    except ValueError:
+        return ""
+
+
+def validate_item(item: Any, known_ids: set) -> Optional[dict]:
+    """
+    The item normalized (category upper-cased, confidence as 0..1 float,
+    labels as a list) or None if it cannot be trusted: unknown message_id,
+    category outside CATEGORIES, or confidence that is not a 0..1 number.
+    """
+    if not isinstance(item, dict) or item.get("message_id") not in known_ids:
+        return None
+    category = item.get("category")
+    if not isinstance(category, str) or category.strip().upper() not in CATEGORIES:
+        return None
+    try:
+        confidence = float(item.get("confidence"))
+    except (TypeError, ValueError):
+        return None
+    if not 0.0 <= confidence <= 1.0:
+        return None
+
+    labels = item.get("suggested_labels")
+    clean = {
+        **item,
+        "category": category.strip().upper(),
+        "confidence": confidence,
+        "reason": item.get("reason") if isinstance(item.get("reason"), str) else "",
+        "suggested_labels": [l for l in labels if isinstance(l, str)] if isinstance(labels, list) else [],
     }
+    for key in ("draft_reply", "task_suggestion"):
+        if not isinstance(clean.get(key), dict):
+            clean[key] = None
+    return clean
+
+
+def _validated(items: List[Any], emails: List[dict]) -> Tuple[List[dict], List[dict]]:
+    """(valid items, one per email at most; emails still needing an item)."""
+    known = {e["message_id"] for e in emails}
+    valid: Dict[str, dict] = {}
+    for it in items:
+        clean = validate_item(it, known)
+        if clean and clean["message_id"] not in valid:
+            valid[clean["message_id"]] = clean
+    rejected = len(items) - len(valid)
+    missing = [e for e in emails if e["message_id"] not in valid]
+    if missing:
+        logger.info(
+            "Triage response: %d valid, %d rejected, %d emails missing a valid item",
+            len(valid), rejected, len(missing),
+        )
+    return list(valid.values()), missing
 
 
 def _strip_code_fences(text: str) -> str:
@@ -69,79 +260,151 @@ def _strip_code_fences(text: str) -> str:
     return text.strip()
 
 
+# ── Clients ───────────────────────────────────────────────────────────────────
+# SDK clients are created once per process and reused, so connection pools
+# and TLS sessions survive across requests. Neither SDK retries on its own
+# (Gemini's default, max_retries=0 for Claude): a hidden retry would hold the
+# provider slot past the deadline llm_dispatch already gave up on.
+
+_clients: Dict[str, Any] = {}
+_clients_lock = threading.Lock()
+
+
+def _api_key(name: str) -> str:
+    key = os.getenv(name)
+    if not key:
+        raise RuntimeError(f"Missing {name} env var")
+    return key
+
+
+def _limits():
+    import httpx
+
+    return httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS)
+
+
+def _registered(name: str, factory) -> Any:
+    with _clients_lock:
+        if name not in _clients:
+            _clients[name] = factory()
+        return _clients[name]
+
+
+def gemini_client():
+    """genai.Client; its .aio attribute is the async variant on the same config."""
+    def _make():
+        from google import genai
+        from google.genai import types
+
+        return genai.Client(
+            api_key=_api_key("GEMINI_API_KEY"),
+            http_options=types.HttpOptions(
+                timeout=int(LLM_TIMEOUT * 1000),  # milliseconds
+                client_args={"limits": _limits()},
+                async_client_args={"limits": _limits()},
+            ),
+        )
+
+    return _registered("gemini", fake_llm.factory("gemini", _make))
+
+
+def claude_client():
+    def _make():
+        import anthropic
+
+        return anthropic.Anthropic(
+            api_key=_api_key("ANTHROPIC_API_KEY"),
+            timeout=LLM_TIMEOUT,
+            max_retries=0,  # llm_dispatch owns retries and backoff
+            http_client=anthropic.DefaultHttpxClient(limits=_limits()),
+        )
+
+    return _registered("claude", fake_llm.factory("claude", _make))
+
+
+def claude_async_client():
+    def _make():
+        import anthropic
+
+        return anthropic.AsyncAnthropic(
+            api_key=_api_key("ANTHROPIC_API_KEY"),
+            timeout=LLM_TIMEOUT,
+            max_retries=0,
+            http_client=anthropic.DefaultAsyncHttpxClient(limits=_limits()),
+        )
+
+    return _registered("claude_async", fake_llm.factory("claude_async", _make))
+
+
 # ── Gemini ────────────────────────────────────────────────────────────────────
 
-def triage_with_gemini(emails: List[dict]) -> Dict[str, Any]:
-    from google import genai
+def _gemini_config(system_instruction: str, temperature: float, timeout: Optional[float] = None):
     from google.genai import types
 
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise RuntimeError("Missing GEMINI_API_KEY env var")
+    return types.GenerateContentConfig(
+        system_instruction=system_instruction,
+        temperature=temperature,
+        response_mime_type="application/json",
+        # Per-call override of the client timeout, in milliseconds
+        http_options=types.HttpOptions(timeout=int(timeout * 1000)) if timeout else None,
+    )
+
 
-    client = genai.Client(api_key=api_key)
-    resp = client.models.generate_content(
-        model="models/gemini-2.0-flash-lite",
+def triage_with_gemini(emails: List[dict], model: str = GEMINI_MODEL,
+                       timeout: Optional[float] = None) -> Dict[str, Any]:
+    resp = gemini_client().models.generate_content(
+        model=model,
         contents=json.dumps(_build_triage_payload(emails)),
-        config=types.GenerateContentConfig(
-            system_instruction=SYSTEM_PROMPT,
-            temperature=0.2,
-            response_mime_type="application/json",
-        ),
+        config=_gemini_config(SYSTEM_PROMPT, 0.2, timeout),
     )
-    return json.loads((resp.text or "").strip())
+    return _parse_slate(resp.text or "")
 
 
 def summarize_with_gemini(emails: List[dict]) -> Dict[str, Any]:
-    from google import genai
-    from google.genai import types
+    resp = gemini_client().models.generate_content(
+        model=GEMINI_MODEL,
+        contents=json.dumps({"emails": emails}),
+        config=_gemini_config(SUMMARY_SYSTEM_PROMPT, 0.3),
+    )
+    return json.loads((resp.text or "").strip())
 
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise RuntimeError("Missing GEMINI_API_KEY env var")
 
-    client = genai.Client(api_key=api_key)
-    resp = client.models.generate_content(
-        model="models/gemini-2.0-flash-lite",
+async def asummarize_with_gemini(emails: List[dict]) -> Dict[str, Any]:
+    resp = await gemini_client().aio.models.generate_content(
+        model=GEMINI_MODEL,
         contents=json.dumps({"emails": emails}),
-        config=types.GenerateContentConfig(
-            system_instruction=SUMMARY_SYSTEM_PROMPT,
-            temperature=0.3,
-            response_mime_type="application/json",
-        ),
+        config=_gemini_config(SUMMARY_SYSTEM_PROMPT, 0.3),
     )
     return json.loads((resp.text or "").strip())
 
 
 # ── Claude ────────────────────────────────────────────────────────────────────
 
-def triage_with_claude(emails: List[dict]) -> Dict[str, Any]:
-    import anthropic
-
-    api_key = os.getenv("ANTHROPIC_API_KEY")
-    if not api_key:
-        raise RuntimeError("Missing ANTHROPIC_API_KEY env var")
-
-    client = anthropic.Anthropic(api_key=api_key)
-    msg = client.messages.create(
-        model="claude-haiku-4-5-20251001",
+def triage_with_claude(emails: List[dict], model: str = CLAUDE_MODEL,
+                       timeout: Optional[float] = None) -> Dict[str, Any]:
+    msg = claude_client().messages.create(
+        model=model,
         max_tokens=4096,
         system=SYSTEM_PROMPT,
         messages=[{"role": "user", "content": json.dumps(_build_triage_payload(emails))}],
+        timeout=timeout or LLM_TIMEOUT,
     )
-    return json.loads(_strip_code_fences(msg.content[0].text))
+    return _parse_slate(msg.content[0].text)
 
 
 def summarize_with_claude(emails: List[dict]) -> Dict[str, Any]:
-    import anthropic
+    msg = claude_client().messages.create(
+        model=CLAUDE_MODEL,
+        max_tokens=1024,
+        system=SUMMARY_SYSTEM_PROMPT,
+        messages=[{"role": "user", "content": json.dumps({"emails": emails})}],
+    )
+    return json.loads(_strip_code_fences(msg.content[0].text))
 
-    api_key = os.getenv("ANTHROPIC_API_KEY")
-    if not api_key:
-        raise RuntimeError("Missing ANTHROPIC_API_KEY env var")
 
-    client = anthropic.Anthropic(api_key=api_key)
-    msg = client.messages.create(
-        model="claude-haiku-4-5-20251001",
+async def asummarize_with_claude(emails: List[dict]) -> Dict[str, Any]:
+    msg = await claude_async_client().messages.create(
+        model=CLAUDE_MODEL,
         max_tokens=1024,
         system=SUMMARY_SYSTEM_PROMPT,
         messages=[{"role": "user", "content": json.dumps({"emails": emails})}],
@@ -149,27 +412,353 @@ def summarize_with_claude(emails: List[dict]) -> Dict[str, Any]:
     return json.loads(_strip_code_fences(msg.content[0].text))
 
 
+# ── Drafts ────────────────────────────────────────────────────────────────────
+
+def _build_draft_payload(email: dict) -> str:
+    # A reply needs more of the body than classification does
+    return json.dumps({"email": prepare_email(email, budget=EMAIL_TOKEN_BUDGET * 3)})
+
+
+def draft_with_gemini(email: dict, timeout: Optional[float] = None) -> Dict[str, Any]:
+    resp = gemini_client().models.generate_content(
+        model=GEMINI_MODEL,
+        contents=_build_draft_payload(email),
+        config=_gemini_config(DRAFT_SYSTEM_PROMPT, 0.4, timeout),
+    )
+    return json.loads((resp.text or "").strip())
+
+
+def draft_with_claude(email: dict, timeout: Optional[float] = None) -> Dict[str, Any]:
+    msg = claude_client().messages.create(
+        model=CLAUDE_MODEL,
+        max_tokens=1024,
+        system=DRAFT_SYSTEM_PROMPT,
+        messages=[{"role": "user", "content": _build_draft_payload(email)}],
+        timeout=timeout or LLM_TIMEOUT,
+    )
+    return json.loads(_strip_code_fences(msg.content[0].text))
+
+
 # ── Dispatchers ───────────────────────────────────────────────────────────────
 
-def triage_with_llm(emails: List[dict]) -> Dict[str, Any]:
+def _provider() -> str:
+    return "claude" if os.getenv("TRIAGE_MODE", "mock").lower() == "claude" else "gemini"
+
+
+def _model_for(provider: str, route: str = "fast") -> str:
+    if provider == "claude":
+        return CLAUDE_STRONG_MODEL if route == "strong" else CLAUDE_MODEL
+    return GEMINI_STRONG_MODEL if route == "strong" else GEMINI_MODEL
+
+
+def triage_model() -> str:
+    """Model name the current TRIAGE_MODE triages with."""
+    return _model_for(_provider())
+
+
+def strong_model() -> str:
+    return _model_for(_provider(), "strong")
+
+
+def cache_models() -> List[str]:
+    """Models whose cached items are valid answers under the current routing."""
+    models = [triage_model()]
+    if LLM_ESCALATION and strong_model() not in models:
+        models.append(strong_model())
+    return models
+
+
+def _triage_chunk(emails: List[dict], route: str = "fast", reasks: int = LLM_REASK_ATTEMPTS) -> Dict[str, Any]:
+    """
+    One model call through llm_dispatch (deadline, retries, hedging and
+    failover to the other provider's model for the same route). Every valid
+    item is kept and records its route and the call's latency; emails whose
+    item is missing or invalid are re-asked on their own, up to reasks times.
+    """
+
+    def _call(provider: str, timeout: float) -> Dict[str, Any]:
+        model = _model_for(provider, route)
+        timeout = min(timeout, LLM_TIMEOUT)
+        if provider == "claude":
+            slate = triage_with_claude(emails, model, timeout)
+        else:
+            slate = triage_with_gemini(emails, model, timeout)
+        return {**slate, "model": model}
+
+    started = time.monotonic()
+    slate = llm_dispatch.dispatch(_call, _provider(), _provider_slots)
+    latency_ms = int((time.monotonic() - started) * 1000)
+    items, missing = _validated(slate.get("items") or [], emails)
+    for it in items:
+        it["route"] = route
+        it["model"] = slate["model"]
+        it["latency_ms"] = latency_ms
+
+    if missing and reasks > 0:
+        try:
+            items += _triage_chunk(missing, route, reasks - 1)["items"]
+        except Exception as e:
+            logger.warning("Re-asking %d emails failed: %s", len(missing), e)
+        order = {e["message_id"]: i for i, e in enumerate(emails)}
+        items.sort(key=lambda it: order[it["message_id"]])
+    return {"batch_summary": slate.get("batch_summary") or "", "items": items}
+
+
+def _triage_chunks(emails: List[dict], route: str = "fast",
+                   on_chunk: Optional[ChunkFn] = None) -> Dict[str, Any]:
+    """
+    Triage emails in token-bounded chunks, run concurrently (at most
+    LLM_CONCURRENCY calls per provider), and merge the partial slates.
+    A failed chunk only loses its own emails; if every chunk fails the
+    last error is raised. on_chunk gets each chunk's message ids as it ends.
+    """
+    chunks = _chunk_emails(emails)
+    if len(chunks) <= 1:
+        slate = _triage_chunk(emails, route)
+        if on_chunk:
+            on_chunk([e["message_id"] for e in emails])
+        return slate
+
+    slates: List[Optional[dict]] = [None] * len(chunks)
+    last_error: Optional[Exception] = None
+    with ThreadPoolExecutor(max_workers=min(LLM_CONCURRENCY, len(chunks))) as pool:
+        futures = {pool.submit(_triage_chunk, chunk, route): i for i, chunk in enumerate(chunks)}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                slates[i] = future.result()
+            except Exception as e:
+                logger.warning("Triage chunk failed: %s", e)
+                last_error = e
+            if on_chunk:
+                on_chunk([e["message_id"] for e in chunks[i]])
+
+    if last_error and not any(slates):
+        raise last_error
+    return _merge_slates(emails, slates)
+
+
+def _needs_escalation(item: dict) -> bool:
+    try:
+        confidence = float(item.get("confidence") or 0)
+    except (TypeError, ValueError):
+        confidence = 0.0
+    category = (item.get("category") or "").upper()
+    return confidence < ESCALATE_BELOW_CONFIDENCE or category in ESCALATE_CATEGORIES
+
+
+def _escalate(items: List[dict], emails: List[dict]) -> Tuple[List[dict], int]:
+    """
+    Re-run the items that need it on the strong model. Returns (items, number
+    escalated); escalated items report the fast and strong call latencies
+    combined. If the strong model fails, the fast results are kept.
+    """
+    if not LLM_ESCALATION or strong_model() == triage_model():
+        return items, 0
+    flagged = {it.get("message_id") for it in items if _needs_escalation(it)}
+    if not flagged:
+        return items, 0
+
+    try:
+        strong = _triage_chunks([e for e in emails if e["message_id"] in flagged], "strong")
+    except Exception as e:
+        logger.warning("Escalation to %s failed, keeping fast results: %s", strong_model(), e)
+        return items, 0
+
+    fast_latency = {it.get("message_id"): it.get("latency_ms") or 0 for it in items}
+    by_id = {}
+    for it in strong.get("items") or []:
+        if it.get("message_id") in flagged:
+            it["latency_ms"] = (it.get("latency_ms") or 0) + fast_latency.get(it["message_id"], 0)
+            by_id[it["message_id"]] = it
+    return [by_id.get(it.get("message_id"), it) for it in items], len(by_id)
+
+
+def triage_with_llm(emails: List[dict], on_chunk: Optional[ChunkFn] = None) -> Dict[str, Any]:
+    """
+    Compact the emails, triage them on the fast model, then escalate unsure
+    or high-stakes items to the strong model (see _escalate). on_chunk is
+    called with the message ids of each fast-model chunk as it completes.
+    """
+    prepared, prompt_tokens = prepare_emails(emails)
+    slate = _triage_chunks(prepared, on_chunk=on_chunk)
+    items, escalated = _escalate(slate.get("items") or [], prepared)
+    _with_metadata(items, emails)
+
+    summary = slate.get("batch_summary") or ""
+    if escalated:
+        summary = f"{summary} {escalated} emails double-checked by {strong_model()}.".strip()
+    return {"batch_summary": summary, "items": items, "prompt_tokens": prompt_tokens}
+
+
+def draft_reply(email: dict) -> Dict[str, Any]:
+    """One reply draft ({to, cc, subject, body}) for an email, generated on demand."""
     mode = os.getenv("TRIAGE_MODE", "mock").lower()
-    if mode == "claude":
-        return triage_with_claude(emails)
-    return triage_with_gemini(emails)
+    if mode not in ("llm", "gemini", "claude"):
+        from app.mock_llm import draft_with_mock
+
+        return draft_with_mock(email)
+
+    def _call(provider: str, timeout: float) -> Dict[str, Any]:
+        timeout = min(timeout, LLM_TIMEOUT)
+        if provider == "claude":
+            return draft_with_claude(email, timeout)
+        return draft_with_gemini(email, timeout)
+
+    return llm_dispatch.dispatch(_call, _provider(), _provider_slots)
+
+
+# ── Streaming ─────────────────────────────────────────────────────────────────
+
+def _stream_gemini_text(emails: List[dict], model: str = GEMINI_MODEL) -> Iterator[str]:
+    for chunk in gemini_client().models.generate_content_stream(
+        model=model,
+        contents=json.dumps(_build_triage_payload(emails)),
+        config=_gemini_config(SYSTEM_PROMPT, 0.2),
+    ):
+        if chunk.text:
+            yield chunk.text
+
+
+def _stream_claude_text(emails: List[dict], model: str = CLAUDE_MODEL) -> Iterator[str]:
+    with claude_client().messages.stream(
+        model=model,
+        max_tokens=4096,
+        system=SYSTEM_PROMPT,
+        messages=[{"role": "user", "content": json.dumps(_build_triage_payload(emails))}],
+    ) as stream:
+        yield from stream.text_stream
+
+
+def _stream_chunk(emails: List[dict], out: "queue.Queue[Tuple[str, Any]]") -> Optional[str]:
+    """
+    Stream one chunk on the fast model, pushing each valid item to out as it
+    completes (latency_ms is the time until that item arrived); returns its
+    batch_summary. Emails left without a valid item, because items were
+    malformed or the stream failed or was cut off, are then triaged through
+    the non-streaming dispatcher, which can fail over to the other provider.
+    """
+    provider = llm_dispatch.choose(_provider())
+    model = _model_for(provider)
+    parser = ItemStreamParser()
+    known = {e["message_id"] for e in emails}
+    emitted: set = set()
+    try:
+        with _provider_slots[provider]:
+            started = time.monotonic()
+            if provider == "claude":
+                text = _stream_claude_text(emails, model)
+            else:
+                text = _stream_gemini_text(emails, model)
+            for fragment in text:
+                for raw in parser.feed(fragment):
+                    item = validate_item(raw, known - emitted)
+                    if item is None:
+                        continue
+                    item["route"] = "fast"
+                    item["model"] = model
+                    item["latency_ms"] = int((time.monotonic() - started) * 1000)
+                    out.put(("item", item))
+                    emitted.add(item["message_id"])
+        llm_dispatch.report(provider, seconds=time.monotonic() - started)
+    except Exception as e:
+        llm_dispatch.report(provider, e)
+        logger.warning("Streaming from %s failed after %d items: %s", provider, len(emitted), e)
+
+    summary = _summary_of(parser)
+    missing = [e for e in emails if e["message_id"] not in emitted]
+    if missing:
+        slate = _triage_chunk(missing)
+        for item in slate["items"]:
+            out.put(("item", item))
+        summary = summary or slate["batch_summary"]
+    return summary
+
+
+def stream_triage(emails: List[dict]) -> Iterator[Tuple[str, Any]]:
+    """
+    Streaming triage_with_llm: yields ("prompt_tokens", dict) first, then
+    chunks stream concurrently and ("item", dict) is yielded the moment any
+    item's JSON closes, in arrival order. Items that need escalation are held
+    back and yielded once the strong model has re-run them. Ends with one
+    ("summary", str) merged like triage_with_llm.
+    """
+    prepared, prompt_tokens = prepare_emails(emails)
+    yield "prompt_tokens", prompt_tokens
+    chunks = _chunk_emails(prepared)
+    out: "queue.Queue[Tuple[str, Any]]" = queue.Queue()
+    summaries: List[Optional[dict]] = [None] * len(chunks)
+    errors: List[Exception] = []
+    seen: List[dict] = []
+    held: List[dict] = []
+
+    def _run(index: int, chunk: List[dict]) -> None:
+        try:
+            summaries[index] = {"batch_summary": _stream_chunk(chunk, out) or "", "items": []}
+        except Exception as e:
+            logger.warning("Streaming triage chunk failed: %s", e)
+            errors.append(e)
+        finally:
+            out.put(("done", None))
+
+    with ThreadPoolExecutor(max_workers=min(LLM_CONCURRENCY, len(chunks)) or 1) as pool:
+        for i, chunk in enumerate(chunks):
+            pool.submit(_run, i, chunk)
+        pending = len(chunks)
+        while pending:
+            kind, payload = out.get()
+            if kind == "done":
+                pending -= 1
+                continue
+            seen.append(payload)
+            if LLM_ESCALATION and _needs_escalation(payload):
+                held.append(payload)
+                continue
+            _with_metadata([payload], emails)
+            yield kind, payload
+
+    if errors and len(errors) == len(chunks):
+        raise errors[-1]
+
+    escalated = 0
+    if held:
+        held, escalated = _escalate(held, prepared)
+        for item in _with_metadata(held, emails):
+            yield "item", item
+
+    merged = _merge_slates(emails, summaries + [{"batch_summary": "", "items": seen}])
+    summary = merged["batch_summary"]
+    if escalated:
+        summary = f"{summary} {escalated} emails double-checked by {strong_model()}.".strip()
+    yield "summary", summary
 
 
 def summarize_inbox(emails: List[dict]) -> Dict[str, Any]:
     mode = os.getenv("TRIAGE_MODE", "mock").lower()
-    if mode == "mock":
-        return {
-            "headline": f"You have {len(emails)} emails in your inbox.",
-            "key_actions": [
-                f"{e.get('from', '?')}: {e.get('subject', '(no subject)')}"
-                for e in emails[:5]
-            ],
-            "fyi": [],
-            "total": len(emails),
-        }
+    if mode in ("mock", "local"):
+        return _mock_summary(emails)
     if mode == "claude":
         return summarize_with_claude(emails)
     return summarize_with_gemini(emails)
+
+
+def _mock_summary(emails: List[dict]) -> Dict[str, Any]:
+    return {
+        "headline": f"You have {len(emails)} emails in your inbox.",
+        "key_actions": [
+            f"{e.get('from', '?')}: {e.get('subject', '(no subject)')}"
+            for e in emails[:5]
+        ],
+        "fyi": [],
+        "total": len(emails),
+    }
+
+
+async def asummarize_inbox(emails: List[dict]) -> Dict[str, Any]:
+    """summarize_inbox for async endpoints: awaits the model on the event loop."""
+    mode = os.getenv("TRIAGE_MODE", "mock").lower()
+    if mode in ("mock", "local"):
+        return _mock_summary(emails)
+    if mode == "claude":
+        return await asummarize_with_claude(emails)
+    return await asummarize_with_gemini(emails)
@@ -0,0 +1,288 @@
+from __future__ import annotations
+
+import collections
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+from app import fake_llm
+
+logger = logging.getLogger(__name__)
+
+# Resilient model calls: a deadline per attempt, retries on transient errors,
+# a hedged request to the other provider once the first one is slower than
+# its recent p95, and a circuit breaker per provider. The deadline and the
+# hedge timer start once the caller's concurrency slot is held, and the
+# call is handed the time left so the SDK gives up no later than the
+# deadline does.
+
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE_SECONDS", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_FAILOVER = os.getenv("LLM_FAILOVER", "true").lower() == "true"
+HEDGE_AFTER_DEFAULT = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", "10"))  # until p95 is known
+HEDGE_MIN_SAMPLES = 20
+BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+
+BACKOFF_BASE = 0.5   # seconds
+BACKOFF_CAP = 8.0
+TRANSIENT_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+PROVIDER_KEYS = {"gemini": "GEMINI_API_KEY", "claude": "ANTHROPIC_API_KEY"}
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Opens after BREAKER_FAILURES consecutive transient failures. Once
+    BREAKER_COOLDOWN has passed calls are let through again (half-open); the
+    next success closes it, the next failure restarts the cooldown.
+    """
+
+    def __init__(self) -> None:
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            return self._opened_at is None or time.monotonic() - self._opened_at >= BREAKER_COOLDOWN
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._opened_at is not None or self._failures >= BREAKER_FAILURES:
+                self._opened_at = time.monotonic()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half_open" if time.monotonic() - self._opened_at >= BREAKER_COOLDOWN else "open"
+
+
+class LatencyWindow:
+    """Latencies of the last successful calls, for the hedge threshold."""
+
+    def __init__(self, size: int = 100) -> None:
+        self._samples: collections.deque = collections.deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def p95(self) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+_breakers = {p: CircuitBreaker() for p in PROVIDER_KEYS}
+_latency = {p: LatencyWindow() for p in PROVIDER_KEYS}
+_stats = {p: {"calls": 0, "failures": 0, "retries": 0, "hedges": 0, "failovers": 0} for p in PROVIDER_KEYS}
+_stats_lock = threading.Lock()
+
+# Attempts run here so a call that blows its deadline can be abandoned; the
+# per-call SDK timeout (at most the deadline) frees the thread and its slot.
+_attempts = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-attempt")
+_hedges = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-hedge")
+
+
+def _count(provider: str, key: str) -> None:
+    with _stats_lock:
+        _stats[provider][key] += 1
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Timeouts, rate limits, 5xx/overloaded and network errors from either SDK."""
+    if isinstance(exc, (TimeoutError, ConnectionError, httpx.TransportError)):
+        return True
+    status = getattr(exc, "status_code", None) or getattr(exc, "code", None)
+    if isinstance(status, int):
+        return status in TRANSIENT_STATUS
+    # anthropic.APIConnectionError / APITimeoutError carry no status
+    return type(exc).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def alternate(provider: str) -> Optional[str]:
+    """The other provider, if failover is on and it has an API key (or is faked)."""
+    if not LLM_FAILOVER:
+        return None
+    other = "claude" if provider == "gemini" else "gemini"
+    return other if os.getenv(PROVIDER_KEYS[other]) or fake_llm.enabled() else None
+
+
+CallFn = Callable[[str, float], Any]
+Slots = Dict[str, threading.Semaphore]
+
+
+def _submit(provider: str, fn: CallFn, slot: Optional[threading.Semaphore],
+            held: Optional[threading.Event] = None) -> "Future[Any]":
+    """
+    Run fn(provider, seconds_left) on the attempt pool once slot is held,
+    setting held at that point. The slot goes back when the call itself
+    ends, not when the caller gives up on it, so abandoned attempts still
+    count against the provider's cap.
+    """
+    if slot is not None:
+        slot.acquire()
+    if held is not None:
+        held.set()
+    deadline = time.monotonic() + LLM_DEADLINE
+
+    def _attempt() -> Any:
+        try:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                raise TimeoutError(f"{provider} call waited past its deadline to start")
+            return fn(provider, left)
+        finally:
+            if slot is not None:
+                slot.release()
+
+    try:
+        return _attempts.submit(_attempt)
+    except BaseException:
+        if slot is not None:
+            slot.release()
+        raise
+
+
+def _with_retries(provider: str, fn: CallFn, slots: Optional[Slots] = None,
+                  held: Optional[threading.Event] = None) -> Any:
+    """fn on provider with retries; held is set once the first attempt holds its slot (or on exit)."""
+    breaker = _breakers[provider]
+    slot = slots.get(provider) if slots else None
+    try:
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            _count(provider, "calls")
+            # Waiting for a slot is local queueing, not provider latency:
+            # neither the deadline, the hedge timer, the latency window nor
+            # the breaker sees it
+            future = _submit(provider, fn, slot, held)
+            started = time.monotonic()
+            try:
+                try:
+                    result = future.result(timeout=LLM_DEADLINE)
+                except FutureTimeout:
+                    raise TimeoutError(f"{provider} call exceeded {LLM_DEADLINE:.0f}s deadline")
+            except Exception as e:
+                _count(provider, "failures")
+                transient = is_transient(e)
+                if transient:
+                    breaker.record_failure()
+                if attempt == LLM_MAX_RETRIES or not transient or not breaker.allow():
+                    raise
+                _count(provider, "retries")
+                delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+                logger.info("%s transient error (%s) — retrying in %.1fs", provider, e, delay)
+                time.sleep(delay)
+                continue
+            _latency[provider].add(time.monotonic() - started)
+            breaker.record_success()
+            return result
+    finally:
+        if held is not None:
+            held.set()
+
+
+def choose(primary: str) -> str:
+    """Provider for a call that cannot be hedged (streaming): primary unless its circuit is open."""
+    for p in (primary, alternate(primary)):
+        if p and _breakers[p].allow():
+            if p != primary:
+                _count(primary, "failovers")
+            return p
+    raise CircuitOpenError(f"{primary} circuit is open and no alternate provider is available")
+
+
+def report(provider: str, error: Optional[BaseException] = None, seconds: Optional[float] = None) -> None:
+    """Feed the outcome of a call made outside dispatch() into the breaker and stats."""
+    _count(provider, "calls")
+    if error is None:
+        _breakers[provider].record_success()
+        if seconds is not None:
+            _latency[provider].add(seconds)
+        return
+    _count(provider, "failures")
+    if is_transient(error):
+        _breakers[provider].record_failure()
+
+
+def dispatch(fn: CallFn, primary: str, slots: Optional[Slots] = None) -> Any:
+    """
+    fn(provider, timeout) on primary, with retries; timeout is the seconds
+    left of the attempt's deadline, to pass on to the SDK. slots caps
+    in-flight calls per provider. If it is still running after
+    primary's p95 latency (LLM_HEDGE_AFTER_SECONDS until enough samples), the
+    same call is hedged on the alternate provider and the first success wins.
+    If primary fails outright, or its circuit is open, the alternate is used.
+    """
+    providers = [p for p in (primary, alternate(primary)) if p and _breakers[p].allow()]
+    if not providers:
+        raise CircuitOpenError(f"{primary} circuit is open and no alternate provider is available")
+
+    first = providers[0]
+    backup = providers[1] if len(providers) > 1 else None
+    if first != primary:
+        _count(primary, "failovers")
+        logger.warning("%s circuit open — sending to %s", primary, first)
+
+    held = threading.Event()
+    pending = {_hedges.submit(_with_retries, first, fn, slots, held)}
+    started_backup = False
+    errors: List[BaseException] = []
+
+    # The hedge clock starts once the primary attempt holds its slot
+    held.wait()
+    hedge_after = _latency[first].p95() or HEDGE_AFTER_DEFAULT
+    done, pending = wait(pending, timeout=hedge_after)
+    if not done and backup:
+        _count(first, "hedges")
+        logger.info("%s slower than %.1fs — hedging on %s", first, hedge_after, backup)
+        pending.add(_hedges.submit(_with_retries, backup, fn, slots))
+        started_backup = True
+
+    while True:
+        for f in done:
+            try:
+                return f.result()
+            except Exception as e:
+                errors.append(e)
+        if not pending and backup and not started_backup:
+            _count(first, "failovers")
+            logger.warning("%s failed (%s) — failing over to %s", first, errors[-1], backup)
+            pending = {_hedges.submit(_with_retries, backup, fn, slots)}
+            started_backup = True
+        if not pending:
+            raise errors[-1]
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+
+def provider_health() -> Dict[str, Any]:
+    with _stats_lock:
+        stats = {p: dict(s) for p, s in _stats.items()}
+    for p, s in stats.items():
+        p95 = _latency[p].p95()
+        s["circuit"] = _breakers[p].state
+        s["p95_ms"] = int(p95 * 1000) if p95 is not None else None
+    return stats
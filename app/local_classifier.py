@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.db import get_conn
+
+# Multinomial naive Bayes over hashed bag-of-words features (sender, domain,
+# subject, snippet), trained from human-approved triage_items. Counts are
+# additive: each row records the category it was trained under
+# (triage_items.trained_category), so retraining only touches rows approved
+# or re-categorized since, in any order, moving a corrected row's counts
+# from its old category to the new one.
+
+N_BUCKETS = 2 ** 18
+CATEGORIES = ["ARCHIVE", "READ_LATER", "REPLY", "TASK", "DELEGATE"]
+MIN_TRAINING_ROWS = 20
+
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9'\-]+")
+
+_lock = threading.Lock()
+_model: Dict[str, Any] | None = None
+
+
+def _model_path() -> str:
+    return os.getenv("LOCAL_MODEL_PATH", "data/local_model.json")
+
+
+def _empty_model() -> Dict[str, Any]:
+    return {
+        "class_docs": {c: 0 for c in CATEGORIES},
+        "class_tokens": {c: 0 for c in CATEGORIES},
+        "counts": {c: {} for c in CATEGORIES},   # category -> {bucket: count}
+    }
+
+
+def _bucket(feature: str) -> str:
+    # crc32 rather than hash(): stable across processes, so saved models stay valid
+    return str(zlib.crc32(feature.encode("utf-8")) % N_BUCKETS)
+
+
+def features(email: Dict[str, Any]) -> List[str]:
+    sender = (email.get("from") or email.get("sender") or "").lower()
+    domain = re.search(r"@([\w.-]+)", sender)
+    feats = [f"s:{t}" for t in _TOKEN_RE.findall(sender)]
+    if domain:
+        feats.append(f"d:{domain.group(1)}")
+    feats += [f"w:{t}" for t in _TOKEN_RE.findall((email.get("subject") or "").lower())]
+    feats += [f"b:{t}" for t in _TOKEN_RE.findall((email.get("snippet") or "").lower())[:60]]
+    return [_bucket(f) for f in feats]
+
+
+def _load() -> Dict[str, Any]:
+    global _model
+    if _model is None:
+        try:
+            with open(_model_path()) as f:
+                _model = json.load(f)
+        except (OSError, ValueError):
+            _model = _empty_model()
+        if "trained_ids" in _model:
+            # Models saved before per-row tracking listed every trained id
+            _model["trained_through"] = max(_model.pop("trained_ids"), default=0)
+    return _model
+
+
+def in_use() -> bool:
+    """Whether triage consults the model (TRIAGE_MODE=local or LOCAL_FIRST_PASS)."""
+    from app.cascade import LOCAL_FIRST_PASS
+
+    return LOCAL_FIRST_PASS or os.getenv("TRIAGE_MODE", "mock").lower() == "local"
+
+
+def _trained_rows(model: Dict[str, Any]) -> int:
+    return sum(model["class_docs"].values())
+
+
+def _save(model: Dict[str, Any]) -> None:
+    path = _model_path()
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".local-model-", suffix=".json")
+    with os.fdopen(fd, "w") as f:
+        json.dump(model, f)
+    os.replace(tmp, path)
+
+
+def _fold(model: Dict[str, Any], cat: str, feats: List[str], sign: int) -> None:
+    """Add (sign=1) or remove (sign=-1) one document's counts under cat."""
+    counts = model["counts"][cat]
+    for b in feats:
+        n = counts.get(b, 0) + sign
+        if n > 0:
+            counts[b] = n
+        else:
+            counts.pop(b, None)
+    model["class_docs"][cat] += sign
+    model["class_tokens"][cat] += sign * len(feats)
+
+
+def train() -> Dict[str, Any]:
+    """
+    Fold approved rows whose category differs from the one they were trained
+    under (never trained, or re-categorized since) into the model and save it.
+    """
+    with _lock:
+        model = _load()
+        with get_conn() as conn:
+            if not _trained_rows(model):
+                # New or deleted model file: every approved row needs training
+                conn.execute("UPDATE triage_items SET trained_category=NULL WHERE trained_category IS NOT NULL")
+            elif "trained_through" in model:
+                # Models saved under the old id high-water mark
+                conn.execute(
+                    """
+                    UPDATE triage_items SET trained_category=category
+                    WHERE approved = 1 AND id <= ? AND trained_category IS NULL
+                    """,
+                    (model["trained_through"],),
+                )
+            model.pop("trained_through", None)
+            rows = conn.execute(
+                """
+                SELECT id, sender, subject, snippet, category, trained_category
+                FROM triage_items
+                WHERE approved = 1 AND trained_category IS NOT category
+                ORDER BY id
+                """
+            ).fetchall()
+
+        added = corrected = 0
+        for r in rows:
+            old = (r["trained_category"] or "").upper()
+            new = (r["category"] or "").upper()
+            feats = features({"from": r["sender"], "subject": r["subject"], "snippet": r["snippet"]})
+            if old in CATEGORIES:
+                _fold(model, old, feats, -1)
+            if new in CATEGORIES:
+                _fold(model, new, feats, 1)
+                if old in CATEGORIES:
+                    corrected += 1
+                else:
+                    added += 1
+
+        if rows:
+            # Model first: if the UPDATE is lost, those rows are retrained
+            # (counted twice) rather than silently dropped
+            _save(model)
+            with get_conn() as conn:
+                conn.executemany(
+                    "UPDATE triage_items SET trained_category=? WHERE id=?",
+                    [(r["category"], r["id"]) for r in rows],
+                )
+        return {"added": added, "corrected": corrected, "total": _trained_rows(model)}
+
+
+def is_ready() -> bool:
+    with _lock:
+        return _trained_rows(_load()) >= MIN_TRAINING_ROWS
+
+
+def predict(email: Dict[str, Any]) -> Optional[Tuple[str, float]]:
+    """(category, probability) or None while the model has too little data."""
+    with _lock:
+        model = _load()
+        total_docs = sum(model["class_docs"].values())
+        if total_docs < MIN_TRAINING_ROWS:
+            return None
+
+        feats = features(email)
+        scores: Dict[str, float] = {}
+        for cat in CATEGORIES:
+            docs = model["class_docs"][cat]
+            if not docs:
+                continue
+            counts = model["counts"][cat]
+            denom = model["class_tokens"][cat] + N_BUCKETS  # Laplace smoothing
+            score = math.log(docs / total_docs)
+            for b in feats:
+                score += math.log((counts.get(b, 0) + 1) / denom)
+            scores[cat] = score
+
+    best = max(scores, key=scores.get)
+    top = scores[best]
+    norm = sum(math.exp(s - top) for s in scores.values())
+    return best, 1.0 / norm
+
+
+def triage_with_local(emails: List[dict]) -> Dict[str, Any]:
+    """TRIAGE_MODE=local: classify every email with the trained model."""
+    from app.cascade import local_item
+    from app.mock_llm import triage_with_mock
+
+    if not is_ready():
+        slate = triage_with_mock(emails)
+        slate["batch_summary"] += " Local model not trained yet — used mock heuristics."
+        return slate
+
+    items = []
+    for e in emails:
+        cat, prob = predict(e)
+        items.append(local_item(e, cat, round(prob, 3), "Local model trained on your approvals.", "local"))
+    return {"batch_summary": f"Local model: processed {len(items)} emails.", "items": items}
+
+
+def model_stats() -> Dict[str, Any]:
+    with _lock:
+        model = _load()
+        return {
+            "trained_rows": _trained_rows(model),
+            "ready": _trained_rows(model) >= MIN_TRAINING_ROWS,
+            "class_docs": dict(model["class_docs"]),
+            "path": _model_path(),
+        }
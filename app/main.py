@@ -11,15 +11,20 @@ from app.triage_ui import router as triage_ui_router
 from app.auto_archive import router as auto_archive_router
 from app.analytics import router as analytics_router
 from app.db import init_db
+from app.gmail_async import close_async_gmail
+from app.jobs import start_workers, stop_workers
 from app.scheduler import start_scheduler, shutdown_scheduler
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     init_db()
+    start_workers()
     start_scheduler()
     yield
     shutdown_scheduler()
+    stop_workers()
+    await close_async_gmail()
 
 
 app = FastAPI(title="Gmail Triage Agent", lifespan=lifespan)
@@ -0,0 +1,85 @@
+# app/message_cache.py
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List
+
+from app.db import get_conn, now_iso
+
+# Parsed Gmail messages (headers, snippet, body preview) never change once
+# delivered, so they are cached by id and evicted least-recently-used.
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def _max_items() -> int:
+    return int(os.getenv("MESSAGE_CACHE_MAX_ITEMS", "5000"))
+
+
+def get_many(ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Cached items for the given ids; ids not in the cache are simply absent."""
+    if not ids:
+        return {}
+    out: Dict[str, Dict[str, Any]] = {}
+    with get_conn() as conn:
+        # Chunk to stay under SQLite's bound-parameter limit
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            rows = conn.execute(
+                f"SELECT message_id, item_json FROM message_cache "
+                f"WHERE message_id IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ).fetchall()
+            for r in rows:
+                out[r["message_id"]] = json.loads(r["item_json"])
+        if out:
+            now = time.time()
+            conn.executemany(
+                "UPDATE message_cache SET last_access=? WHERE message_id=?",
+                [(now, mid) for mid in out],
+            )
+
+    with _lock:
+        _stats["hits"] += len(out)
+        _stats["misses"] += len(set(ids)) - len(out)
+    return out
+
+
+def put_many(items: Iterable[Dict[str, Any]]) -> None:
+    now = time.time()
+    rows = [(it["id"], json.dumps(it), now, now_iso()) for it in items if it.get("id")]
+    if not rows:
+        return
+    with get_conn() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO message_cache (message_id, item_json, last_access, created_at) "
+            "VALUES (?, ?, ?, ?)",
+            rows,
+        )
+        excess = conn.execute("SELECT COUNT(*) FROM message_cache").fetchone()[0] - _max_items()
+        if excess > 0:
+            conn.execute(
+                """
+                DELETE FROM message_cache WHERE message_id IN (
+                    SELECT message_id FROM message_cache ORDER BY last_access ASC LIMIT ?
+                )
+                """,
+                (excess,),
+            )
+            with _lock:
+                _stats["evictions"] += excess
+
+
+def cache_stats() -> Dict[str, Any]:
+    with _lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else None
+    with get_conn() as conn:
+        stats["size"] = conn.execute("SELECT COUNT(*) FROM message_cache").fetchone()[0]
+    stats["max_items"] = _max_items()
+    return stats
@@ -1,18 +1,25 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
+
+def confident_category(e: dict) -> Optional[Tuple[str, str]]:
+    """(category, reason) when a heuristic is decisive on its own, else None."""
+    subj = (e.get("subject") or "").lower()
+    frm = (e.get("from") or "").lower()
+    has_unsub = bool(e.get("has_list_unsubscribe"))
+
+    if has_unsub or "unsubscribe" in subj or "newsletter" in subj:
+        return "READ_LATER", "Newsletter/marketing signal."
+    if any(x in frm for x in ["no-reply", "noreply", "do-not-reply", "notifications@"]):
+        return "ARCHIVE", "Automated notification sender."
+    return None
 
 def triage_with_mock(emails: List[dict]) -> Dict[str, Any]:
     items = []
     for e in emails:
         subj = (e.get("subject") or "").lower()
-        frm = (e.get("from") or "").lower()
-        has_unsub = bool(e.get("has_list_unsubscribe"))
+        confident = confident_category(e)
 
-        if has_unsub or "unsubscribe" in subj or "newsletter" in subj:
-            cat = "READ_LATER"
-            reason = "Newsletter/marketing signal."
-        elif any(x in frm for x in ["no-reply", "noreply", "do-not-reply", "notifications@"]):
-            cat = "ARCHIVE"
-            reason = "Automated notification sender."
+        if confident:
+            cat, reason = confident
         elif any(x in subj for x in ["intro", "introduction", "meeting", "quick chat", "availability"]):
             cat = "REPLY"
             reason = "Likely expects a response (intro/scheduling keywords)."
@@ -32,7 +39,18 @@ def triage_with_mock(emails: List[dict]) -> Dict[str, Any]:
             "suggested_labels": [f"Triage/{'ReadLater' if cat=='READ_LATER' else 'Now' if cat in ('REPLY','TASK','DELEGATE') else 'Done'}"],
             "draft_reply": None,
             "task_suggestion": None,
-            "questions_for_user": []
+            "questions_for_user": [],
+            "decided_by": "mock",
         })
 
     return {"batch_summary": f"Mock triage (no model): processed {len(items)} emails.", "items": items}
+
+
+def draft_with_mock(e: dict) -> Dict[str, Any]:
+    subject = e.get("subject") or ""
+    return {
+        "to": e.get("from", ""),
+        "cc": [],
+        "subject": subject if subject.lower().startswith("re:") else f"Re: {subject}",
+        "body": "Hi,\n\nThanks for your email — I'll get back to you shortly.\n\nBest,",
+    }
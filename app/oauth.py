@@ -12,6 +12,8 @@ from fastapi.responses import RedirectResponse, HTMLResponse
 from google_auth_oauthlib.flow import Flow
 from google.oauth2.credentials import Credentials
 
+from app.gmail_client import save_credentials
+
 router = APIRouter()
 
 SCOPES = [
@@ -25,9 +27,6 @@ def _env(name: str) -> str:
         raise RuntimeError(f"Missing env var: {name}")
     return val
 
-def _token_store_path() -> Path:
-    return Path(_env("TOKEN_STORE_PATH"))
-
 def _client_secrets_path() -> str:
     return _env("GOOGLE_OAUTH_CLIENT_SECRETS")
 
@@ -81,17 +80,8 @@ def google_callback(request: Request):
     flow.fetch_token(code=code)
 
     creds: Credentials = flow.credentials
-    token_data = {
-        "token": creds.token,
-        "refresh_token": creds.refresh_token,
-        "token_uri": creds.token_uri,
-        "client_id": creds.client_id,
-        "client_secret": creds.client_secret,
-        "scopes": creds.scopes,
-    }
-
-    _token_store_path().parent.mkdir(parents=True, exist_ok=True)
-    _token_store_path().write_text(json.dumps(token_data, indent=2))
+    # Atomic write including expiry, so the service factory can refresh proactively
+    save_credentials(creds)
 
     return """
     <h3>✅ Connected Gmail</h3>
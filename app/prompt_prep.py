@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import html
+import json
+import os
+import re
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Tuple
+
+# Cleans email text before it reaches the model: HTML to text, quoted reply
+# history and signatures removed, whitespace collapsed, and each email cut to
+# a token budget. Whole-request budgets are enforced by the chunker in llm.py.
+
+CHARS_PER_TOKEN = 4  # rough estimate for English/JSON text
+EMAIL_TOKEN_BUDGET = int(os.getenv("LLM_EMAIL_TOKENS", "200"))
+SUBJECT_MAX_CHARS = 200
+
+
+def estimate_tokens(obj: Any) -> int:
+    text = obj if isinstance(obj, str) else json.dumps(obj)
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+# ── HTML ──────────────────────────────────────────────────────────────────────
+
+_BLOCK_TAGS = {"p", "div", "br", "tr", "li", "h1", "h2", "h3", "h4", "table", "blockquote"}
+_SKIP_TAGS = {"script", "style", "head", "title"}
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip = 0
+        self._quote = 0
+        self._div_depth = 0
+        self._quote_divs: List[int] = []   # div depths that opened a quote
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "div":
+            self._div_depth += 1
+        if tag in _SKIP_TAGS:
+            self._skip += 1
+        elif tag == "blockquote":
+            # Quoted replies in HTML mail; nested tags inside are skipped too
+            self._quote += 1
+        elif tag == "div" and "gmail_quote" in (dict(attrs).get("class") or "").split():
+            self._quote += 1
+            self._quote_divs.append(self._div_depth)
+        if tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS and self._skip:
+            self._skip -= 1
+        elif tag == "blockquote" and self._quote:
+            self._quote -= 1
+        elif tag == "div" and self._div_depth:
+            if self._quote_divs and self._quote_divs[-1] == self._div_depth:
+                self._quote_divs.pop()
+                self._quote -= 1
+            self._div_depth -= 1
+        if tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip and not self._quote:
+            self.parts.append(data)
+
+
+def looks_like_html(text: str) -> bool:
+    return bool(re.search(r"<(html|body|div|p|br|table|span|a)\b", text[:2000], re.I))
+
+
+def html_to_text(text: str) -> str:
+    parser = _TextExtractor()
+    try:
+        parser.feed(text)
+        parser.close()
+    except Exception:
+        # Truncated or broken markup: fall back to dropping tags
+        return html.unescape(re.sub(r"<[^>]*>?", " ", text))
+    return "".join(parser.parts)
+
+
+# ── Quoted history / signatures ───────────────────────────────────────────────
+
+_QUOTE_HEADERS = [
+    re.compile(r"^On .{0,200}wrote:\s*$"),
+    re.compile(r"^-{2,}\s*Original Message\s*-{2,}", re.I),
+    re.compile(r"^-{2,}\s*Forwarded message\s*-{2,}", re.I),
+    re.compile(r"^_{10,}\s*$"),
+    re.compile(r"^From: .+$"),
+]
+_SIGNATURE_MARKERS = [
+    re.compile(r"^--\s*$"),
+    re.compile(r"^Sent from my \w+", re.I),
+    re.compile(r"^Get Outlook for \w+", re.I),
+]
+
+
+def strip_quoted(text: str) -> str:
+    """Drop "> " lines and everything from the first reply/forward header on."""
+    out: List[str] = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if any(p.match(stripped) for p in _QUOTE_HEADERS) and out:
+            break
+        if stripped.startswith(">"):
+            continue
+        out.append(line)
+    return "\n".join(out)
+
+
+def strip_signature(text: str) -> str:
+    lines = text.splitlines()
+    for i, line in enumerate(lines):
+        if i and any(p.match(line.strip()) for p in _SIGNATURE_MARKERS):
+            return "\n".join(lines[:i])
+    return text
+
+
+def normalize_whitespace(text: str) -> str:
+    text = re.sub(r"[ \t\u00a0\u200b]+", " ", text)
+    text = re.sub(r"\s*\n\s*", "\n", text)
+    return re.sub(r"\n{2,}", "\n", text).strip()
+
+
+def truncate_tokens(text: str, budget: int) -> str:
+    limit = budget * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    space = cut.rfind(" ")
+    return (cut[:space] if space > limit // 2 else cut) + "…"
+
+
+def clean_body(text: str) -> str:
+    if looks_like_html(text):
+        text = html_to_text(text)
+    return normalize_whitespace(strip_signature(strip_quoted(text)))
+
+
+# ── Payload ───────────────────────────────────────────────────────────────────
+
+def prepare_email(email: Dict[str, Any], budget: int = EMAIL_TOKEN_BUDGET) -> Dict[str, Any]:
+    """
+    The compact form sent to the model. The snippet is Gmail's prefix of the
+    body, so it is only used when there is no body; thread_id and other
+    metadata are merged back into the model's items afterwards.
+    """
+    body = clean_body(email.get("body_preview") or "") or normalize_whitespace(
+        html.unescape(email.get("snippet") or "")
+    )
+    prepared = {
+        "message_id": email["message_id"],
+        "from": email.get("from") or "",
+        "subject": (email.get("subject") or "")[:SUBJECT_MAX_CHARS],
+        "date": email.get("date") or "",
+        "body": truncate_tokens(body, budget),
+    }
+    if email.get("has_list_unsubscribe"):
+        prepared["list"] = True
+    return prepared
+
+
+def prepare_emails(emails: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """(compact emails, {"tokens_before", "tokens", "tokens_saved"})."""
+    prepared = [prepare_email(e) for e in emails]
+    before = sum(estimate_tokens(e) for e in emails)
+    after = sum(estimate_tokens(e) for e in prepared)
+    return prepared, {"tokens_before": before, "tokens": after, "tokens_saved": max(0, before - after)}
@@ -11,9 +11,9 @@ _scheduler: BackgroundScheduler | None = None
 
 def _run_weekly_triage() -> None:
     try:
-        from app.triage_api import run_triage
-        result = run_triage(max_results=50)
-        logger.info("Weekly triage complete — batch_id=%s", result.get("batch_id"))
+        from app.jobs import enqueue_triage
+        job = enqueue_triage(max_results=50, incremental=True)
+        logger.info("Weekly triage queued — job_id=%s", job["job_id"])
     except Exception as e:
         logger.error("Weekly triage failed: %s", e)
 
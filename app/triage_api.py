@@ -1,14 +1,32 @@
 import os
 import json
 import uuid
-from fastapi import APIRouter
+from typing import Callable, Iterator
 
-from app.inbox import recent_inbox
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+
+from app.inbox import HISTORY_CURSOR_KEY, INBOX_QUERY, fill_email_bodies, iter_inbox, sync_inbox
+from app import clustering, jobs, local_classifier, triage_cache
+from app.cascade import pre_classify
 from app.mock_llm import triage_with_mock
-from app.db import get_conn, now_iso
+from app.db import get_conn, get_sync_value, now_iso, set_sync_value
 
 router = APIRouter()
 
+NO_NEW_MAIL_SUMMARY = "No new mail since the last run."
+
+# progress(state, done, total), called as a run moves through its stages
+ProgressFn = Callable[[str, int, int], None]
+
+
+def _no_progress(state: str, done: int, total: int) -> None:
+    pass
+
+
+def _no_count(n: int) -> None:
+    pass
+
 
 def _mode() -> str:
     return os.getenv("TRIAGE_MODE", "mock").lower()
@@ -16,89 +34,360 @@ def _mode() -> str:
 
 def _normalize_slate(slate):
     if isinstance(slate, dict) and "items" in slate and isinstance(slate["items"], list):
-        return {"items": slate["items"], "batch_summary": slate.get("batch_summary", "")}
+        normalized = {"items": slate["items"], "batch_summary": slate.get("batch_summary", "")}
+        if slate.get("prompt_tokens"):
+            normalized["prompt_tokens"] = slate["prompt_tokens"]
+        return normalized
     if isinstance(slate, list):
         return {"items": slate, "batch_summary": ""}
     return {"items": [], "batch_summary": ""}
 
 
+def _triage_with_cache(emails, advance: Callable[[int], None] = _no_count):
+    """
+    LLM triage that reuses cached classifications (same message, model,
+    prompt version and preferences) and only sends cache misses to the model.
+    advance(n) is called as n more emails get a result.
+    """
+    from app.llm import cache_models, triage_model, triage_with_llm
+
+    model = triage_model()
+    cached = {
+        mid: {**it, "decided_by": "cache", "latency_ms": None}
+        for mid, it in triage_cache.lookup([e["message_id"] for e in emails], cache_models()).items()
+    }
+    misses = [e for e in emails if e["message_id"] not in cached]
+    advance(len(cached))
+
+    fresh = {"items": [], "batch_summary": ""}
+    clusters = clustering.cluster(fill_email_bodies(misses)) if misses else []
+    if clusters:
+        # A representative's chunk finishing settles its whole cluster
+        sizes = {members[0]["message_id"]: len(members) for _, members in clusters}
+        fresh = _normalize_slate(triage_with_llm(
+            [members[0] for _, members in clusters],
+            on_chunk=lambda ids: advance(sum(sizes.get(mid, 1) for mid in ids)),
+        ))
+    reps = {members[0]["message_id"]: (cid, members) for cid, members in clusters}
+    fresh_items = []
+    for it in fresh["items"]:
+        if it.get("message_id") in reps:
+            fresh_items += clustering.expand({**it, "decided_by": "llm"}, *reps.pop(it["message_id"]))
+    triage_cache.store(fresh_items, model)
+
+    by_id = {**cached, **{it["message_id"]: it for it in fresh_items}}
+    items = [by_id[e["message_id"]] for e in emails if e["message_id"] in by_id]
+    summary = fresh["batch_summary"]
+    if len(clusters) < len(misses):
+        summary = f"{summary} {len(misses)} new emails classified as {len(clusters)} distinct kinds.".strip()
+    if cached:
+        summary = f"{summary} {len(cached)} emails reused from earlier runs.".strip()
+    return {"items": items, "batch_summary": summary, "prompt_tokens": fresh.get("prompt_tokens")}
+
+
+def _triage_cascade(emails, progress: ProgressFn = _no_progress):
+    """
+    Rules and heuristics decide what they confidently can; only the rest
+    goes through the cached LLM path. Items keep inbox order and record the
+    deciding stage in decided_by. Reports "classifying" progress per email
+    decided.
+    """
+    decided, remaining = pre_classify(emails)
+    done = len(decided)
+
+    def advance(n: int) -> None:
+        nonlocal done
+        done += n
+        progress("classifying", done, len(emails))
+
+    advance(0)
+    slate = _triage_with_cache(remaining, advance) if remaining else {"items": [], "batch_summary": ""}
+
+    by_id = {it["message_id"]: it for it in decided + slate["items"]}
+    items = [by_id[e["message_id"]] for e in emails if e["message_id"] in by_id]
+    summary = slate["batch_summary"]
+    if decided:
+        summary = f"{summary} {len(decided)} emails decided by rules without the model.".strip()
+    return {"items": items, "batch_summary": summary, "prompt_tokens": slate.get("prompt_tokens")}
+
+
+def _collect_emails(max_results: int, incremental: bool, progress: ProgressFn = _no_progress):
+    """
+    (source_query, emails, history_id) for a run, metadata only (bodies are
+    fetched later for the emails that reach the model). history_id is the
+    new sync cursor for incremental runs, else None.
+    """
+    if incremental:
+        with get_conn() as conn:
+            cursor = get_sync_value(conn, HISTORY_CURSOR_KEY)
+        inbox = sync_inbox(cursor, max_results=max_results, include_body=False)
+        source_query, items, history_id = inbox["query"], inbox["items"], inbox["history_id"]
+        total = len(items)
+    else:
+        source_query, history_id = INBOX_QUERY, None
+        items = iter_inbox(max_results=max_results, include_body=False)
+        total = max_results  # streamed, so only the upper bound is known up front
+
+    emails = []
+    for it in items:
+        emails.append(email_from_item(it))
+        progress("fetching", len(emails), total)
+    return source_query, emails, history_id
+
+
+def email_from_item(it):
+    """The email dict the triage pipeline works on, from a parsed inbox item."""
+    return {
+        "message_id": it["id"],
+        "thread_id": it["threadId"],
+        "from": it.get("from") or "",
+        "subject": it.get("subject") or "",
+        "date": it.get("date") or "",
+        "snippet": it.get("snippet") or "",
+        "has_list_unsubscribe": it.get("has_list_unsubscribe", False),
+        "body_preview": it.get("body_preview") or "",
+    }
+
+
+def _create_batch(conn, mode: str, max_results: int) -> str:
+    batch_id = str(uuid.uuid4())
+    conn.execute(
+        "INSERT INTO batches (batch_id, created_at, mode, max_results) VALUES (?, ?, ?, ?)",
+        (batch_id, now_iso(), mode, max_results),
+    )
+    return batch_id
+
+
+def _record_prompt_tokens(conn, batch_id: str, prompt_tokens) -> None:
+    if prompt_tokens:
+        conn.execute(
+            "UPDATE batches SET prompt_tokens=?, prompt_tokens_saved=? WHERE batch_id=?",
+            (prompt_tokens["tokens"], prompt_tokens["tokens_saved"], batch_id),
+        )
+
+
+def _insert_item(conn, batch_id: str, item: dict) -> None:
+    msg_id = item.get("message_id") or item.get("id")
+    if not msg_id:
+        return
+
+    suggested_labels = item.get("suggested_labels")
+    task_suggestion = item.get("task_suggestion")
+    draft_reply = item.get("draft_reply")
+
+    category = (item.get("category") or "").upper()
+    conn.execute(
+        """
+        INSERT OR IGNORE INTO triage_items (
+            batch_id, message_id, thread_id, sender, subject, date, snippet,
+            category, original_category, confidence, reason, suggested_labels_json,
+            draft_reply, task_suggestion_json, decided_by, cluster_id, route, latency_ms,
+            approved, edited_draft_body, applied, applied_at
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0, NULL, 0, NULL)
+        """,
+        (
+            batch_id,
+            msg_id,
+            item.get("thread_id"),
+            item.get("from") or item.get("sender") or "",
+            item.get("subject") or "",
+            item.get("date") or "",
+            item.get("snippet") or "",
+            category,
+            category,  # original_category — never updated after this
+            float(item.get("confidence")) if item.get("confidence") is not None else None,
+            item.get("reason"),
+            json.dumps(suggested_labels) if suggested_labels is not None else None,
+            json.dumps(draft_reply) if draft_reply is not None else None,
+            json.dumps(task_suggestion) if task_suggestion is not None else None,
+            item.get("decided_by"),
+            item.get("cluster_id"),
+            item.get("route"),
+            item.get("latency_ms"),
+        ),
+    )
+
+
 @router.get("/triage/run")
-def run_triage(max_results: int = 20):
-    inbox = recent_inbox(max_results=max_results)
-
-    emails = [
-        {
-            "message_id": it["id"],
-            "thread_id": it["threadId"],
-            "from": it.get("from") or "",
-            "subject": it.get("subject") or "",
-            "date": it.get("date") or "",
-            "snippet": it.get("snippet") or "",
-            "has_list_unsubscribe": it.get("has_list_unsubscribe", False),
-            "body_preview": it.get("body_preview") or "",
-        }
-        for it in inbox["items"]
-    ]
+def run_triage(max_results: int = 20, incremental: bool = False):
+    """
+    Triage the inbox and persist the result as a new batch.
+    With incremental=True only mail that arrived since the last incremental
+    run is processed (Gmail history cursor stored in sync_state).
+    """
+    return execute_triage(max_results, incremental)
+
 
+def execute_triage(max_results: int = 20, incremental: bool = False, progress: ProgressFn = _no_progress):
+    """
+    run_triage, reporting progress(state, done, total) as it goes: state is
+    "fetching", "classifying" or "persisting" (see app.jobs).
+    """
     mode = _mode()
+    source_query, emails, history_id = _collect_emails(max_results, incremental, progress)
+
+    if incremental and not emails:
+        with get_conn() as conn:
+            set_sync_value(conn, HISTORY_CURSOR_KEY, history_id)
+        return {
+            "source_query": source_query,
+            "slate": {"items": [], "batch_summary": NO_NEW_MAIL_SUMMARY},
+            "mode": mode,
+            "batch_id": None,
+        }
+
+    progress("classifying", 0, len(emails))
     if mode in ("llm", "gemini", "claude"):
-        from app.llm import triage_with_llm
-        raw_slate = triage_with_llm(emails)
+        raw_slate = _triage_cascade(emails, progress)
+    elif mode == "local":
+        raw_slate = local_classifier.triage_with_local(emails)
     else:
         raw_slate = triage_with_mock(emails)
         mode = "mock"
 
     slate = _normalize_slate(raw_slate)
+    progress("classifying", len(emails), len(emails))
 
-    batch_id = str(uuid.uuid4())
-    created_at = now_iso()
-
+    # Reported around the transaction, not inside it: progress is written
+    # through its own connection, which would wait on this one's write lock
+    progress("persisting", 0, len(slate["items"]))
     with get_conn() as conn:
-        conn.execute(
-            "INSERT INTO batches (batch_id, created_at, mode, max_results) VALUES (?, ?, ?, ?)",
-            (batch_id, created_at, mode, max_results),
-        )
-
+        batch_id = _create_batch(conn, mode, max_results)
         for item in slate["items"]:
-            msg_id = item.get("message_id") or item.get("id")
-            if not msg_id:
-                continue
-
-            suggested_labels = item.get("suggested_labels")
-            task_suggestion = item.get("task_suggestion")
-            draft_reply = item.get("draft_reply")
-
-            category = (item.get("category") or "").upper()
-            conn.execute(
-                """
-                INSERT OR IGNORE INTO triage_items (
-                    batch_id, message_id, thread_id, sender, subject, date, snippet,
-                    category, original_category, confidence, reason, suggested_labels_json,
-                    draft_reply, task_suggestion_json, approved, edited_draft_body, applied, applied_at
-                )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0, NULL, 0, NULL)
-                """,
-                (
-                    batch_id,
-                    msg_id,
-                    item.get("thread_id"),
-                    item.get("from") or item.get("sender") or "",
-                    item.get("subject") or "",
-                    item.get("date") or "",
-                    item.get("snippet") or "",
-                    category,
-                    category,  # original_category — never updated after this
-                    float(item.get("confidence")) if item.get("confidence") is not None else None,
-                    item.get("reason"),
-                    json.dumps(suggested_labels) if suggested_labels is not None else None,
-                    json.dumps(draft_reply) if draft_reply is not None else None,
-                    json.dumps(task_suggestion) if task_suggestion is not None else None,
-                ),
-            )
+            _insert_item(conn, batch_id, item)
+        _record_prompt_tokens(conn, batch_id, slate.get("prompt_tokens"))
+
+        if incremental:
+            set_sync_value(conn, HISTORY_CURSOR_KEY, history_id)
+    progress("persisting", len(slate["items"]), len(slate["items"]))
 
     return {
-        "source_query": inbox.get("query"),
+        "source_query": source_query,
         "slate": slate,
         "mode": mode,
         "batch_id": batch_id,
     }
+
+
+def stream_triage_run(max_results: int = 20, incremental: bool = False) -> Iterator[dict]:
+    """
+    Streaming variant of run_triage. Yields {"batch_id", "mode"} first, then
+    {"item": ...} for each email as soon as its classification is known
+    (already persisted to triage_items), then {"done": True, "batch_summary"}.
+    An incremental run with no new mail creates no batch (batch_id is None).
+    """
+    mode = _mode()
+    llm_mode = mode in ("llm", "gemini", "claude")
+    _, emails, history_id = _collect_emails(max_results, incremental)
+    if not llm_mode and mode != "local":
+        mode = "mock"
+
+    if incremental and not emails:
+        # Same as execute_triage: advance the cursor, but no empty batch
+        with get_conn() as conn:
+            set_sync_value(conn, HISTORY_CURSOR_KEY, history_id)
+        yield {"batch_id": None, "mode": mode}
+        yield {"done": True, "batch_summary": NO_NEW_MAIL_SUMMARY}
+        return
+
+    with get_conn() as conn:
+        batch_id = _create_batch(conn, mode, max_results)
+    yield {"batch_id": batch_id, "mode": mode}
+
+    def _persist(item: dict) -> dict:
+        with get_conn() as conn:
+            _insert_item(conn, batch_id, item)
+        return {"item": item}
+
+    summary = ""
+    if not llm_mode:
+        slate = local_classifier.triage_with_local(emails) if mode == "local" else triage_with_mock(emails)
+        for item in slate["items"]:
+            yield _persist(item)
+        summary = slate["batch_summary"]
+    else:
+        from app.llm import cache_models, stream_triage, triage_model
+
+        decided, remaining = pre_classify(emails)
+        for item in decided:
+            yield _persist(item)
+
+        model = triage_model()
+        cached = triage_cache.lookup([e["message_id"] for e in remaining], cache_models())
+        for e in remaining:
+            if e["message_id"] in cached:
+                yield _persist({**cached[e["message_id"]], "decided_by": "cache", "latency_ms": None})
+
+        misses = [e for e in remaining if e["message_id"] not in cached]
+        clusters = clustering.cluster(fill_email_bodies(misses)) if misses else []
+        reps = {members[0]["message_id"]: (cid, members) for cid, members in clusters}
+        if clusters:
+            for kind, payload in stream_triage([members[0] for _, members in clusters]):
+                if kind == "summary":
+                    summary = payload
+                elif kind == "prompt_tokens":
+                    with get_conn() as conn:
+                        _record_prompt_tokens(conn, batch_id, payload)
+                elif payload.get("message_id") in reps:
+                    items = clustering.expand({**payload, "decided_by": "llm"}, *reps.pop(payload["message_id"]))
+                    triage_cache.store(items, model)
+                    for item in items:
+                        yield _persist(item)
+        if len(clusters) < len(misses):
+            summary = f"{summary} {len(misses)} new emails classified as {len(clusters)} distinct kinds.".strip()
+        if cached:
+            summary = f"{summary} {len(cached)} emails reused from earlier runs.".strip()
+        if decided:
+            summary = f"{summary} {len(decided)} emails decided by rules without the model.".strip()
+
+    if incremental:
+        with get_conn() as conn:
+            set_sync_value(conn, HISTORY_CURSOR_KEY, history_id)
+    yield {"done": True, "batch_summary": summary}
+
+
+@router.get("/triage/stream")
+def triage_stream(max_results: int = 20, incremental: bool = False):
+    """NDJSON stream of stream_triage_run events."""
+    lines = (json.dumps(event) + "\n" for event in stream_triage_run(max_results, incremental))
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+
+@router.get("/triage/cache/stats")
+def triage_cache_stats():
+    return triage_cache.cache_stats()
+
+
+@router.post("/triage/jobs")
+def start_triage_job(max_results: int = 20, incremental: bool = False):
+    """Queue a background run, or return the identical run already in progress."""
+    job = jobs.enqueue_triage(max_results=max_results, incremental=incremental)
+    return {k: v for k, v in job.items() if k != "result"}
+
+
+@router.get("/triage/jobs/{job_id}")
+def triage_job_status(job_id: str):
+    job = jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job
+
+
+@router.get("/triage/llm/health")
+def llm_health():
+    """Per-provider call counts, retries, hedges, failovers, circuit state and p95."""
+    from app import llm_dispatch
+
+    return llm_dispatch.provider_health()
+
+
+@router.get("/triage/local/stats")
+def local_model_stats():
+    return local_classifier.model_stats()
+
+
+@router.post("/triage/local/train")
+def local_model_train():
+    """Fold newly approved decisions into the local classifier."""
+    return local_classifier.train()
@@ -0,0 +1,117 @@
+# app/triage_cache.py
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from typing import Any, Dict, Iterable, List, Sequence
+
+from app.db import get_conn, now_iso
+from app.llm import PROMPT_VERSION, TRIAGE_PREFERENCES
+
+# Model classifications (category, reason, draft reply, ...) keyed by
+# (message_id, model, prompt version, preferences hash): the same email
+# triaged by the same model under the same prompt gets the same answer.
+# The model is the one that produced the item (the strong model for
+# escalated items), so changing either model invalidates its own entries.
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def _prefs_hash() -> str:
+    raw = json.dumps(TRIAGE_PREFERENCES, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()[:16]
+
+
+def lookup(message_ids: List[str], models: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Cached items produced by any of models under this prompt (the newest
+    if several); ids without an entry are absent.
+    """
+    if not message_ids:
+        return {}
+    models = [models] if isinstance(models, str) else list(models)
+    prefs = _prefs_hash()
+    out: Dict[str, Dict[str, Any]] = {}
+    with get_conn() as conn:
+        for start in range(0, len(message_ids), 500):
+            chunk = message_ids[start:start + 500]
+            rows = conn.execute(
+                f"""
+                SELECT message_id, model, result_json FROM triage_cache
+                WHERE model IN ({','.join('?' * len(models))}) AND prompt_version=? AND prefs_hash=?
+                  AND message_id IN ({','.join('?' * len(chunk))})
+                ORDER BY created_at
+                """,
+                (*models, PROMPT_VERSION, prefs, *chunk),
+            ).fetchall()
+            for r in rows:
+                item = json.loads(r["result_json"])
+                # Entries written before items recorded their model stored
+                # escalated results under the fast model; they cannot be trusted
+                if item.get("route") == "strong" and item.get("model") != r["model"]:
+                    continue
+                out[r["message_id"]] = item
+
+    with _lock:
+        _stats["hits"] += len(out)
+        _stats["misses"] += len(set(message_ids)) - len(out)
+    return out
+
+
+def store(items: Iterable[Dict[str, Any]], model: str) -> None:
+    """Cache items under the model that produced each one (model if unknown)."""
+    prefs = _prefs_hash()
+    ts = now_iso()
+    rows = [
+        (it["message_id"], it.get("model") or model, PROMPT_VERSION, prefs, json.dumps(it), ts)
+        for it in items
+        if it.get("message_id")
+    ]
+    if not rows:
+        return
+    with get_conn() as conn:
+        conn.executemany(
+            """
+            INSERT OR REPLACE INTO triage_cache
+                (message_id, model, prompt_version, prefs_hash, result_json, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            rows,
+        )
+
+
+def store_draft(message_id: str, draft: Dict[str, Any]) -> None:
+    """Attach a lazily generated draft to the message's cached items."""
+    prefs = _prefs_hash()
+    with get_conn() as conn:
+        rows = conn.execute(
+            """
+            SELECT model, result_json FROM triage_cache
+            WHERE message_id=? AND prompt_version=? AND prefs_hash=?
+            """,
+            (message_id, PROMPT_VERSION, prefs),
+        ).fetchall()
+        conn.executemany(
+            """
+            UPDATE triage_cache SET result_json=?
+            WHERE message_id=? AND model=? AND prompt_version=? AND prefs_hash=?
+            """,
+            [
+                (json.dumps({**json.loads(r["result_json"]), "draft_reply": draft}),
+                 message_id, r["model"], PROMPT_VERSION, prefs)
+                for r in rows
+            ],
+        )
+
+
+def cache_stats() -> Dict[str, Any]:
+    with _lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else None
+    with get_conn() as conn:
+        stats["size"] = conn.execute("SELECT COUNT(*) FROM triage_cache").fetchone()[0]
+    stats["prompt_version"] = PROMPT_VERSION
+    return stats
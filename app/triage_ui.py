@@ -1,15 +1,20 @@
+import asyncio
 import json
 import html as _html
 from datetime import datetime
 
 from fastapi import APIRouter, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 
-from app.triage_api import run_triage
+from app import jobs, local_classifier, triage_cache
+from app.llm import draft_reply
 from app.gmail_client import get_gmail_service
-from app.gmail_actions import ensure_triage_labels, apply_triage_action, send_reply, create_draft
-from app.inbox import recent_inbox
+from app.gmail_actions import (
+    TRIAGE_LABELS, apply_triage_actions_bulk, build_message_body, ensure_triage_labels,
+)
+from app.gmail_async import get_async_gmail
+from app.inbox import fill_email_bodies, recent_inbox_async
 from app.db import get_conn, require_latest_batch_id, now_iso
 
 router = APIRouter()
@@ -20,16 +25,45 @@ templates = Jinja2Templates(directory="app/templates")
 
 @router.get("/triage/ui", response_class=HTMLResponse)
 def triage_ui(request: Request, max_results: int = 20):
-    data = run_triage(max_results=max_results)
-    return templates.TemplateResponse(
-        "slate.html",
-        {
-            "request": request,
-            "slate": data["slate"],
-            "mode": data.get("mode", "mock"),
-            "batch_id": data.get("batch_id"),
-        },
-    )
+    """
+    Show the running triage job or one that finished in the last
+    TRIAGE_JOB_REUSE_SECONDS; only when there is neither is a run queued.
+    Running jobs are polled via /triage/jobs/{job_id}/poll until the slate
+    is ready.
+    """
+    job = jobs.current_triage(max_results=max_results) or jobs.enqueue_triage(max_results=max_results)
+    return templates.TemplateResponse("slate.html", _job_context(request, job))
+
+
+@router.post("/triage/ui")
+def start_triage_ui(max_results: int = 20):
+    """Queue a fresh triage run (Refresh / New Triage), then show it."""
+    jobs.enqueue_triage(max_results=max_results)
+    return RedirectResponse(f"/triage/ui?max_results={max_results}", status_code=303)
+
+
+def _job_context(request: Request, job: dict) -> dict:
+    """Template context for a job: its progress, plus the slate once it is done."""
+    if job["state"] != jobs.DONE:
+        return {"request": request, "job": job}
+    data = job["result"]
+    return {
+        "request": request,
+        "job": job,
+        "slate": data["slate"],
+        "mode": data.get("mode", "mock"),
+        "batch_id": data.get("batch_id"),
+    }
+
+
+@router.get("/triage/jobs/{job_id}/poll", response_class=HTMLResponse)
+def poll_triage_job(request: Request, job_id: str):
+    """Progress fragment while the job runs; the slate itself once it is done."""
+    job = jobs.get_job(job_id)
+    if job is None:
+        return HTMLResponse("<h3>Unknown job. Reload /triage/ui to start a new run.</h3>", status_code=404)
+    template = "slate_body.html" if job["state"] == jobs.DONE else "job_status.html"
+    return templates.TemplateResponse(template, _job_context(request, job))
 
 
 # ── Approve ───────────────────────────────────────────────────────────────────
@@ -59,6 +93,11 @@ async def triage_approve(request: Request):
                 (edited, category, batch_id, mid),
             )
 
+    # Incremental: only rows approved or re-categorized since the last run are
+    # folded into the model, and only when triage actually uses it
+    if ids and local_classifier.in_use():
+        await asyncio.to_thread(local_classifier.train)
+
     return templates.TemplateResponse(
         "approved.html",
         {
@@ -104,84 +143,88 @@ def view_approvals(request: Request, batch_id: str | None = None):
 
 # ── Apply to Gmail ────────────────────────────────────────────────────────────
 
-@router.post("/triage/apply", response_class=HTMLResponse)
-async def apply_approved_actions(request: Request):
-    form = await request.form()
-    batch_id = form.get("batch_id")
-
-    service = get_gmail_service()
-    label_ids_by_name = ensure_triage_labels(service)
-
-    applied, skipped, errors = [], [], []
-
+def apply_approved(batch_id: str | None = None) -> dict:
+    """
+    Apply every approved, not-yet-applied item of a batch to Gmail with bulk
+    batchModify calls, then record applied flags and apply_log rows in one
+    transaction. The Gmail calls run outside any open SQLite transaction.
+    """
     with get_conn() as conn:
         if not batch_id:
             batch_id = require_latest_batch_id(conn)
 
         rows = conn.execute(
             """
-            SELECT message_id, category, edited_draft_body
+            SELECT message_id, category
             FROM triage_items
             WHERE batch_id=? AND approved=1 AND applied=0
             """,
             (batch_id,),
         ).fetchall()
 
-        for r in rows:
-            msg_id = r["message_id"]
-            category = (r["category"] or "ARCHIVE").upper()
-            try:
-                apply_triage_action(
-                    service=service,
-                    message_id=msg_id,
-                    category=category,
-                    label_ids_by_name=label_ids_by_name,
-                    archive=True,
-                )
-                conn.execute(
-                    "UPDATE triage_items SET applied=1, applied_at=? WHERE batch_id=? AND message_id=?",
-                    (now_iso(), batch_id, msg_id),
-                )
-                label_name = {"ARCHIVE": "Triage/Done", "READ_LATER": "Triage/ReadLater"}.get(
-                    category, "Triage/Now"
-                )
-                conn.execute(
-                    """
-                    INSERT INTO apply_log (batch_id, message_id, category, labels_added_json, removed_inbox, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                    """,
-                    (
-                        batch_id, msg_id, category,
-                        json.dumps([label_name]),
-                        1 if category in ("ARCHIVE", "READ_LATER") else 0,
-                        now_iso(),
-                    ),
+    if not rows:
+        return {
+            "batch_id": batch_id,
+            "applied": [],
+            "skipped": [{"batch_id": batch_id, "reason": "no_approved_unapplied_items"}],
+            "errors": [],
+        }
+
+    categories = {r["message_id"]: (r["category"] or "ARCHIVE").upper() for r in rows}
+
+    service = get_gmail_service()
+    label_ids_by_name = ensure_triage_labels(service)
+    applied_ids, errors = apply_triage_actions_bulk(
+        service, categories.items(), label_ids_by_name, archive=True
+    )
+
+    ts = now_iso()
+    with get_conn() as conn:
+        conn.executemany(
+            "UPDATE triage_items SET applied=1, applied_at=? WHERE batch_id=? AND message_id=?",
+            [(ts, batch_id, mid) for mid in applied_ids],
+        )
+        conn.executemany(
+            """
+            INSERT INTO apply_log (batch_id, message_id, category, labels_added_json, removed_inbox, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (
+                    batch_id, mid, categories[mid],
+                    json.dumps([TRIAGE_LABELS.get(categories[mid], "Triage/Now")]),
+                    1 if categories[mid] in ("ARCHIVE", "READ_LATER") else 0,
+                    ts,
                 )
-                applied.append({"message_id": msg_id, "category": category})
-            except Exception as e:
-                errors.append({"message_id": msg_id, "error": str(e)})
+                for mid in applied_ids
+            ],
+        )
+
+    return {
+        "batch_id": batch_id,
+        "applied": [{"message_id": mid, "category": categories[mid]} for mid in applied_ids],
+        "skipped": [],
+        "errors": errors,
+    }
 
-        if not rows:
-            skipped.append({"batch_id": batch_id, "reason": "no_approved_unapplied_items"})
+
+@router.post("/triage/apply", response_class=HTMLResponse)
+async def apply_approved_actions(request: Request):
+    form = await request.form()
+    result = await asyncio.to_thread(apply_approved, form.get("batch_id"))
 
     return templates.TemplateResponse(
         "applied.html",
-        {
-            "request": request,
-            "batch_id": batch_id,
-            "applied": applied,
-            "skipped": skipped,
-            "errors": errors,
-        },
+        {"request": request, **result},
     )
 
 
 # ── Inbox Summary (HTMX fragment) ─────────────────────────────────────────────
 
 @router.get("/triage/summary", response_class=HTMLResponse)
-def get_summary(max_results: int = 20):
+async def get_summary(max_results: int = 20):
     try:
-        inbox = recent_inbox(max_results=max_results)
+        inbox = await recent_inbox_async(max_results=max_results, include_body=False)
         emails = [
             {
                 "from": it.get("from") or "",
@@ -192,8 +235,8 @@ def get_summary(max_results: int = 20):
             for it in inbox["items"]
         ]
 
-        from app.llm import summarize_inbox
-        summary = summarize_inbox(emails)
+        from app.llm import asummarize_inbox
+        summary = await asummarize_inbox(emails)
 
         headline = _html.escape(summary.get("headline", ""))
         actions_html = "".join(
@@ -228,6 +271,69 @@ def get_summary(max_results: int = 20):
         )
 
 
+# ── Lazy draft (HTMX fragment) ────────────────────────────────────────────────
+
+def _draft_error(message_id: str, message: str) -> HTMLResponse:
+    # The request targets the <details> so a draft replaces it; an error goes
+    # into its slot instead, leaving the element in place to retry on reopen
+    return HTMLResponse(
+        f'<span class="status status--error">{_html.escape(message)} — reopen to retry</span>',
+        headers={"HX-Retarget": f"#draft-slot-{message_id}", "HX-Reswap": "innerHTML"},
+    )
+
+
+@router.post("/triage/draft", response_class=HTMLResponse)
+async def generate_draft(request: Request):
+    """
+    Draft a reply for one triage item when its card is expanded. The result
+    is stored in triage_items.draft_reply and the triage cache, so each email
+    is drafted once.
+    """
+    form = await request.form()
+    message_id = form.get("message_id", "")
+    batch_id = form.get("batch_id", "")
+
+    with get_conn() as conn:
+        row = conn.execute(
+            """
+            SELECT message_id, thread_id, sender, subject, date, snippet, draft_reply
+            FROM triage_items WHERE batch_id=? AND message_id=?
+            """,
+            (batch_id, message_id),
+        ).fetchone()
+    if not row:
+        return _draft_error(message_id, "Email not found in DB")
+
+    if row["draft_reply"]:
+        draft = json.loads(row["draft_reply"])
+    else:
+        email = {
+            "message_id": row["message_id"],
+            "thread_id": row["thread_id"],
+            "from": row["sender"],
+            "subject": row["subject"],
+            "date": row["date"],
+            "snippet": row["snippet"],
+        }
+        try:
+            await asyncio.to_thread(fill_email_bodies, [email])
+            draft = await asyncio.to_thread(draft_reply, email)
+        except Exception as e:
+            return _draft_error(message_id, f"Could not draft a reply: {e}")
+        with get_conn() as conn:
+            conn.execute(
+                "UPDATE triage_items SET draft_reply=? WHERE batch_id=? AND message_id=?",
+                (json.dumps(draft), batch_id, message_id),
+            )
+        # Later batches that reuse this classification reuse the draft too
+        await asyncio.to_thread(triage_cache.store_draft, message_id, draft)
+
+    return templates.TemplateResponse(
+        "draft_section.html",
+        {"request": request, "item": {"draft_reply": draft}, "mid": message_id, "batch_id": batch_id},
+    )
+
+
 # ── Send Now (HTMX fragment) ──────────────────────────────────────────────────
 
 @router.post("/triage/send-now", response_class=HTMLResponse)
@@ -254,8 +360,9 @@ async def send_now(request: Request):
         if not subject.lower().startswith("re:"):
             subject = f"Re: {subject}"
 
-        service = get_gmail_service()
-        send_reply(service, to=row["sender"], subject=subject, body=body, thread_id=row["thread_id"])
+        await get_async_gmail().send_message(
+            build_message_body(row["sender"], subject, body, row["thread_id"])
+        )
         return HTMLResponse('<span class="status status--success">✓ Sent</span>')
     except Exception as e:
         return HTMLResponse(f'<span class="status status--error">Error: {_html.escape(str(e))}</span>')
@@ -287,8 +394,9 @@ async def save_as_draft(request: Request):
         if not subject.lower().startswith("re:"):
             subject = f"Re: {subject}"
 
-        service = get_gmail_service()
-        create_draft(service, to=row["sender"], subject=subject, body=body, thread_id=row["thread_id"])
+        await get_async_gmail().create_draft(
+            build_message_body(row["sender"], subject, body, row["thread_id"])
+        )
         return HTMLResponse('<span class="status status--success">✓ Saved to Drafts</span>')
     except Exception as e:
         return HTMLResponse(f'<span class="status status--error">Error: {_html.escape(str(e))}</span>')
@@ -0,0 +1,287 @@
+"""
+End-to-end benchmark of a triage run against the offline fakes:
+
+    recent_inbox -> triage_with_llm / triage_with_mock -> SQLite insert -> apply_approved
+
+    python -m bench.triage_pipeline                      # 20, 200, 2000, 20000 messages
+    python -m bench.triage_pipeline --sizes 20,200 --classifier mock
+    python -m bench.triage_pipeline --compare bench/results/triage_pipeline-<commit>.json
+
+Each size runs in a fresh subprocess (own SQLite file, caches and peak RSS)
+with GMAIL_BACKEND=fake and LLM_BACKEND=fake forced, so nothing touches a
+real mailbox. Latency and fault injection come from the FAKE_* env vars or
+the flags below. Results are written as JSON named after the current commit
+so two commits can be diffed with --compare.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+DEFAULT_SIZES = [20, 200, 2000, 20000]
+STAGES = ["fetch", "classify", "persist", "apply"]
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# ── Instrumentation ───────────────────────────────────────────────────────────
+
+class _Clock:
+    db_seconds = 0.0
+
+
+class _TimedConnection(sqlite3.Connection):
+    """sqlite3 connection that adds time spent in execute/commit to _Clock."""
+
+    def execute(self, *args: Any, **kwargs: Any) -> sqlite3.Cursor:
+        started = time.perf_counter()
+        try:
+            return super().execute(*args, **kwargs)
+        finally:
+            _Clock.db_seconds += time.perf_counter() - started
+
+    def executemany(self, *args: Any, **kwargs: Any) -> sqlite3.Cursor:
+        started = time.perf_counter()
+        try:
+            return super().executemany(*args, **kwargs)
+        finally:
+            _Clock.db_seconds += time.perf_counter() - started
+
+    def commit(self) -> None:
+        started = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            _Clock.db_seconds += time.perf_counter() - started
+
+
+def _install_db_timer() -> None:
+    connect = sqlite3.connect
+
+    def _connect(*args: Any, **kwargs: Any) -> sqlite3.Connection:
+        kwargs.setdefault("factory", _TimedConnection)
+        return connect(*args, **kwargs)
+
+    sqlite3.connect = _connect
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# ── One size (child process) ──────────────────────────────────────────────────
+
+def _run_size(size: int, classifier: str) -> Dict[str, Any]:
+    from app import fake_gmail, fake_llm
+    from app.db import get_conn, init_db
+    from app.inbox import recent_inbox
+    from app.llm import triage_with_llm
+    from app.mock_llm import triage_with_mock
+    from app.triage_api import (
+        _create_batch, _insert_item, _normalize_slate, _record_prompt_tokens,
+        _triage_cascade, email_from_item,
+    )
+    from app.triage_ui import apply_approved
+
+    init_db()
+    mailbox = fake_gmail.configure(messages=size)
+    stages: Dict[str, Dict[str, Any]] = {}
+
+    @contextmanager
+    def _stage(name: str) -> Iterator[Dict[str, Any]]:
+        gmail_before = mailbox.stats()
+        llm_before = fake_llm.stats()
+        db_before = _Clock.db_seconds
+        started = time.perf_counter()
+        extra: Dict[str, Any] = {}
+        yield extra
+        gmail_after = mailbox.stats()
+        llm_after = fake_llm.stats()
+        stages[name] = {
+            "seconds": round(time.perf_counter() - started, 4),
+            "db_seconds": round(_Clock.db_seconds - db_before, 4),
+            "gmail_calls": gmail_after["total_calls"] - gmail_before["total_calls"],
+            "gmail_round_trips": gmail_after["round_trips"] - gmail_before["round_trips"],
+            "llm_calls": llm_after["calls"] - llm_before["calls"],
+            "tokens_sent": llm_after["tokens_in"] - llm_before["tokens_in"],
+            "tokens_received": llm_after["tokens_out"] - llm_before["tokens_out"],
+            **extra,
+        }
+
+    with _stage("fetch") as extra:
+        inbox = recent_inbox(max_results=size)
+        emails = [email_from_item(it) for it in inbox["items"]]
+        extra["messages"] = len(emails)
+
+    with _stage("classify") as extra:
+        if classifier == "mock":
+            raw = triage_with_mock(emails)
+        elif classifier == "cascade":
+            raw = _triage_cascade(emails)
+        else:
+            raw = triage_with_llm(emails)
+        slate = _normalize_slate(raw)
+        extra["items"] = len(slate["items"])
+        extra["prompt_tokens"] = (slate.get("prompt_tokens") or {}).get("tokens", 0)
+
+    with _stage("persist") as extra:
+        with get_conn() as conn:
+            batch_id = _create_batch(conn, classifier, size)
+            for item in slate["items"]:
+                _insert_item(conn, batch_id, item)
+            _record_prompt_tokens(conn, batch_id, slate.get("prompt_tokens"))
+            # Approve everything so the apply stage has the full batch to work on
+            conn.execute("UPDATE triage_items SET approved=1 WHERE batch_id=?", (batch_id,))
+        extra["rows"] = len(slate["items"])
+
+    with _stage("apply") as extra:
+        result = apply_approved(batch_id)
+        extra["applied"] = len(result["applied"])
+        extra["errors"] = len(result["errors"])
+
+    totals = {
+        key: round(sum(s[key] for s in stages.values()), 4)
+        for key in ("seconds", "db_seconds", "gmail_calls", "gmail_round_trips", "llm_calls", "tokens_sent")
+    }
+    return {"size": size, "stages": stages, "totals": totals, "peak_rss_mb": _peak_rss_mb()}
+
+
+def _child(args: argparse.Namespace) -> None:
+    # Must happen before any app import: configuration is read at import time
+    workdir = tempfile.mkdtemp(prefix="triage-bench-")
+    os.environ.update({
+        "GMAIL_BACKEND": "fake",
+        "LLM_BACKEND": "fake",
+        "DB_PATH": os.path.join(workdir, "app.db"),
+        "LOCAL_MODEL_PATH": os.path.join(workdir, "local_model.json"),
+        "TRIAGE_MODE": "gemini" if args.classifier != "mock" else "mock",
+    })
+    os.environ.setdefault("FAKE_LLM_RECORDINGS", os.path.join(workdir, "llm_recordings.jsonl"))
+    if args.no_quota:
+        os.environ["GMAIL_QUOTA_UNITS_PER_SEC"] = "1000000000"
+    sys.path.insert(0, REPO_ROOT)
+    _install_db_timer()
+    json.dump(_run_size(args.child, args.classifier), sys.stdout)
+
+
+# ── Driver ────────────────────────────────────────────────────────────────────
+
+def _git(*cmd: str) -> str:
+    try:
+        return subprocess.run(
+            ["git", *cmd], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def _spawn(size: int, args: argparse.Namespace) -> Dict[str, Any]:
+    cmd = [sys.executable, "-m", "bench.triage_pipeline", "--child", str(size), "--classifier", args.classifier]
+    if args.no_quota:
+        cmd.append("--no-quota")
+    env = dict(os.environ)
+    for flag, var in (
+        ("gmail_latency_ms", "FAKE_GMAIL_LATENCY_MS"),
+        ("llm_latency_ms", "FAKE_LLM_LATENCY_MS"),
+        ("llm_error_rate", "FAKE_LLM_ERROR_RATE"),
+    ):
+        if getattr(args, flag) is not None:
+            env[var] = str(getattr(args, flag))
+    proc = subprocess.run(cmd, cwd=REPO_ROOT, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"size {size} failed:\n{proc.stderr[-4000:]}")
+    return json.loads(proc.stdout)
+
+
+def _print_run(run: Dict[str, Any]) -> None:
+    print(f"\n{run['size']} messages — {run['totals']['seconds']:.2f}s, peak RSS {run['peak_rss_mb']} MB")
+    print(f"  {'stage':<9}{'seconds':>10}{'db s':>9}{'gmail':>8}{'trips':>7}{'llm':>6}{'tokens':>9}")
+    for name in STAGES:
+        s = run["stages"][name]
+        print(
+            f"  {name:<9}{s['seconds']:>10.3f}{s['db_seconds']:>9.3f}{s['gmail_calls']:>8}"
+            f"{s['gmail_round_trips']:>7}{s['llm_calls']:>6}{s['tokens_sent']:>9}"
+        )
+
+
+def _compare(old: Dict[str, Any], new: Dict[str, Any]) -> None:
+    """Stage wall times of new vs an earlier results file, per size."""
+    print(f"\nvs {old.get('commit') or '?'}:")
+    before = {r["size"]: r for r in old.get("runs", [])}
+    for run in new["runs"]:
+        prev = before.get(run["size"])
+        if not prev:
+            continue
+        cells = []
+        for name in STAGES + ["total"]:
+            a = prev["totals"]["seconds"] if name == "total" else prev["stages"][name]["seconds"]
+            b = run["totals"]["seconds"] if name == "total" else run["stages"][name]["seconds"]
+            change = f"{(b - a) / a * 100:+.0f}%" if a else "n/a"
+            cells.append(f"{name} {change}")
+        rss = run["peak_rss_mb"] - prev["peak_rss_mb"]
+        print(f"  {run['size']:>6}: " + ", ".join(cells) + f", RSS {rss:+.1f} MB")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="comma-separated inbox sizes")
+    parser.add_argument("--classifier", choices=["llm", "mock", "cascade"], default="llm",
+                        help="triage_with_llm, triage_with_mock, or the full rules/cache/cluster cascade")
+    parser.add_argument("--gmail-latency-ms", type=float, help="FAKE_GMAIL_LATENCY_MS for the run")
+    parser.add_argument("--llm-latency-ms", type=float, help="FAKE_LLM_LATENCY_MS for the run")
+    parser.add_argument("--llm-error-rate", type=float, help="FAKE_LLM_ERROR_RATE for the run")
+    parser.add_argument("--no-quota", action="store_true", help="lift the Gmail quota token bucket")
+    parser.add_argument("--output", help="results file (default bench/results/triage_pipeline-<commit>.json)")
+    parser.add_argument("--compare", help="earlier results file to diff against")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child is not None:
+        _child(args)
+        return
+
+    commit = _git("rev-parse", "--short", "HEAD")
+    results = {
+        "benchmark": "triage_pipeline",
+        "commit": commit,
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "classifier": args.classifier,
+            "no_quota": args.no_quota,
+            **{k: v for k, v in os.environ.items() if k.startswith(("FAKE_", "LLM_", "GMAIL_", "CLUSTER", "TRIAGE_"))},
+        },
+        "runs": [],
+    }
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        run = _spawn(size, args)
+        results["runs"].append(run)
+        _print_run(run)
+
+    output = args.output or os.path.join(REPO_ROOT, "bench", "results", f"triage_pipeline-{commit or 'nogit'}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nWrote {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            _compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
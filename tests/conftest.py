@@ -0,0 +1,61 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Configuration is read at import time, so the offline fakes and a scratch
+# data directory are selected before any app module is imported.
+_workdir = tempfile.mkdtemp(prefix="triage-tests-")
+os.environ.update({
+    "GMAIL_BACKEND": "fake",
+    "LLM_BACKEND": "fake",
+    "TRIAGE_MODE": "mock",
+    "GMAIL_QUOTA_UNITS_PER_SEC": "1000000000",
+    "FAKE_LLM_RECORDINGS": os.path.join(_workdir, "llm_recordings.jsonl"),
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path, monkeypatch):
+    """Each test gets its own SQLite file and local model path."""
+    from app.db import init_db
+
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "app.db"))
+    monkeypatch.setenv("LOCAL_MODEL_PATH", str(tmp_path / "local_model.json"))
+    init_db()
+    yield tmp_path
+
+
+@pytest.fixture
+def mailbox(monkeypatch):
+    """A fresh 40-message fake mailbox without injected faults."""
+    from app import fake_gmail, gmail_actions, gmail_async, gmail_client
+
+    box = fake_gmail.configure(messages=40, error_rate=0, rate_limit_rate=0)
+    # Clients are bound to the mailbox they were built with
+    monkeypatch.setattr(gmail_client._local, "service", None, raising=False)
+    monkeypatch.setattr(gmail_async, "_client", None)
+    gmail_actions.invalidate_label_cache()
+    return box
+
+
+@pytest.fixture
+def service(mailbox):
+    from app.gmail_client import get_gmail_service
+
+    return get_gmail_service()
+
+
+@pytest.fixture
+def faults(mailbox, monkeypatch):
+    """faults.append(error) makes the next mailbox call raise it."""
+    pending = []
+
+    def inject():
+        if pending:
+            raise pending.pop(0)
+
+    monkeypatch.setattr(mailbox, "_inject_faults", inject)
+    return pending
@@ -0,0 +1,33 @@
+from app import fake_gmail, gmail_actions
+
+
+def _ids(mailbox, n):
+    return sorted(mailbox._messages)[:n]
+
+
+def test_bad_id_is_isolated_and_the_rest_applied(mailbox, service):
+    labels = gmail_actions.ensure_triage_labels(service)
+    ids = _ids(mailbox, 32)
+    items = [(mid, "ARCHIVE") for mid in ids[:16]] + [("not-an-id", "ARCHIVE")] + [(mid, "ARCHIVE") for mid in ids[16:]]
+    before = mailbox.stats()["total_calls"]
+
+    applied, errors = gmail_actions.apply_triage_actions_bulk(service, items, labels)
+
+    assert sorted(applied) == sorted(ids)
+    assert [e["message_id"] for e in errors] == ["not-an-id"]
+    # Bisection: about two calls per level of a 33-id chunk, not one per id
+    assert mailbox.stats()["total_calls"] - before <= 2 * 6 + 1
+    assert all("INBOX" not in mailbox._messages[mid]["labelIds"] for mid in ids)
+
+
+def test_permission_error_fails_the_chunk_without_splitting(mailbox, service, faults):
+    labels = gmail_actions.ensure_triage_labels(service)
+    ids = _ids(mailbox, 32)
+    faults.append(fake_gmail._ApiError(403, "Insufficient Permission", "insufficientPermissions"))
+    before = mailbox.stats()["total_calls"]
+
+    applied, errors = gmail_actions.apply_triage_actions_bulk(service, [(mid, "ARCHIVE") for mid in ids], labels)
+
+    assert applied == []
+    assert sorted(e["message_id"] for e in errors) == ids
+    assert mailbox.stats()["total_calls"] - before == 1
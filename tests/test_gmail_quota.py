@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+from googleapiclient.errors import HttpError
+
+from app import fake_gmail, gmail_actions, gmail_quota
+from app.gmail_async import get_async_gmail
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(gmail_quota, "backoff_delay", lambda attempt: 0)
+
+
+def _send(service):
+    return gmail_actions.send_reply(service, to="a@example.com", subject="Hi", body="Hello")
+
+
+def test_send_is_not_retried_after_a_server_error(mailbox, service, faults):
+    faults.append(fake_gmail._ApiError(503, "Backend Error", "backendError"))
+
+    with pytest.raises(HttpError):
+        _send(service)
+    assert mailbox.stats()["calls"]["messages.send"] == 1
+
+
+def test_send_is_retried_when_rate_limited(mailbox, service, faults):
+    faults.append(fake_gmail._ApiError(429, "Too many concurrent requests for user", "rateLimitExceeded"))
+    faults.append(fake_gmail._ApiError(403, "User-rate limit exceeded", "userRateLimitExceeded"))
+
+    _send(service)
+    assert mailbox.stats()["calls"]["messages.send"] == 3
+    assert mailbox.stats()["sent"] == 1
+
+
+def test_idempotent_calls_still_retry_server_errors(mailbox, service, faults):
+    faults.append(fake_gmail._ApiError(503, "Backend Error", "backendError"))
+
+    labels = gmail_actions.ensure_triage_labels(service)
+    assert labels
+
+
+def test_async_send_is_not_retried_after_a_server_error(mailbox, faults):
+    faults.append(fake_gmail._ApiError(500, "Backend Error", "backendError"))
+
+    async def send():
+        await get_async_gmail().send_message({"raw": "eA"})
+
+    with pytest.raises(Exception):
+        asyncio.run(send())
+    assert mailbox.stats()["calls"]["messages.send"] == 1
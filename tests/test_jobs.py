@@ -0,0 +1,71 @@
+from app import jobs
+from app.db import get_conn
+
+
+def _set(job_id, **cols):
+    assignments = ", ".join(f"{k}=?" for k in cols)
+    with get_conn() as conn:
+        conn.execute(f"UPDATE jobs SET {assignments} WHERE job_id=?", (*cols.values(), job_id))
+
+
+def test_enqueue_returns_the_active_job_for_the_same_params():
+    first = jobs.enqueue_triage(max_results=20)
+    again = jobs.enqueue_triage(max_results=20)
+    other = jobs.enqueue_triage(max_results=20, incremental=True)
+
+    assert again["job_id"] == first["job_id"]
+    assert other["job_id"] != first["job_id"]
+
+
+def test_enqueue_fails_a_stale_running_job_and_starts_a_new_one():
+    stale = jobs.enqueue_triage()
+    _set(stale["job_id"], state=jobs.CLASSIFYING, updated_at=jobs._ago(jobs.JOB_STALE_SECONDS + 60))
+
+    fresh = jobs.enqueue_triage()
+
+    assert fresh["job_id"] != stale["job_id"]
+    assert fresh["state"] == jobs.QUEUED
+    old = jobs.get_job(stale["job_id"])
+    assert old["state"] == jobs.FAILED
+    assert old["error"] == "Stopped making progress"
+
+
+def test_enqueue_keeps_a_running_job_that_is_making_progress():
+    running = jobs.enqueue_triage()
+    _set(running["job_id"], state=jobs.CLASSIFYING)
+
+    assert jobs.enqueue_triage()["job_id"] == running["job_id"]
+    assert jobs.get_job(running["job_id"])["state"] == jobs.CLASSIFYING
+
+
+def test_claim_fails_stale_jobs_and_takes_the_oldest_queued_one():
+    stale = jobs.enqueue_triage(max_results=5)
+    _set(stale["job_id"], state=jobs.FETCHING, updated_at=jobs._ago(jobs.JOB_STALE_SECONDS + 60))
+    queued = jobs.enqueue_triage(max_results=10)
+
+    claimed = jobs._claim()
+
+    assert claimed["job_id"] == queued["job_id"]
+    assert jobs.get_job(queued["job_id"])["state"] == jobs.FETCHING
+    assert jobs.get_job(stale["job_id"])["state"] == jobs.FAILED
+    assert jobs._claim() is None
+
+
+def test_current_triage_reuses_only_a_recent_successful_run():
+    job = jobs.enqueue_triage()
+    _set(job["job_id"], state=jobs.DONE, finished_at=jobs._ago(10))
+    assert jobs.current_triage()["job_id"] == job["job_id"]
+
+    _set(job["job_id"], finished_at=jobs._ago(jobs.JOB_REUSE_SECONDS + 60))
+    assert jobs.current_triage() is None
+
+
+def test_run_records_the_batch_of_a_finished_triage(mailbox):
+    job = jobs.enqueue_triage(max_results=5)
+
+    jobs._run(jobs._claim())
+
+    done = jobs.get_job(job["job_id"])
+    assert done["state"] == jobs.DONE
+    assert done["batch_id"]
+    assert len(done["result"]["slate"]["items"]) == 5
@@ -0,0 +1,94 @@
+import threading
+import time
+
+import pytest
+
+from app import llm_dispatch
+
+
+class Unavailable(Exception):
+    status_code = 503
+
+
+@pytest.fixture(autouse=True)
+def fresh_dispatch(monkeypatch):
+    """Clean breakers, latency windows and stats; quick hedges, no backoff."""
+    providers = llm_dispatch.PROVIDER_KEYS
+    monkeypatch.setattr(llm_dispatch, "_breakers", {p: llm_dispatch.CircuitBreaker() for p in providers})
+    monkeypatch.setattr(llm_dispatch, "_latency", {p: llm_dispatch.LatencyWindow() for p in providers})
+    monkeypatch.setattr(llm_dispatch, "_stats", {
+        p: {"calls": 0, "failures": 0, "retries": 0, "hedges": 0, "failovers": 0} for p in providers
+    })
+    monkeypatch.setattr(llm_dispatch, "HEDGE_AFTER_DEFAULT", 0.1)
+    monkeypatch.setattr(llm_dispatch, "BACKOFF_BASE", 0.0)
+    monkeypatch.setattr(llm_dispatch, "LLM_FAILOVER", True)
+
+
+def _slots():
+    return {p: threading.BoundedSemaphore(1) for p in llm_dispatch.PROVIDER_KEYS}
+
+
+def test_slow_primary_is_hedged_on_the_alternate():
+    def call(provider, timeout):
+        if provider == "gemini":
+            time.sleep(0.5)
+        return provider
+
+    assert llm_dispatch.dispatch(call, "gemini") == "claude"
+    assert llm_dispatch.provider_health()["gemini"]["hedges"] == 1
+
+
+def test_failed_primary_fails_over():
+    def call(provider, timeout):
+        if provider == "gemini":
+            raise ValueError("bad request")
+        return provider
+
+    assert llm_dispatch.dispatch(call, "gemini") == "claude"
+    health = llm_dispatch.provider_health()
+    assert health["gemini"]["failovers"] == 1
+    assert health["gemini"]["retries"] == 0  # not transient
+
+
+def test_transient_errors_are_retried_on_the_same_provider():
+    attempts = []
+
+    def call(provider, timeout):
+        attempts.append(provider)
+        if len(attempts) == 1:
+            raise Unavailable()
+        return provider
+
+    assert llm_dispatch.dispatch(call, "gemini") == "gemini"
+    assert attempts == ["gemini", "gemini"]
+
+
+def test_waiting_for_a_slot_does_not_trigger_a_hedge():
+    slots = _slots()
+    calls = []
+
+    def call(provider, timeout):
+        calls.append(provider)
+        return provider
+
+    slots["gemini"].acquire()
+    threading.Timer(0.3, slots["gemini"].release).start()
+
+    assert llm_dispatch.dispatch(call, "gemini", slots) == "gemini"
+    assert calls == ["gemini"]
+    assert llm_dispatch.provider_health()["gemini"]["hedges"] == 0
+
+
+def test_call_gets_the_full_deadline_after_waiting_for_a_slot():
+    slots = _slots()
+    budgets = []
+
+    def call(provider, timeout):
+        budgets.append(timeout)
+        return provider
+
+    slots["gemini"].acquire()
+    threading.Timer(0.3, slots["gemini"].release).start()
+    llm_dispatch.dispatch(call, "gemini", slots)
+
+    assert budgets[0] > llm_dispatch.LLM_DEADLINE - 0.2
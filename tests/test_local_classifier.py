@@ -0,0 +1,64 @@
+import pytest
+
+from app import local_classifier
+from app.db import get_conn
+
+
+@pytest.fixture(autouse=True)
+def fresh_model(monkeypatch):
+    monkeypatch.setattr(local_classifier, "_model", None)
+
+
+def _insert(n, category="ARCHIVE"):
+    with get_conn() as conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO batches (batch_id, created_at, mode, max_results) VALUES ('b', '', 'mock', 0)"
+        )
+        for i in range(n):
+            conn.execute(
+                """
+                INSERT INTO triage_items (batch_id, message_id, sender, subject, snippet, category)
+                VALUES ('b', ?, ?, ?, 'weekly digest of things', ?)
+                """,
+                (f"m{i}", f"news{i}@example.com", f"Newsletter {i}", category),
+            )
+        return [r["id"] for r in conn.execute("SELECT id FROM triage_items ORDER BY id")]
+
+
+def _approve(ids, category=None):
+    with get_conn() as conn:
+        for i in ids:
+            conn.execute(
+                "UPDATE triage_items SET approved=1, category=COALESCE(?, category) WHERE id=?",
+                (category, i),
+            )
+
+
+def test_approvals_out_of_id_order_are_trained():
+    ids = _insert(5)
+    _approve(ids[3:])
+    assert local_classifier.train() == {"added": 2, "corrected": 0, "total": 2}
+    _approve(ids[:3])
+    assert local_classifier.train() == {"added": 3, "corrected": 0, "total": 5}
+    assert local_classifier.train() == {"added": 0, "corrected": 0, "total": 5}
+
+
+def test_recategorized_row_moves_its_counts():
+    ids = _insert(2)
+    _approve(ids)
+    local_classifier.train()
+    _approve(ids[:1], category="REPLY")
+
+    assert local_classifier.train() == {"added": 0, "corrected": 1, "total": 2}
+    docs = local_classifier.model_stats()["class_docs"]
+    assert docs["ARCHIVE"] == 1 and docs["REPLY"] == 1
+
+
+def test_lost_model_file_retrains_every_row(fresh_db, monkeypatch):
+    ids = _insert(3)
+    _approve(ids)
+    local_classifier.train()
+    (fresh_db / "local_model.json").unlink()
+    monkeypatch.setattr(local_classifier, "_model", None)
+
+    assert local_classifier.train()["added"] == 3
@@ -0,0 +1,18 @@
+from app import triage_api
+from app.db import get_conn
+
+
+def _batch_count():
+    with get_conn() as conn:
+        return conn.execute("SELECT COUNT(*) FROM batches").fetchone()[0]
+
+
+def test_stream_with_no_new_mail_creates_no_batch(mailbox):
+    list(triage_api.stream_triage_run(max_results=5, incremental=True))
+    before = _batch_count()
+
+    events = list(triage_api.stream_triage_run(max_results=5, incremental=True))
+
+    assert events[0]["batch_id"] is None
+    assert events[-1] == {"done": True, "batch_summary": triage_api.NO_NEW_MAIL_SUMMARY}
+    assert _batch_count() == before